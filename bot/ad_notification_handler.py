@@ -1,12 +1,21 @@
+from collections import OrderedDict
 from typing import Optional
 
 import redis.asyncio as redis
 import structlog
 from django.conf import settings
 
-from bot.keyboards import new_menu_kb
-from bot.models import Channel
-from bot.tools import clean_markdown, send_long, truncate_text
+from bot.delivery_ledger import (
+    claim_fan_out,
+    exclude_delivered,
+    release_fan_out,
+)
+from bot.delivery_queue import delivery_queue
+from bot.models import Channel, ChannelNews
+from bot.scheduled_delivery import split_quiet_recipients
+from bot.subscriber_index import subscriber_index
+from bot.tools import render_ad_html
+from core.redis_manager import redis_manager
 from userbot.redis_messages import NewAdMessage, deserialize_message
 
 logger = structlog.getLogger(__name__)
@@ -17,19 +26,14 @@ class AdNotificationHandler:
 
     def __init__(self, bot):
         self.bot = bot
-        self.redis_client: Optional[redis.Redis] = None
         self.pubsub: Optional[redis.client.PubSub] = None
+        # HTML уведомлений по news_id, чтобы не читать БД на повторах
+        self._news_html: OrderedDict[int, str] = OrderedDict()
 
     async def connect(self):
-        """Подключается к Redis"""
+        """Подключается к Redis через общий пул событий"""
         try:
-            self.redis_client = redis.Redis(
-                host=getattr(settings, "BOT_REDIS_HOST", "localhost"),
-                port=getattr(settings, "BOT_REDIS_PORT", 6379),
-                db=getattr(settings, "BOT_REDIS_DB", 0),
-                decode_responses=True,
-            )
-            await self.redis_client.ping()
+            await redis_manager.connect()
             logger.info("AdNotificationHandler подключен к Redis")
         except Exception as e:
             logger.error(
@@ -38,18 +42,16 @@ class AdNotificationHandler:
             raise
 
     async def disconnect(self):
-        """Отключается от Redis"""
+        """Отключается от Redis; общие пулы закрывает redis_manager"""
         if self.pubsub:
             await self.pubsub.close()
-        if self.redis_client:
-            await self.redis_client.close()
 
     async def listen_for_ad_notifications(self):
         """Слушает уведомления о новых рекламных постах"""
         channel = "bot:new_ad"
 
         try:
-            self.pubsub = self.redis_client.pubsub()
+            self.pubsub = redis_manager.raw_client.pubsub()
             await self.pubsub.subscribe(channel)
 
             logger.info(f"Слушаем канал {channel} для уведомлений о рекламе")
@@ -65,104 +67,112 @@ class AdNotificationHandler:
         except Exception as e:
             logger.error(f"Ошибка прослушивания уведомлений о рекламе: {e}")
 
+    async def _get_message_html(
+        self, ad_message: NewAdMessage, channel: Channel
+    ) -> str:
+        """HTML уведомления: из ChannelNews.rendered_html по news_id или
+        рендер текста из самого события"""
+        if not ad_message.news_id:
+            return render_ad_html(
+                channel,
+                ad_message.message_id,
+                ad_message.message_text,
+                channel_title=ad_message.channel_title,
+            )
+
+        html = self._news_html.get(ad_message.news_id)
+        if html is not None:
+            self._news_html.move_to_end(ad_message.news_id)
+            return html
+
+        row = (
+            await ChannelNews.objects.filter(pk=ad_message.news_id)
+            .values_list("rendered_html", "message")
+            .afirst()
+        )
+        if row is None:
+            logger.warning(f"Новость {ad_message.news_id} не найдена в БД")
+            return render_ad_html(
+                channel,
+                ad_message.message_id,
+                ad_message.message_text,
+                channel_title=ad_message.channel_title,
+            )
+
+        html, text = row
+        if not html:
+            # Пост сохранен до появления rendered_html: рендерим один раз
+            html = render_ad_html(
+                channel,
+                ad_message.message_id,
+                text,
+                channel_title=ad_message.channel_title,
+            )
+            await ChannelNews.objects.filter(pk=ad_message.news_id).aupdate(
+                rendered_html=html
+            )
+
+        self._news_html[ad_message.news_id] = html
+        if len(self._news_html) > getattr(settings, "AD_TEXT_CACHE_SIZE", 256):
+            self._news_html.popitem(last=False)
+        return html
+
     async def handle_new_ad(self, ad_message: NewAdMessage):
         """Обрабатывает уведомление о новом рекламном посте"""
         try:
-            try:
-                channel = await Channel.objects.aget(
-                    telegram_id=ad_message.channel_id
+            # Повтор события (переотправка после перезапуска) не должен
+            # уведомить пользователей второй раз
+            if not await claim_fan_out(ad_message.news_id):
+                logger.info(f"Пост {ad_message.news_id} уже разослан")
+                return
+
+            # Подписчики из индекса Redis: без чтения и расшифровки User
+            recipients = await subscriber_index.get(ad_message.channel_id)
+            recipients = await exclude_delivered(ad_message.news_id, recipients)
+            if not recipients:
+                logger.info(
+                    f"Нет подписчиков на канал {ad_message.channel_title}"
                 )
+                return
+
+            try:
+                channel = await Channel.objects.only(
+                    "telegram_id", "title", "main_username", "is_private"
+                ).aget(telegram_id=ad_message.channel_id)
             except Channel.DoesNotExist:
                 logger.warning(
                     f"Канал с ID {ad_message.channel_id} не найден в БД"
                 )
                 return
 
-            users = []
-            async for user in channel.users.all():
-                users.append(user)
-
-            if not users:
-                logger.info(f"Нет подписчиков на канал {channel.title}")
-                return
+            message_text = await self._get_message_html(ad_message, channel)
 
-            # Безопасно экранируем текст сообщения
-            safe_message_text = truncate_text(
-                clean_markdown(ad_message.message_text)
-            )
-            safe_channel_title = ad_message.channel_title
-
-            # Определяем тип канала и формируем соответствующее сообщение
-            if channel.is_private:
-                channel_link = f"https://t.me/c/{channel.telegram_id}"
-                channel_type_text = "Реклама в канале"
-                button_text = "Перейти к посту"
-                action_link = f"{channel_link}/{ad_message.message_id}"
-            else:
-                channel_link = f"https://t.me/{channel.main_username}"
-                channel_type_text = "Реклама в канале"
-                button_text = "Перейти к посту"
-                action_link = f"{channel_link}/{ad_message.message_id}"
-
-            message_text = f"{channel_type_text}: <a href='{channel_link}'><b>{safe_channel_title}</b></a>\n\n"
-            message_text += f"{safe_message_text}\n\n"
-            message_text += (
-                f"<a href='{action_link}'><b>{button_text} →</b></a>"
+            # Доставляет DeliveryWorker: с лимитом скорости и повторами.
+            # Выбравшим тихие часы реклама ночью придет к их окончанию
+            recipients, deferred, quiet_until = await split_quiet_recipients(
+                recipients
             )
-
-            sent_count = 0
-            failed_count = 0
-
-            for user in users:
-                try:
-                    logger.debug(
-                        f"Отправляем уведомление пользователю {user.tg_user_id} (chat_id: {user.tg_chat_id})"
-                    )
-
-                    await send_long(
-                        self.bot,
-                        user.tg_chat_id,
-                        message_text,
-                        reply_markup=new_menu_kb(),
-                    )
-                    sent_count += 1
-                    logger.debug(
-                        f"Уведомление успешно отправлено пользователю {user.tg_user_id}"
-                    )
-
-                except Exception as e:
-                    failed_count += 1
-                    error_type = type(e).__name__
-
-                    # Более детальное логирование в зависимости от типа ошибки
-                    if "timeout" in str(e).lower():
-                        logger.warning(
-                            f"Таймаут при отправке уведомления пользователю {user.tg_user_id} (chat_id: {user.tg_chat_id}): {e}"
-                        )
-                    elif (
-                        "blocked" in str(e).lower()
-                        or "bot was blocked" in str(e).lower()
-                    ):
-                        logger.warning(
-                            f"Пользователь {user.tg_user_id} заблокировал бота: {e}"
-                        )
-                    elif "chat not found" in str(e).lower():
-                        logger.warning(
-                            f"Чат пользователя {user.tg_user_id} не найден: {e}"
-                        )
-                    else:
-                        logger.error(
-                            f"Ошибка отправки уведомления пользователю {user.tg_user_id} (chat_id: {user.tg_chat_id}): {error_type}: {e}"
-                        )
-
-                    # TODO добавить отправку только активным пользователям и отписку от каналов для него
+            queued = 0
+            if recipients:
+                queued += await delivery_queue.enqueue(
+                    message_text, recipients, news_id=ad_message.news_id
+                )
+            if deferred:
+                queued += await delivery_queue.enqueue(
+                    message_text,
+                    deferred,
+                    news_id=ad_message.news_id,
+                    due_at=quiet_until,
+                )
 
             logger.info(
-                f"Отправлено уведомлений о рекламе: {sent_count} из {len(users)} подписчиков канала {channel.title} "
-                f"(неудачных: {failed_count})"
+                f"Поставлено в очередь уведомлений о рекламе: {queued} "
+                f"для подписчиков канала {channel.title}"
             )
 
         except Exception as e:
             logger.error(
                 f"Ошибка обработки уведомления о рекламе: {e}", exc_info=True
             )
+            # Рассылка не поставлена: повтор события сможет ее выполнить
+            await release_fan_out(ad_message.news_id)
@@ -13,6 +13,8 @@ from bot.models import (
     ChannelNews,
     ChannelSubscription,
     ChannelUser,
+    DeliveryDeadLetter,
+    DeliveryRecord,
     Payment,
     Tariff,
     TextTemplate,
@@ -46,11 +48,12 @@ class UserAdmin(admin.ModelAdmin):
         "first_name",
         "last_name",
         "status",
+        "delivery_mode",
         "get_current_tariff_display",
         "get_channels_limit_display",
         "created",
     ]
-    list_filter = ["status", "is_tg_premium", "created"]
+    list_filter = ["status", "delivery_mode", "is_tg_premium", "created"]
     search_fields = ["tg_user_id", "username", "first_name", "last_name"]
     readonly_fields = [
         "tg_user_id",
@@ -113,11 +116,12 @@ class UserBotAdmin(admin.ModelAdmin):
         "phone",
         "status",
         "is_active",
+        "is_standby",
         "subscribed_channels_count",
         "last_activity",
         "auth_actions",
     ]
-    list_filter = ["status", "is_active", "created_at"]
+    list_filter = ["status", "is_active", "is_standby", "created_at"]
     search_fields = ["name", "phone"]
     readonly_fields = [
         "last_activity",
@@ -150,7 +154,7 @@ class UserBotAdmin(admin.ModelAdmin):
             "Статус",
             {"fields": ("status", "is_active", "last_activity", "last_error")},
         ),
-        ("Настройки", {"fields": ("max_channels",)}),
+        ("Настройки", {"fields": ("max_channels", "is_standby")}),
         (
             "Системная информация",
             {"fields": ("created_at", "updated_at"), "classes": ("collapse",)},
@@ -522,9 +526,11 @@ class ChannelAdmin(admin.ModelAdmin):
         "main_username",
         "telegram_id",
         "is_private",
+        "replication_factor",
+        "orphaned_since",
         "created_at",
     ]
-    list_filter = ["is_private", "created_at"]
+    list_filter = ["is_private", "orphaned_since", "created_at"]
     search_fields = ["title", "main_username", "telegram_id"]
     readonly_fields = ["telegram_id", "created_at", "updated_at"]
 
@@ -538,8 +544,14 @@ class ChannelUserAdmin(admin.ModelAdmin):
 
 @admin.register(ChannelSubscription)
 class ChannelSubscriptionAdmin(admin.ModelAdmin):
-    list_display = ["userbot", "channel", "is_subscribed", "created_at"]
-    list_filter = ["is_subscribed", "created_at"]
+    list_display = [
+        "userbot",
+        "channel",
+        "is_subscribed",
+        "is_primary",
+        "created_at",
+    ]
+    list_filter = ["is_subscribed", "is_primary", "created_at"]
     search_fields = ["userbot__name", "channel__title"]
 
 
@@ -762,3 +774,37 @@ class PaymentAdmin(admin.ModelAdmin):
 
     is_failed.short_description = "Неудачно"
     is_failed.boolean = True
+
+
+@admin.register(DeliveryDeadLetter)
+class DeliveryDeadLetterAdmin(admin.ModelAdmin):
+    list_display = ["chat_id", "user", "attempts", "error", "created_at"]
+    list_filter = ["created_at"]
+    search_fields = ["chat_id", "user__username", "error"]
+    readonly_fields = [
+        "user",
+        "chat_id",
+        "channel_news",
+        "text",
+        "error",
+        "attempts",
+        "enqueued_at",
+        "created_at",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DeliveryRecord)
+class DeliveryRecordAdmin(admin.ModelAdmin):
+    list_display = ["user", "channel_news", "status", "latency_ms", "day"]
+    list_filter = ["status", "day"]
+    search_fields = ["user__tg_user_id", "user__username"]
+    raw_id_fields = ["user", "channel_news"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
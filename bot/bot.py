@@ -1,7 +1,7 @@
-import redis.asyncio as redis
 import structlog
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.types import BotCommand, BotCommandScopeDefault
@@ -10,6 +10,7 @@ from aiohttp import ClientTimeout
 from django.conf import settings
 
 from bot.ad_notification_handler import AdNotificationHandler
+from bot.delivery_queue import DeliveryWorker
 from bot.handlers import (
     command_handlers,
     other_handlers,
@@ -23,6 +24,8 @@ from bot.middlewares import (
     IgnoreMessageNotModifiedMiddleware,
 )
 from core.event_manager import EventType, event_manager
+from core.redis_manager import redis_manager
+from core.tracing import trace_metrics
 
 logger = structlog.getLogger(__name__)
 
@@ -30,6 +33,24 @@ COMMANDS_RU = [
     BotCommand(command="menu", description="Главное меню"),
 ]
 
+# Полосы исходящего трафика: у каждой свой клиент Bot API со своим пулом
+# соединений, поэтому массовая рассылка не занимает соединения платежей
+# и ответов в меню
+LANE_TRANSACTIONAL = "transactional"  # уведомления о платежах
+LANE_INTERACTIVE = "interactive"  # ответы на действия пользователя
+LANE_BULK = "bulk"  # рассылка рекламы
+
+LANE_CONNECTIONS = {
+    LANE_TRANSACTIONAL: "BOT_TRANSACTIONAL_CONNECTIONS",
+    LANE_INTERACTIVE: "BOT_INTERACTIVE_CONNECTIONS",
+    LANE_BULK: "BOT_BULK_CONNECTIONS",
+}
+LANE_DEFAULT_CONNECTIONS = {
+    LANE_TRANSACTIONAL: 4,
+    LANE_INTERACTIVE: 50,
+    LANE_BULK: 10,
+}
+
 
 async def on_startup(bot: Bot):
     await bot.delete_my_commands(scope=BotCommandScopeDefault())
@@ -38,9 +59,13 @@ async def on_startup(bot: Bot):
 
     global ad_handler
     global payment_notification_handler
+    global delivery_worker
 
     ad_handler = AdNotificationHandler(bot)
-    payment_notification_handler = PaymentNotificationHandler(bot)
+    # Платежи идут своей полосой: их не задерживает рассылка рекламы
+    payment_notification_handler = PaymentNotificationHandler(
+        create_bot(LANE_TRANSACTIONAL)
+    )
 
     event_manager.register_handler(
         EventType.NEW_AD_MESSAGE, ad_handler.handle_new_ad, "bot:new_ad"
@@ -53,6 +78,13 @@ async def on_startup(bot: Bot):
     )
 
     await event_manager.start_listening()
+    redis_manager.start_metrics_reporter()
+    trace_metrics.start_reporter()
+    # Без доставки в боте уведомления отправляют отдельные run_sender
+    delivery_worker = None
+    if getattr(settings, "DELIVERY_WORKER_IN_BOT", True):
+        delivery_worker = DeliveryWorker(create_bot(LANE_BULK))
+        delivery_worker.start()
     logger.info("Запущены обработчики уведомлений")
 
 
@@ -62,7 +94,13 @@ async def on_shutdown(bot: Bot):
     # Отключаем обработчик уведомлений
     global ad_handler
     if "ad_handler" in globals():
+        # Взятые задания доставки возвращаются в очередь Redis, начатые
+        # события дорабатываются до EVENT_DRAIN_TIMEOUT
+        if delivery_worker:
+            await delivery_worker.stop()
+            await delivery_worker.broadcaster.bot.session.close()
         await event_manager.stop_listening()
+        await payment_notification_handler.bot.session.close()
         logger.info("Обработчик уведомлений о рекламе отключен")
 
     # await bot.session.close()
@@ -70,9 +108,8 @@ async def on_shutdown(bot: Bot):
     # logger.info("Redis connection closed")
 
 
-async def build_bot() -> tuple[Bot, Dispatcher]:
-    token = settings.BOT_TOKEN
-
+def create_bot(lane: str = LANE_INTERACTIVE) -> Bot:
+    """Клиент Bot API полосы lane с таймаутами из настроек"""
     timeout = ClientTimeout(
         total=getattr(settings, "BOT_TIMEOUT_TOTAL", 180),  # Общий таймаут
         connect=getattr(
@@ -83,19 +120,24 @@ async def build_bot() -> tuple[Bot, Dispatcher]:
         ),  # Таймаут чтения
     )
 
-    bot = Bot(
-        token=token,
+    session = AiohttpSession(
+        limit=getattr(
+            settings, LANE_CONNECTIONS[lane], LANE_DEFAULT_CONNECTIONS[lane]
+        )
+    )
+
+    return Bot(
+        token=settings.BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
         session_timeout=timeout,
     )
 
-    redis_client = redis.Redis(
-        db=settings.BOT_REDIS_DB,
-        host=settings.BOT_REDIS_HOST,
-        port=settings.BOT_REDIS_PORT,
-    )
 
-    storage = RedisStorage(redis_client)
+async def build_bot() -> tuple[Bot, Dispatcher]:
+    bot = create_bot()
+
+    storage = RedisStorage(redis_manager.get_client("fsm"))
 
     dp = Dispatcher(storage=storage)
 
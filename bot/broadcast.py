@@ -0,0 +1,213 @@
+"""Рассылка сообщений многим чатам в пределах лимитов Telegram.
+
+Telegram пропускает около 30 сообщений в секунду от бота и примерно одно
+сообщение в секунду в один чат. Отправители работают параллельно, а общий
+token bucket держит суммарную скорость в пределах лимита — время рассылки
+определяется лимитом, а не суммой задержек сети. Часть лимита
+(BROADCAST_RESERVED_RATE) рассылке не выдается: она остается платежам и
+ответам в меню, которые идут своими полосами без очереди.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+import structlog
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+from django.conf import settings
+
+from bot.tools import send_long
+from core.redis_manager import redis_manager
+
+logger = structlog.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, запас не больше capacity.
+
+    Ожидающие получают токены по очереди. pause() останавливает выдачу
+    для всех — так обрабатывается TelegramRetryAfter.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate,
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def pause(self, seconds: float):
+        """Останавливает выдачу токенов на seconds секунд"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+# Состояние общего bucket в Redis. Время берется у Redis, поэтому часы
+# реплик не влияют на лимит. Возвращает 0, если токен выдан, иначе
+# сколько миллисекунд подождать
+TOKEN_BUCKET_SCRIPT = """
+local paused = redis.call('PTTL', KEYS[2])
+if paused > 0 then
+    return paused
+end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 60000)
+return wait
+"""
+
+
+class RedisTokenBucket:
+    """Token bucket в Redis, общий для всех отправителей бота.
+
+    Несколько реплик run_sender вместе не превышают rate. pause()
+    останавливает выдачу токенов всем репликам сразу.
+    """
+
+    BUCKET_KEY = "broadcast:bucket"
+    PAUSE_KEY = "broadcast:bucket:paused"
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._script = None
+
+    async def acquire(self):
+        if self._script is None:
+            self._script = redis_manager.client.register_script(
+                TOKEN_BUCKET_SCRIPT
+            )
+        while True:
+            wait_ms = await self._script(
+                keys=[self.BUCKET_KEY, self.PAUSE_KEY],
+                args=[self.rate, self.capacity],
+            )
+            if not wait_ms:
+                return
+            await asyncio.sleep(int(wait_ms) / 1000)
+
+    async def pause(self, seconds: float):
+        """Останавливает выдачу токенов на seconds секунд"""
+        await redis_manager.client.set(
+            self.PAUSE_KEY, 1, px=max(int(seconds * 1000), 1)
+        )
+
+
+class ChatSpacing:
+    """Минимальный интервал между сообщениями в один чат"""
+
+    # Сколько чатов помнить, прежде чем чистить устаревшие записи
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_at: dict[int, float] = {}
+
+    async def wait(self, chat_id: int):
+        now = time.monotonic()
+        send_at = max(now, self._next_at.get(chat_id, 0.0))
+        # Слот занимается сразу, чтобы параллельные отправки в чат не совпали
+        self._next_at[chat_id] = send_at + self.interval
+        if len(self._next_at) > self.MAX_TRACKED_CHATS:
+            self._next_at = {
+                key: value
+                for key, value in self._next_at.items()
+                if value > now
+            }
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+
+class RedisChatSpacing:
+    """Интервал между сообщениями в один чат, общий для всех реплик"""
+
+    KEY_PREFIX = "broadcast:chat:"
+
+    def __init__(self, interval: float):
+        self.interval_ms = max(int(interval * 1000), 1)
+
+    async def wait(self, chat_id: int):
+        key = f"{self.KEY_PREFIX}{chat_id}"
+        while not await redis_manager.client.set(
+            key, 1, px=self.interval_ms, nx=True
+        ):
+            ttl_ms = await redis_manager.client.pttl(key)
+            await asyncio.sleep(max(ttl_ms, 1) / 1000)
+
+
+class Broadcaster:
+    """Отправка с общим лимитом скорости и интервалом по чатам"""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        rate = max(
+            getattr(settings, "BROADCAST_RATE", 30)
+            - getattr(settings, "BROADCAST_RESERVED_RATE", 5),
+            1,
+        )
+        interval = getattr(settings, "BROADCAST_CHAT_INTERVAL", 1.0)
+        # redis — лимит общий для всех процессов, local — только для этого
+        if getattr(settings, "BROADCAST_LIMITER", "redis") == "local":
+            self.bucket = TokenBucket(rate, capacity=rate)
+            self.spacing = ChatSpacing(interval)
+        else:
+            self.bucket = RedisTokenBucket(rate, capacity=rate)
+            self.spacing = RedisChatSpacing(interval)
+
+    async def send(
+        self,
+        chat_id: int,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ):
+        """Отправляет сообщение в пределах лимитов.
+
+        На TelegramRetryAfter приостанавливает всех отправителей этого
+        Broadcaster и пробрасывает ошибку — повтор решает вызывающий.
+        """
+        await self.spacing.wait(chat_id)
+        await self.bucket.acquire()
+        try:
+            await send_long(self.bot, chat_id, text, reply_markup=reply_markup)
+        except TelegramRetryAfter as e:
+            # Лимит превышен для всего бота: останавливаем всех отправителей
+            logger.warning(
+                f"Telegram просит подождать {e.retry_after} с, "
+                f"рассылка приостановлена"
+            )
+            await self.bucket.pause(e.retry_after)
+            raise
@@ -3,6 +3,7 @@ DEFAULT_TEXTS = {
     "add_channels_btn": "Добавить каналы",
     "my_channels_btn": "Мои каналы",
     "digest_btn": "Дайджест",
+    "delivery_mode_btn": "Уведомления",
     "support_btn": "Помощь",
     "support_contact_btn": "Поддержка",
     "search_channels_btn": "Поиск",
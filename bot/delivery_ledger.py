@@ -0,0 +1,162 @@
+"""Журнал доставки уведомлений (DeliveryRecord).
+
+DeliveryWorker копит итоги отправок в памяти и пишет их пачками через
+bulk_create(ignore_conflicts=True). Журнал только пополняется: каждая
+попытка — новая строка, а повтор успешной доставки пары (пользователь,
+пост) отбрасывает частичное уникальное ограничение. Перед рассылкой
+handle_new_ad исключает тех, кому пост уже доставлен, а отметка
+delivery:fanout:<news_id> в Redis (SET NX) не дает повторно разослать
+событие, пришедшее еще раз до записи журнала.
+"""
+
+import asyncio
+import time
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from bot.models import DeliveryRecord
+from core.redis_manager import redis_manager
+
+logger = structlog.getLogger(__name__)
+
+FANOUT_KEY_PREFIX = "delivery:fanout:"
+
+
+async def claim_fan_out(news_id: int) -> bool:
+    """Забирает рассылку поста news_id; False — ее уже начал другой.
+
+    Отметка живет столько же, сколько тексты очереди доставки.
+    """
+    if not news_id:
+        return True
+    return bool(
+        await redis_manager.client.set(
+            f"{FANOUT_KEY_PREFIX}{news_id}",
+            1,
+            nx=True,
+            ex=getattr(settings, "DELIVERY_TEXT_TTL", 86400),
+        )
+    )
+
+
+async def release_fan_out(news_id: int):
+    """Снимает отметку, если рассылка поста не удалась"""
+    if news_id:
+        await redis_manager.client.delete(f"{FANOUT_KEY_PREFIX}{news_id}")
+
+
+async def exclude_delivered(
+    news_id: int, recipients: list[tuple[int, int]]
+) -> list[tuple[int, int]]:
+    """Убирает получателей, которым пост уже доставлен.
+
+    Неудачные попытки не исключают: такой получатель получит пост снова.
+    """
+    if not news_id or not recipients:
+        return recipients
+    delivered = set(
+        await sync_to_async(list)(
+            DeliveryRecord.objects.filter(
+                channel_news_id=news_id, status=DeliveryRecord.STATUS_SENT
+            ).values_list("user_id", flat=True)
+        )
+    )
+    if not delivered:
+        return recipients
+    return [
+        (user_id, chat_id)
+        for user_id, chat_id in recipients
+        if user_id not in delivered
+    ]
+
+
+class DeliveryLedger:
+    """Буфер записей журнала с периодической записью в БД"""
+
+    def __init__(self):
+        self.buffer: list[DeliveryRecord] = []
+        self._task: asyncio.Task | None = None
+        self._flushing: asyncio.Task | None = None
+
+    def record(
+        self,
+        user_id: int,
+        news_ids: list[int],
+        status: str,
+        enqueued_at: float,
+    ):
+        """Добавляет итог доставки постов news_ids пользователю"""
+        if not user_id:
+            return
+        latency_ms = max(int((time.time() - enqueued_at) * 1000), 0)
+        day = timezone.now().date()
+        self.buffer += [
+            DeliveryRecord(
+                user_id=user_id,
+                channel_news_id=news_id,
+                status=status,
+                latency_ms=latency_ms,
+                day=day,
+            )
+            for news_id in news_ids
+            if news_id
+        ]
+        # Большой буфер пишем сразу, не дожидаясь интервала
+        if len(self.buffer) >= getattr(
+            settings, "DELIVERY_LEDGER_BATCH", 500
+        ) and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.create_task(self.flush())
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._flushing:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        await self.flush()
+
+    async def _run(self):
+        interval = getattr(settings, "DELIVERY_LEDGER_FLUSH_INTERVAL", 5)
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        batch_size = getattr(settings, "DELIVERY_LEDGER_BATCH", 500)
+        for start in range(0, len(records), batch_size):
+            batch = records[start : start + batch_size]
+            try:
+                await sync_to_async(self._write)(batch)
+            except Exception as e:
+                # Например, пост удалили до записи журнала: пишем пачку по
+                # одной, чтобы потерять только ее плохие записи
+                logger.warning(
+                    f"Не удалось записать пачку журнала ({len(batch)}), "
+                    f"пишем по одной: {e}"
+                )
+                await sync_to_async(self._write_each)(batch)
+
+    @staticmethod
+    def _write(records: list[DeliveryRecord]):
+        DeliveryRecord.objects.bulk_create(records, ignore_conflicts=True)
+
+    @classmethod
+    def _write_each(cls, records: list[DeliveryRecord]):
+        lost = 0
+        for record in records:
+            try:
+                cls._write([record])
+            except Exception:
+                lost += 1
+        if lost:
+            # Журнал не должен останавливать доставку: такие записи теряются
+            logger.error(f"Не записано в журнал доставки: {lost}")
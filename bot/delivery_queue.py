@@ -0,0 +1,585 @@
+"""Надежная очередь доставки уведомлений в Redis.
+
+Каждый получатель — отдельное задание. Задания лежат в хеше
+delivery:jobs, а их сроки — в sorted set delivery:due (score — время,
+когда задание можно выполнять). Взятое задание получает аренду: его
+срок сдвигается на DELIVERY_LEASE_SECONDS, и если отправитель упадет,
+задание само вернется в очередь. Пока задание у живого отправителя
+(ждет в буфере или паузы RetryAfter), аренда продлевается. Текст рассылки хранится один раз на
+всех получателей.
+
+При DELIVERY_COALESCE_WINDOW > 0 уведомления одному пользователю
+копятся в общем задании: первое открывает окно, следующие в пределах
+окна дописываются в список delivery:merge:<id>, и по истечении окна
+пользователь получает одно сообщение со всеми рекламами.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+import structlog
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+)
+from django.conf import settings
+
+from bot.broadcast import Broadcaster
+from bot.delivery_ledger import DeliveryLedger
+from bot.keyboards import new_menu_kb
+from bot.models import DeliveryDeadLetter, DeliveryRecord
+from bot.recipient_cleanup import RecipientCleanup
+from bot.tg_message_formatter import split_html_message
+from core.redis_manager import redis_manager
+from core.tracing import TraceContext, current_trace
+
+logger = structlog.getLogger(__name__)
+
+DUE_KEY = "delivery:due"
+JOBS_KEY = "delivery:jobs"
+TEXT_KEY_PREFIX = "delivery:text:"
+MERGE_KEY_PREFIX = "delivery:merge:"
+OPEN_KEY_PREFIX = "delivery:open:"
+
+# Классы ошибок отправки
+RATE_LIMITED = "rate_limited"
+RECIPIENT_GONE = "recipient_gone"
+PERMANENT = "permanent"
+TRANSIENT = "transient"
+
+# Ответы Bot API, означающие, что писать этому чату больше нельзя
+GONE_MARKERS = (
+    "chat not found",
+    "user is deactivated",
+    "peer_id_invalid",
+    "bot was blocked",
+    "bot was kicked",
+)
+
+# Атомарно берет готовые задания и продлевает их срок на время аренды,
+# чтобы параллельные отправители не взяли одно задание дважды
+CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids == 0 then
+    return {}
+end
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+end
+return redis.call('HMGET', KEYS[2], unpack(ids))
+"""
+
+# Дописывает уведомление в открытое задание пользователя или открывает
+# новое. Открытое задание принимает дописки, только пока его срок не
+# менялся: взятое (срок сдвинут арендой) или отложенное повтором уже
+# не пополняется
+COALESCE_SCRIPT = """
+local open = redis.call('GET', KEYS[1])
+if open then
+    local id, due = string.match(open, '(%S+) (%S+)')
+    local score = redis.call('ZSCORE', KEYS[3], id)
+    if score and tonumber(score) == tonumber(due) then
+        redis.call('RPUSH', ARGV[6] .. id, ARGV[4])
+        return 0
+    end
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+redis.call('RPUSH', ARGV[6] .. ARGV[1], ARGV[4])
+redis.call('EXPIRE', ARGV[6] .. ARGV[1], ARGV[7])
+redis.call('SET', KEYS[1], ARGV[1] .. ' ' .. ARGV[3], 'PX', ARGV[5])
+return 1
+"""
+
+
+@dataclass
+class DeliveryJob:
+    """Доставка одного уведомления одному получателю"""
+
+    chat_id: int
+    text_id: str
+    user_id: int = 0
+    news_id: int = 0
+    # Посты пачки или объединенного сообщения — для журнала доставки
+    news_ids: list[int] = field(default_factory=list)
+    attempts: int = 0
+    trace: Optional[dict] = None
+    # Задание объединяет несколько уведомлений (окно DELIVERY_COALESCE_WINDOW)
+    merged: bool = False
+    # Сколько частей длинного сообщения уже отправлено
+    parts_sent: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "DeliveryJob":
+        return cls(**json.loads(data))
+
+
+class DeliveryQueue:
+    """Операции с очередью доставки"""
+
+    # Заданий в одном pipeline при постановке большой рассылки
+    ENQUEUE_CHUNK = 1000
+
+    def __init__(self):
+        self._claim = None
+        self._coalesce = None
+
+    @staticmethod
+    def _text_key(text_id: str) -> str:
+        return f"{TEXT_KEY_PREFIX}{text_id}"
+
+    @staticmethod
+    def _merge_key(job_id: str) -> str:
+        return f"{MERGE_KEY_PREFIX}{job_id}"
+
+    async def enqueue(
+        self,
+        text: str,
+        recipients: list[tuple[int, int]],
+        news_id: int = 0,
+        due_at: Optional[float] = None,
+        coalesce: bool = True,
+        news_ids: Optional[list[int]] = None,
+    ) -> int:
+        """Ставит рассылку text получателям (user_id, chat_id).
+
+        coalesce=False отправляет отдельным сообщением даже при
+        включенном окне объединения. news_ids — посты, собранные в text
+        (для журнала доставки), если их несколько.
+        """
+        text_id = hashlib.sha1(text.encode()).hexdigest()
+        text_ttl = getattr(settings, "DELIVERY_TEXT_TTL", 86400)
+        window = getattr(settings, "DELIVERY_COALESCE_WINDOW", 0)
+        client = redis_manager.client
+
+        await client.set(self._text_key(text_id), text, ex=text_ttl)
+        if coalesce and window > 0:
+            await self._enqueue_merged(
+                text_id, recipients, news_id, due_at, window, text_ttl
+            )
+            return len(recipients)
+
+        due_at = due_at or time.time()
+        trace = current_trace.get()
+        for start in range(0, len(recipients), self.ENQUEUE_CHUNK):
+            jobs = [
+                DeliveryJob(
+                    chat_id=chat_id,
+                    text_id=text_id,
+                    user_id=user_id,
+                    news_id=news_id,
+                    news_ids=news_ids or [],
+                    trace=trace.to_dict() if trace else None,
+                )
+                for user_id, chat_id in recipients[
+                    start : start + self.ENQUEUE_CHUNK
+                ]
+            ]
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.hset(
+                    JOBS_KEY, mapping={job.id: job.to_json() for job in jobs}
+                )
+                pipe.zadd(DUE_KEY, {job.id: due_at for job in jobs})
+                await pipe.execute()
+        return len(recipients)
+
+    async def _enqueue_merged(
+        self,
+        text_id: str,
+        recipients: list[tuple[int, int]],
+        news_id: int,
+        due_at: Optional[float],
+        window: float,
+        text_ttl: int,
+    ):
+        """Дописывает уведомление в открытые задания получателей"""
+        client = redis_manager.client
+        if self._coalesce is None:
+            self._coalesce = client.register_script(COALESCE_SCRIPT)
+
+        now = time.time()
+        due_at = due_at or now + window
+        open_ms = max(int((due_at - now) * 1000), 1)
+        trace = current_trace.get()
+        entry = f"{news_id}:{text_id}"
+        for start in range(0, len(recipients), self.ENQUEUE_CHUNK):
+            async with client.pipeline(transaction=False) as pipe:
+                for user_id, chat_id in recipients[
+                    start : start + self.ENQUEUE_CHUNK
+                ]:
+                    job = DeliveryJob(
+                        chat_id=chat_id,
+                        text_id="",
+                        user_id=user_id,
+                        trace=trace.to_dict() if trace else None,
+                        merged=True,
+                    )
+                    await self._coalesce(
+                        keys=[f"{OPEN_KEY_PREFIX}{user_id}", JOBS_KEY, DUE_KEY],
+                        args=[
+                            job.id,
+                            job.to_json(),
+                            due_at,
+                            entry,
+                            open_ms,
+                            MERGE_KEY_PREFIX,
+                            text_ttl,
+                        ],
+                        client=pipe,
+                    )
+                await pipe.execute()
+
+    async def claim(
+        self, limit: int
+    ) -> list[tuple[DeliveryJob, Optional[str]]]:
+        """Берет до limit готовых заданий вместе с текстами"""
+        if self._claim is None:
+            self._claim = redis_manager.client.register_script(CLAIM_SCRIPT)
+
+        now = time.time()
+        lease = getattr(settings, "DELIVERY_LEASE_SECONDS", 120)
+        raw_jobs = await self._claim(
+            keys=[DUE_KEY, JOBS_KEY], args=[now, limit, now + lease]
+        )
+        jobs = [DeliveryJob.from_json(raw) for raw in raw_jobs if raw]
+        if not jobs:
+            return []
+
+        merged = [job for job in jobs if job.merged]
+        entries = {}
+        if merged:
+            async with redis_manager.client.pipeline(transaction=False) as pipe:
+                for job in merged:
+                    pipe.lrange(self._merge_key(job.id), 0, -1)
+                entries = dict(
+                    zip((job.id for job in merged), await pipe.execute())
+                )
+
+        text_ids = {job.text_id for job in jobs if not job.merged}
+        for job_entries in entries.values():
+            text_ids.update(entry.split(":", 1)[1] for entry in job_entries)
+        text_ids = list(text_ids)
+        texts = dict(
+            zip(
+                text_ids,
+                await redis_manager.client.mget(
+                    [self._text_key(text_id) for text_id in text_ids]
+                ),
+            )
+        )
+
+        claimed = []
+        for job in jobs:
+            if not job.merged:
+                claimed.append((job, texts[job.text_id]))
+                continue
+            job.news_ids = list(
+                dict.fromkeys(
+                    int(entry.split(":", 1)[0]) for entry in entries[job.id]
+                )
+            )
+            # Повтор рекламы того же поста в окне отправляем один раз
+            parts = [
+                texts[text_id]
+                for text_id in dict.fromkeys(
+                    entry.split(":", 1)[1] for entry in entries[job.id]
+                )
+                if texts[text_id] is not None
+            ]
+            claimed.append((job, "\n\n".join(parts) if parts else None))
+        return claimed
+
+    async def ack(self, job: DeliveryJob):
+        """Удаляет выполненное задание"""
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.zrem(DUE_KEY, job.id)
+            pipe.hdel(JOBS_KEY, job.id)
+            if job.merged:
+                pipe.delete(self._merge_key(job.id))
+            await pipe.execute()
+
+    async def retry(self, job: DeliveryJob, delay: float):
+        """Возвращает задание в очередь через delay секунд"""
+        async with redis_manager.client.pipeline(transaction=True) as pipe:
+            pipe.hset(JOBS_KEY, job.id, job.to_json())
+            pipe.zadd(DUE_KEY, {job.id: time.time() + delay})
+            await pipe.execute()
+
+    async def release(self, jobs: list[DeliveryJob]):
+        """Снимает аренду, чтобы задания сразу взял другой отправитель"""
+        if jobs:
+            await redis_manager.client.zadd(
+                DUE_KEY, {job.id: time.time() for job in jobs}
+            )
+
+    async def extend(self, jobs: list[DeliveryJob]):
+        """Продлевает аренду взятых заданий.
+
+        XX не возвращает в очередь уже подтвержденные задания.
+        """
+        if jobs:
+            lease = getattr(settings, "DELIVERY_LEASE_SECONDS", 120)
+            await redis_manager.client.zadd(
+                DUE_KEY, {job.id: time.time() + lease for job in jobs}, xx=True
+            )
+
+    async def size(self) -> int:
+        return await redis_manager.client.zcard(DUE_KEY)
+
+
+def classify_send_error(error: Exception) -> str:
+    """Что делать после ошибки: ждать, отписать получателя, сдаться или повторить"""
+    if isinstance(error, TelegramRetryAfter):
+        return RATE_LIMITED
+    if isinstance(error, TelegramForbiddenError):
+        return RECIPIENT_GONE
+    if isinstance(error, (TelegramBadRequest, TelegramNotFound)):
+        message = str(error).lower()
+        if any(marker in message for marker in GONE_MARKERS):
+            return RECIPIENT_GONE
+        return PERMANENT
+    return TRANSIENT
+
+
+def backoff_delay(attempts: int) -> float:
+    """Экспоненциальная пауза с разбросом: половина фиксирована, половина случайна"""
+    delay = min(
+        getattr(settings, "DELIVERY_RETRY_MAX", 900),
+        getattr(settings, "DELIVERY_RETRY_BASE", 5) * 2 ** (attempts - 1),
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+delivery_queue = DeliveryQueue()
+
+
+class DeliveryWorker:
+    """Отправляет задания очереди доставки.
+
+    Один цикл берет готовые задания, пул из concurrency (по умолчанию
+    BROADCAST_CONCURRENCY) отправителей отправляет их через Broadcaster. Временные ошибки
+    повторяются с экспоненциальной паузой, постоянные и исчерпавшие
+    попытки переносятся в DeliveryDeadLetter. Пользователи, которым писать
+    больше нельзя, отписываются в фоне через RecipientCleanup. Итоги
+    доставки пишутся пачками в журнал DeliveryRecord.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        queue: DeliveryQueue = delivery_queue,
+        concurrency: Optional[int] = None,
+    ):
+        self.queue = queue
+        self.broadcaster = Broadcaster(bot)
+        self.concurrency = concurrency or getattr(
+            settings, "BROADCAST_CONCURRENCY", 10
+        )
+        # Впрок берем не больше, чем успеем отправить за половину аренды
+        lease = getattr(settings, "DELIVERY_LEASE_SECONDS", 120)
+        self.prefetch = max(
+            min(
+                self.concurrency * 2,
+                int(self.broadcaster.bucket.rate * lease / 2),
+            ),
+            1,
+        )
+        self._jobs: asyncio.Queue = asyncio.Queue()
+        # Взятые, но еще не завершенные задания
+        self._claimed: dict[str, DeliveryJob] = {}
+        self._tasks: list[asyncio.Task] = []
+        self.cleanup = RecipientCleanup()
+        self.ledger = DeliveryLedger()
+
+    def start(self):
+        self.cleanup.start()
+        self.ledger.start()
+        self._tasks = [
+            asyncio.create_task(self._claim_loop()),
+            asyncio.create_task(self._renew_loop()),
+        ]
+        self._tasks += [
+            asyncio.create_task(self._sender()) for _ in range(self.concurrency)
+        ]
+        logger.info(
+            f"Запущена доставка уведомлений: {self.concurrency} отправителей"
+        )
+
+    async def stop(self):
+        """Останавливает отправку и сразу возвращает в очередь взятое"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+        try:
+            await self.queue.release(list(self._claimed.values()))
+        except Exception as e:
+            logger.error(f"Не удалось вернуть задания доставки в очередь: {e}")
+        self._claimed.clear()
+        await self.cleanup.stop()
+        await self.ledger.stop()
+
+    async def _claim_loop(self):
+        poll_interval = getattr(settings, "DELIVERY_POLL_INTERVAL", 1.0)
+        while True:
+            # Берем немного впрок, но не больше prefetch вместе с теми,
+            # что уже отправляются
+            room = self.prefetch - len(self._claimed)
+            if room <= 0 or self._jobs.qsize() >= self.concurrency:
+                await asyncio.sleep(0.05)
+                continue
+
+            try:
+                claimed = await self.queue.claim(room)
+            except Exception as e:
+                logger.error(f"Ошибка чтения очереди доставки: {e}")
+                claimed = []
+
+            if not claimed:
+                await asyncio.sleep(poll_interval)
+                continue
+
+            for job, text in claimed:
+                self._claimed[job.id] = job
+                self._jobs.put_nowait((job, text))
+
+    async def _renew_loop(self):
+        """Продлевает аренду взятых заданий, пока они ждут отправки.
+
+        Пауза RetryAfter или медленная отправка не должны отдать задание
+        другому отправителю, пока оно лежит в буфере этого.
+        """
+        interval = getattr(settings, "DELIVERY_LEASE_SECONDS", 120) / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.queue.extend(list(self._claimed.values()))
+            except Exception as e:
+                logger.error(f"Не удалось продлить аренду заданий: {e}")
+
+    async def _sender(self):
+        while True:
+            job, text = await self._jobs.get()
+            try:
+                await self._deliver(job, text)
+            except Exception as e:
+                logger.error(f"Ошибка обработки задания доставки {job.id}: {e}")
+            finally:
+                # Даже если ack или retry не дошли до Redis: аренда больше
+                # не продлевается, и задание выполнит другой отправитель
+                self._claimed.pop(job.id, None)
+
+    async def _deliver(self, job: DeliveryJob, text: Optional[str]):
+        if text is None:
+            await self._dead_letter(job, "", "Текст рассылки истек")
+            return
+        if job.user_id in self.cleanup:
+            # Получатель уже недоступен, его отписка в очереди
+            self._record(job, DeliveryRecord.STATUS_GONE)
+            await self.queue.ack(job)
+            return
+
+        # Объединенное сообщение может не влезть в одно; при повторе
+        # уже отправленные части не дублируются
+        parts = split_html_message(text)
+        try:
+            for index in range(job.parts_sent, len(parts)):
+                await self._send_part(
+                    job, parts[index], last=index == len(parts) - 1
+                )
+                job.parts_sent += 1
+        except Exception as e:
+            await self._handle_error(job, text, e)
+            return
+
+        self._record(job, DeliveryRecord.STATUS_SENT)
+        await self.queue.ack(job)
+
+    def _record(self, job: DeliveryJob, status: str):
+        self.ledger.record(
+            job.user_id, job.news_ids or [job.news_id], status, job.enqueued_at
+        )
+
+    async def _send_part(self, job: DeliveryJob, text: str, last: bool):
+        """Отправляет часть сообщения; меню и трасса — у последней"""
+        if not last:
+            await self.broadcaster.send(job.chat_id, text)
+            return
+
+        token = None
+        if job.trace:
+            token = current_trace.set(TraceContext.from_dict(job.trace))
+        try:
+            await self.broadcaster.send(
+                job.chat_id, text, reply_markup=new_menu_kb()
+            )
+        finally:
+            if token is not None:
+                current_trace.reset(token)
+
+    async def _handle_error(self, job: DeliveryJob, text: str, e: Exception):
+        kind = classify_send_error(e)
+        if kind == RATE_LIMITED:
+            # Ограничение скорости — не ошибка получателя, попытку не считаем
+            await self.queue.retry(job, e.retry_after)
+        elif kind == RECIPIENT_GONE:
+            logger.info(
+                f"Пользователь {job.user_id} недоступен "
+                f"(chat_id: {job.chat_id}): {e}"
+            )
+            self.cleanup.add(job.user_id)
+            self._record(job, DeliveryRecord.STATUS_GONE)
+            await self.queue.ack(job)
+        elif kind == PERMANENT:
+            await self._dead_letter(job, text, f"{type(e).__name__}: {e}")
+        else:
+            job.attempts += 1
+            if job.attempts >= getattr(settings, "DELIVERY_MAX_ATTEMPTS", 6):
+                await self._dead_letter(job, text, f"{type(e).__name__}: {e}")
+                return
+            delay = backoff_delay(job.attempts)
+            logger.warning(
+                f"Ошибка отправки в чат {job.chat_id}, повтор через "
+                f"{delay:.0f} с (попытка {job.attempts}): {e}"
+            )
+            await self.queue.retry(job, delay)
+
+    async def _dead_letter(self, job: DeliveryJob, text: str, error: str):
+        """Переносит задание в недоставленные"""
+        self._record(job, DeliveryRecord.STATUS_FAILED)
+        logger.warning(
+            f"Уведомление в чат {job.chat_id} не доставлено: {error}"
+        )
+        try:
+            await DeliveryDeadLetter.objects.acreate(
+                user_id=job.user_id or None,
+                chat_id=job.chat_id,
+                channel_news_id=job.news_id or None,
+                text=text,
+                error=error,
+                attempts=job.attempts,
+                enqueued_at=datetime.fromtimestamp(
+                    job.enqueued_at, timezone.utc
+                ),
+            )
+        except Exception as e:
+            logger.error(
+                f"Не удалось сохранить недоставленное уведомление: {e}"
+            )
+        await self.queue.ack(job)
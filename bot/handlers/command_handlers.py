@@ -10,6 +10,7 @@ from aiogram.filters.command import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils import timezone
 
 from bot.handlers.helpers import (
@@ -22,6 +23,7 @@ from bot.keyboards import (
     add_more_channels_kb,
     back_to_menu_kb,
     cancel_reccurent_kb,
+    delivery_mode_kb,
     digest_kb,
     limit_reached_kb,
     new_menu_kb,
@@ -30,7 +32,7 @@ from bot.keyboards import (
     user_channels_kb,
 )
 from bot.middlewares import current_user
-from bot.models import Channel, ChannelSubscription, User
+from bot.models import Channel, ChannelNews, ChannelSubscription, User
 from bot.services.payment_service import cancel_recurring
 from bot.states import AddChannelsStates, ChannelsStates, DigestStates
 from bot.utils.link_parser import handle_forwarded_message, parse_channel_links
@@ -222,6 +224,62 @@ async def handle_digest_pagination(callback: CallbackQuery, state: FSMContext):
         )
 
 
+def delivery_mode_caption(user: User) -> str:
+    """Текст экрана режима уведомлений"""
+    digest_hour = getattr(settings, "DELIVERY_DIGEST_HOUR", 9)
+    quiet_start = getattr(settings, "DELIVERY_QUIET_START", 23)
+    quiet_end = getattr(settings, "DELIVERY_QUIET_END", 8)
+    return (
+        "<b>Как присылать рекламу?</b>\n\n"
+        "· <b>Сразу</b> — как только пост вышел;\n"
+        "· <b>Раз в час</b> — одним сообщением за прошедший час;\n"
+        f"· <b>Только дайджест</b> — раз в день в {digest_hour}:00;\n"
+        f"· <b>Сразу, кроме ночи</b> — с {quiet_start}:00 до {quiet_end}:00 "
+        "посты копятся и придут утром.\n\n"
+        f"Сейчас: <b>{user.get_delivery_mode_display()}</b>"
+    )
+
+
+@router.callback_query(F.data == "delivery_mode_btn")
+async def handle_delivery_mode(callback: CallbackQuery, state: FSMContext):
+    """Хендлер кнопки 'Уведомления'"""
+    user = current_user.get()
+
+    await send_file_message(
+        message=callback.message,
+        file_name="main_menu.jpg",
+        caption=delivery_mode_caption(user),
+        keyboard=delivery_mode_kb(user.delivery_mode),
+        edit_message=True,
+    )
+
+
+@router.callback_query(F.data.startswith("delivery_mode_"))
+async def handle_delivery_mode_choice(
+    callback: CallbackQuery, state: FSMContext
+):
+    """Хендлер выбора режима уведомлений"""
+    user = current_user.get()
+    mode = callback.data.removeprefix("delivery_mode_")
+    if mode not in dict(User.DELIVERY_MODE_CHOICES):
+        await callback.answer()
+        return
+
+    if mode != user.delivery_mode:
+        user.delivery_mode = mode
+        # Сигнал по update_fields обновит индекс подписчиков
+        await user.asave(update_fields=["delivery_mode"])
+    await callback.answer("Сохранено")
+
+    await send_file_message(
+        message=callback.message,
+        file_name="main_menu.jpg",
+        caption=delivery_mode_caption(user),
+        keyboard=delivery_mode_kb(user.delivery_mode),
+        edit_message=True,
+    )
+
+
 @router.callback_query(F.data == "support_btn")
 async def handle_support(callback: CallbackQuery, state: FSMContext):
     """Хендлер кнопки 'Помощь'"""
@@ -480,11 +538,19 @@ async def process_channel_subscription(
                 )
 
                 if not created:
+                    header_changed = (
+                        channel.title,
+                        channel.main_username,
+                        channel.is_private,
+                    ) != (result.title, result.username, is_private)
                     channel.title = result.title
                     channel.main_username = result.username
                     channel.link_subscription = result.link
                     channel.is_private = is_private
                     await channel.asave()
+                    if header_changed:
+                        # В готовом HTML постов остались старые название и ссылка
+                        await ChannelNews.areset_rendered([channel.pk])
 
                 await sync_to_async(user.channels.add)(channel)
 
@@ -24,7 +24,7 @@ from bot.keyboards import menu_kb
 from bot.middlewares import current_user
 from bot.models import ChannelNews, UserSubscription
 from bot.redis_client import get_file_id
-from bot.tools import clean_markdown, get_media_type, send_file, truncate_text
+from bot.tools import get_media_type, send_file
 from bot.translations import get_translation
 
 logger = structlog.getLogger(__name__)
@@ -318,32 +318,10 @@ async def generate_digest_text_paginated(
         .order_by("-created_at")
     )
 
-    all_news_blocks = []
-    async for news in user_news:
-        channel = news.channel
-        channel_link = (
-            f"https://t.me/{channel.main_username}"
-            if channel.main_username
-            else "https://t.me/c/{channel.telegram_id}"
-        )
-
-        # Формируем HTML разметку для каждой новости
-        channel_header = (
-            f'<a href="{channel_link}"><b>{channel.title}</b></a>:\n'
-        )
-
-        truncated = truncate_text(clean_markdown(news.message) or "")
-        news_content = f" · {truncated}\n"
-
-        post_link = (
-            f"{channel_link}/{news.message_id}"
-            if channel.main_username
-            else f"{channel_link}/{news.message_id}"
-        )
-        news_link = f'<a href="{post_link}">Перейти к посту →</a>'
-
-        news_block = channel_header + news_content + news_link + "\n"
-        all_news_blocks.append(news_block)
+    # HTML постов рендерится один раз на строку и хранится в rendered_html
+    news_list = await sync_to_async(list)(user_news)
+    await sync_to_async(ChannelNews.ensure_rendered)(news_list)
+    all_news_blocks = [news.rendered_html + "\n" for news in news_list]
 
     # Разделяем на страницы по max_length
     pages = []
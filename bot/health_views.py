@@ -2,7 +2,6 @@
 Health check views для мониторинга состояния приложения.
 """
 
-import redis
 import structlog
 from django.core.cache import cache
 from django.db import connection
@@ -10,6 +9,8 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+from core.redis_manager import redis_manager
+
 logger = structlog.getLogger(__name__)
 
 
@@ -60,15 +61,7 @@ def health_detailed(request):
 
     # Проверка Redis подключения напрямую
     try:
-        from django.conf import settings
-
-        redis_client = redis.Redis(
-            host=getattr(settings, "BOT_REDIS_HOST", "localhost"),
-            port=getattr(settings, "BOT_REDIS_PORT", 6379),
-            db=getattr(settings, "BOT_REDIS_DB", 0),
-            socket_connect_timeout=5,
-        )
-        redis_client.ping()
+        redis_manager.get_sync_client().ping()
         health_status["checks"]["redis_direct"] = {"status": "ok"}
     except Exception as e:
         health_status["checks"]["redis_direct"] = {
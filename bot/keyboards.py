@@ -4,7 +4,7 @@ from asgiref.sync import sync_to_async
 from django.conf import settings
 
 from bot.middlewares import current_user
-from bot.models import Tariff
+from bot.models import Tariff, User
 from bot.services.payment_service import generate_payment_url_direct
 from bot.translations import get_translation
 
@@ -13,6 +13,7 @@ MENU_BUTTONS: list[str] = [
     "add_channels_btn",
     "my_channels_btn",
     "digest_btn",
+    "delivery_mode_btn",
     "support_btn",
 ]
 
@@ -195,6 +196,26 @@ def digest_kb(page: int = 0, total_pages: int = 1) -> InlineKeyboardMarkup:
     return kb_builder.as_markup()
 
 
+def delivery_mode_kb(current_mode: str) -> InlineKeyboardMarkup:
+    """Клавиатура выбора режима уведомлений, текущий отмечен галочкой"""
+    kb_builder = InlineKeyboardBuilder()
+
+    for mode, title in User.DELIVERY_MODE_CHOICES:
+        mark = "✅ " if mode == current_mode else ""
+        kb_builder.row(
+            InlineKeyboardButton(
+                text=f"{mark}{title}", callback_data=f"delivery_mode_{mode}"
+            )
+        )
+
+    main_menu_text = get_translation("main_menu_btn")
+    kb_builder.row(
+        InlineKeyboardButton(text=main_menu_text, callback_data="main_menu_btn")
+    )
+
+    return kb_builder.as_markup()
+
+
 def create_inline_kb(
     *args: str, width: int = 2, separate_first: bool = False, **kwargs: str
 ) -> InlineKeyboardMarkup:
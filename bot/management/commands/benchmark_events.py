@@ -0,0 +1,176 @@
+"""Management команда для замера конвейера событий на одной машине"""
+
+import asyncio
+import statistics
+import time
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.event_manager import EventManager, EventType
+from userbot.redis_messages import NewAdMessage
+from utils.advertisement_detector import is_advertisement
+
+logger = structlog.getLogger(__name__)
+
+BENCH_CHANNEL = "bench:new_ad"
+
+AD_TEXT = "Скидка 30% на курсы английского #реклама erid: 2VtzqvdpL5K "
+PLAIN_TEXT = "Обзор новостей за неделю без рекламы "
+
+
+class Command(BaseCommand):
+    """
+    Замер конвейера прием → определение рекламы → рассылка.
+
+    Генерирует посты, прогоняет их через is_advertisement и публикует
+    рекламные как NewAdMessage через EventManager. Обработчик рассылки
+    фиксирует задержку от приема поста до вызова. С --transport memory
+    Redis не нужен: результат — нижняя граница задержки для сравнения
+    с pubsub и streams.
+    """
+
+    help = "Замеряет пропускную способность и задержку шины событий"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=10000,
+            help="Количество постов",
+        )
+        parser.add_argument(
+            "--transport",
+            choices=["memory", "pubsub", "streams"],
+            default=getattr(settings, "EVENT_TRANSPORT", "pubsub"),
+            help="Транспорт событий",
+        )
+        parser.add_argument(
+            "--ad-ratio",
+            type=float,
+            default=1.0,
+            help="Доля рекламных постов",
+        )
+        parser.add_argument(
+            "--text-length",
+            type=int,
+            default=500,
+            help="Длина текста поста в символах",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=60,
+            help="Сколько ждать доставки всех событий, секунд",
+        )
+
+    def handle(self, *args, **options):
+        # Транспорт создается лениво, поэтому достаточно подменить настройку
+        settings.EVENT_TRANSPORT = options["transport"]
+        EventManager._transport = None
+        EventManager._response_transport = None
+
+        result = asyncio.run(self._run(options))
+        logger.info("Замер шины событий", **result)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "\n".join(f"{key}: {value}" for key, value in result.items())
+            )
+        )
+
+    async def _run(self, options) -> dict:
+        count = options["messages"]
+        ad_every = round(1 / options["ad_ratio"]) if options["ad_ratio"] else 0
+        texts = {
+            True: (AD_TEXT * options["text_length"])[: options["text_length"]],
+            False: (PLAIN_TEXT * options["text_length"])[
+                : options["text_length"]
+            ],
+        }
+
+        started_at: dict[int, float] = {}
+        latencies_ms: list[float] = []
+        expected = sum(
+            1 for i in range(count) if ad_every and i % ad_every == 0
+        )
+        done = asyncio.Event()
+        if not expected:
+            done.set()
+
+        async def fan_out(message: NewAdMessage):
+            latencies_ms.append(
+                (time.perf_counter() - started_at.pop(message.message_id))
+                * 1000
+            )
+            if len(latencies_ms) == expected:
+                done.set()
+
+        event_manager = EventManager()
+        event_manager.register_handler(
+            EventType.NEW_AD_MESSAGE, fan_out, BENCH_CHANNEL
+        )
+        await event_manager.start_listening()
+        # Даем слушателю подписаться, иначе первые сообщения pubsub потеряются
+        await asyncio.sleep(0.5)
+
+        start = time.perf_counter()
+        try:
+            for message_id in range(count):
+                is_ad_post = bool(ad_every) and message_id % ad_every == 0
+                received_at = time.perf_counter()
+                if not is_advertisement(texts[is_ad_post]):
+                    continue
+
+                started_at[message_id] = received_at
+                await event_manager.publish_event(
+                    EventType.NEW_AD_MESSAGE,
+                    NewAdMessage(
+                        channel_id=1,
+                        channel_title="Бенчмарк",
+                        message_id=message_id,
+                        message_text=texts[is_ad_post],
+                    ),
+                    BENCH_CHANNEL,
+                )
+                # Отдаем управление, чтобы слушатель читал параллельно
+                await asyncio.sleep(0)
+
+            try:
+                await asyncio.wait_for(done.wait(), options["timeout"])
+            except asyncio.TimeoutError:
+                logger.warning("Не все события доставлены до таймаута")
+            elapsed = time.perf_counter() - start
+        finally:
+            await event_manager.stop_listening()
+
+        return self._summary(
+            options["transport"], count, elapsed, latencies_ms, expected
+        )
+
+    @staticmethod
+    def _summary(
+        transport: str,
+        count: int,
+        elapsed: float,
+        latencies_ms: list[float],
+        expected: int,
+    ) -> dict:
+        result = {
+            "transport": transport,
+            "posts": count,
+            "ads_published": expected,
+            "ads_delivered": len(latencies_ms),
+            "elapsed_s": round(elapsed, 3),
+            "posts_per_s": round(count / elapsed) if elapsed else 0,
+        }
+        if len(latencies_ms) >= 2:
+            percentiles = statistics.quantiles(latencies_ms, n=100)
+            result.update(
+                p50_ms=round(percentiles[49], 3),
+                p95_ms=round(percentiles[94], 3),
+                p99_ms=round(percentiles[98], 3),
+                max_ms=round(max(latencies_ms), 3),
+            )
+        return result
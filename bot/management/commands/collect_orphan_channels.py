@@ -0,0 +1,44 @@
+"""Management команда для выхода юзерботов из каналов без пользователей"""
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot.tasks import collect_orphan_channels_task
+
+logger = structlog.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Сборка неиспользуемых каналов.
+
+    Помечает каналы, от которых отписались все пользователи, и после
+    льготного периода USERBOT_GC_GRACE_HOURS выводит из них юзерботов.
+    Для периодического запуска добавьте задачу
+    bot.tasks.collect_orphan_channels_task в Celery Beat.
+    """
+
+    help = "Выводит юзерботов из каналов, на которые никто не подписан"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-leaves",
+            type=int,
+            default=getattr(settings, "USERBOT_GC_MAX_LEAVES", 50),
+            help="Максимум выходов из каналов за один запуск",
+        )
+
+    def handle(self, *args, **options):
+        max_leaves = options["max_leaves"]
+
+        logger.info(
+            "Запуск сборки неиспользуемых каналов", max_leaves=max_leaves
+        )
+
+        task = collect_orphan_channels_task.delay(max_leaves)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Задача отправлена в Celery (task_id: {task.id}, max_leaves: {max_leaves})"
+            )
+        )
@@ -0,0 +1,41 @@
+"""Management команда для перебалансировки каналов между юзерботами"""
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot.tasks import rebalance_channels_task
+
+logger = structlog.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Перебалансировка каналов между юзерботами.
+
+    Переносит каналы с перегруженных аккаунтов на свободные с учетом
+    max_channels и объема сообщений в каналах. Для периодического запуска
+    добавьте задачу bot.tasks.rebalance_channels_task в Celery Beat.
+    """
+
+    help = "Переносит каналы с перегруженных юзерботов на свободные"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-moves",
+            type=int,
+            default=getattr(settings, "USERBOT_REBALANCE_MAX_MOVES", 10),
+            help="Максимум переносов каналов за один запуск",
+        )
+
+    def handle(self, *args, **options):
+        max_moves = options["max_moves"]
+
+        logger.info("Запуск перебалансировки каналов", max_moves=max_moves)
+
+        task = rebalance_channels_task.delay(max_moves)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Задача отправлена в Celery (task_id: {task.id}, max_moves: {max_moves})"
+            )
+        )
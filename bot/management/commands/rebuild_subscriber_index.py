@@ -0,0 +1,50 @@
+"""Management команда для перестройки индекса подписчиков в Redis"""
+
+import structlog
+from django.core.management.base import BaseCommand
+
+from bot.models import Channel
+from bot.subscriber_index import subscriber_index
+
+logger = structlog.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Перестройка индекса подписчиков каналов.
+
+    Заново строит множества channel:subscribers:<telegram_id> из
+    ChannelUser. Нужна после ручных изменений в БД в обход ORM или
+    после очистки Redis; в обычной работе индекс обновляют сигналы.
+    """
+
+    help = "Перестраивает индекс подписчиков каналов в Redis"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--channel",
+            type=int,
+            help="telegram_id канала; без него — все каналы",
+        )
+
+    def handle(self, *args, **options):
+        channels = Channel.objects.all()
+        if options["channel"]:
+            channels = channels.filter(telegram_id=options["channel"])
+
+        rebuilt = 0
+        subscribers = 0
+        for telegram_id in channels.values_list("telegram_id", flat=True):
+            subscribers += len(subscriber_index.rebuild(telegram_id))
+            rebuilt += 1
+
+        logger.info(
+            "Индекс подписчиков перестроен",
+            channels=rebuilt,
+            subscribers=subscribers,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Перестроено каналов: {rebuilt}, подписчиков: {subscribers}"
+            )
+        )
@@ -0,0 +1,68 @@
+"""Management команда для отдельного отправителя уведомлений"""
+
+import asyncio
+import signal
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot.bot import LANE_BULK, create_bot
+from bot.delivery_queue import DeliveryWorker
+from core.redis_manager import redis_manager
+from core.tracing import trace_metrics
+
+logger = structlog.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Отправитель уведомлений из очереди доставки.
+
+    Берет задания из Redis и отправляет их, не занимая процесс бота,
+    который отвечает пользователям. Реплик может быть несколько: лимит
+    скорости BROADCAST_RATE общий для всех через token bucket в Redis
+    (BROADCAST_LIMITER=redis). Чтобы бот не отправлял сам, задайте ему
+    DELIVERY_WORKER_IN_BOT=False.
+    """
+
+    help = "Отправляет уведомления из очереди доставки"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "BROADCAST_CONCURRENCY", 10),
+            help="Параллельных отправителей в этом процессе",
+        )
+
+    def handle(self, *args, **options):
+        if getattr(settings, "BROADCAST_LIMITER", "redis") != "redis":
+            logger.warning(
+                "BROADCAST_LIMITER не redis: реплики не делят лимит скорости"
+            )
+        asyncio.run(self._run(options["concurrency"]))
+
+    async def _run(self, concurrency: int):
+        await redis_manager.connect()
+        redis_manager.start_metrics_reporter()
+        trace_metrics.start_reporter()
+
+        bot = create_bot(LANE_BULK)
+        worker = DeliveryWorker(bot, concurrency=concurrency)
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        worker.start()
+        logger.info("Отправитель уведомлений запущен")
+        try:
+            await stop_event.wait()
+        finally:
+            logger.info("Остановка отправителя уведомлений...")
+            # Взятые задания сразу возвращаются в очередь другим репликам
+            await worker.stop()
+            await bot.session.close()
+            await redis_manager.disconnect()
@@ -1,4 +1,5 @@
 import asyncio
+import signal
 import sys
 import time
 
@@ -55,10 +56,21 @@ class Command(BaseCommand):
             self._scheduled_restart(restart_interval)
         )
 
-        # Ждем бесконечно или до перезагрузки
+        # SIGTERM приходит при деплое (docker compose down): останавливаемся
+        # штатно, дорабатывая начатое в пределах stop_grace_period
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        # Ждем сигнала остановки или перезагрузки
         try:
             while True:
-                await asyncio.sleep(100)
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=100)
+                    break
+                except asyncio.TimeoutError:
+                    pass
 
                 # Проверяем время работы (на случай если restart_task не сработает)
                 uptime = time.time() - start_time
@@ -71,6 +83,10 @@ class Command(BaseCommand):
                     await userbot_manager.stop()
                     sys.exit(0)
 
+            logger.warning("Получен сигнал остановки. Завершение работы...")
+            restart_task.cancel()
+            await userbot_manager.stop()
+
         except KeyboardInterrupt:
             restart_task.cancel()
             await userbot_manager.stop()
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0014_user_ads_campaign"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="channel",
+            name="replication_factor",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Сколько аккаунтов держат подписку на канал (1 — без резерва)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="channelsubscription",
+            name="is_primary",
+            field=models.BooleanField(
+                default=True,
+                help_text="Основная подписка: сообщения канала обрабатываются только через неё",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userbot",
+            name="is_standby",
+            field=models.BooleanField(
+                default=False,
+                help_text="Резервный аккаунт: держит реплики каналов и не получает новых подписок",
+            ),
+        ),
+    ]
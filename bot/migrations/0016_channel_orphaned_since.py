@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0015_standby_replicas"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="channel",
+            name="orphaned_since",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Когда от канала отписался последний пользователь",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0016_channel_orphaned_since"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeliveryDeadLetter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "chat_id",
+                    models.BigIntegerField(verbose_name="ID чата в Telegram"),
+                ),
+                (
+                    "text",
+                    models.TextField(
+                        default="", verbose_name="Текст уведомления"
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        default="", verbose_name="Последняя ошибка"
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Попыток"
+                    ),
+                ),
+                (
+                    "enqueued_at",
+                    models.DateTimeField(verbose_name="Поставлено в очередь"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата"
+                    ),
+                ),
+                (
+                    "channel_news",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="bot.channelnews",
+                        verbose_name="Сообщение из канала",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="dead_letters",
+                        to="bot.user",
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Недоставленное уведомление",
+                "verbose_name_plural": "Недоставленные уведомления",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["-created_at"],
+                        name="bot_deliver_created_968a17_idx",
+                    )
+                ],
+            },
+        ),
+    ]
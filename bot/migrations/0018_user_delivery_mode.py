@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0017_delivery_dead_letter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="delivery_mode",
+            field=models.CharField(
+                choices=[
+                    ("instant", "Сразу"),
+                    ("hourly", "Раз в час"),
+                    ("daily", "Только дайджест"),
+                    ("quiet", "Сразу, кроме ночи"),
+                ],
+                default="instant",
+                help_text="Как присылать рекламу: сразу, пачкой раз в час, только ежедневным дайджестом или сразу, но не в тихие часы",
+                max_length=10,
+                verbose_name="Режим уведомлений",
+            ),
+        ),
+    ]
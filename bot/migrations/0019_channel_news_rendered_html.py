@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0018_user_delivery_mode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="channelnews",
+            name="rendered_html",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="Рендерится один раз при сохранении поста или при первом показе; используется в рассылке и дайджестах",
+                verbose_name="HTML уведомления",
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0019_channel_news_rendered_html"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeliveryRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("sent", "Доставлено"),
+                            ("failed", "Не доставлено"),
+                            ("gone", "Пользователь недоступен"),
+                        ],
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "latency_ms",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="От постановки в очередь до отправки",
+                        verbose_name="Задержка, мс",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата"
+                    ),
+                ),
+                (
+                    "channel_news",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="bot.channelnews",
+                        verbose_name="Сообщение из канала",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="bot.user",
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Доставка уведомления",
+                "verbose_name_plural": "Журнал доставки",
+                "indexes": [
+                    models.Index(
+                        fields=["day"], name="bot_deliver_day_b6f91e_idx"
+                    ),
+                    models.Index(
+                        fields=["channel_news", "status"],
+                        name="bot_deliver_channel_3e994b_idx",
+                    ),
+                ],
+                "unique_together": {("user", "channel_news")},
+            },
+        ),
+    ]
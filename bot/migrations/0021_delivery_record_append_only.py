@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bot", "0020_delivery_record"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="deliveryrecord",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="deliveryrecord",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "sent")),
+                fields=("user", "channel_news"),
+                name="unique_sent_delivery",
+            ),
+        ),
+    ]
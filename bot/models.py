@@ -20,6 +20,19 @@ class User(models.Model):
         (STATUS_BANNED, "Забанил"),
     ]
 
+    DELIVERY_INSTANT = "instant"
+    DELIVERY_HOURLY = "hourly"
+    DELIVERY_DAILY = "daily"
+    DELIVERY_QUIET = "quiet"
+    DELIVERY_MODE_CHOICES = [
+        (DELIVERY_INSTANT, "Сразу"),
+        (DELIVERY_HOURLY, "Раз в час"),
+        (DELIVERY_DAILY, "Только дайджест"),
+        (DELIVERY_QUIET, "Сразу, кроме ночи"),
+    ]
+    # Режимы, в которых реклама приходит по мере выхода постов
+    PUSH_DELIVERY_MODES = (DELIVERY_INSTANT, DELIVERY_QUIET)
+
     tg_user_id = models.BigIntegerField(
         "ID пользователя в Telegram", unique=True
     )
@@ -73,6 +86,14 @@ class User(models.Model):
     status_changed_at = models.DateTimeField(
         verbose_name="Дата смены статуса", null=True, blank=True
     )
+    delivery_mode = models.CharField(
+        verbose_name="Режим уведомлений",
+        choices=DELIVERY_MODE_CHOICES,
+        default=DELIVERY_INSTANT,
+        max_length=10,
+        help_text="Как присылать рекламу: сразу, пачкой раз в час, "
+        "только ежедневным дайджестом или сразу, но не в тихие часы",
+    )
     ads_campaign = models.CharField(
         verbose_name="Рекламная кампания",
         max_length=255,
@@ -81,6 +102,14 @@ class User(models.Model):
         help_text="Рекламная кампания, по которой пришел пользователь",
     )
 
+    @property
+    def receives_pushes(self) -> bool:
+        """Получает ли пользователь рекламу по мере выхода постов"""
+        return (
+            self.status == self.STATUS_ACTIVE
+            and self.delivery_mode in self.PUSH_DELIVERY_MODES
+        )
+
     def get_display_name(self) -> str:
         """Возвращает @username, если он есть, иначе first_name."""
         if self.username:
@@ -275,6 +304,10 @@ class UserBot(models.Model):
     max_channels = models.IntegerField(
         default=500, help_text="Максимум каналов для этого аккаунта"
     )
+    is_standby = models.BooleanField(
+        default=False,
+        help_text="Резервный аккаунт: держит реплики каналов и не получает новых подписок",
+    )
     last_error = models.TextField(blank=True, help_text="Последняя ошибка")
     last_activity = models.DateTimeField(
         null=True, blank=True, help_text="Последняя активность"
@@ -325,6 +358,15 @@ class Channel(models.Model):
     main_username = models.TextField(null=True, blank=True)
     link_subscription = models.TextField(null=True, blank=True)
     is_private = models.BooleanField(default=False)
+    replication_factor = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Сколько аккаунтов держат подписку на канал (1 — без резерва)",
+    )
+    orphaned_since = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Когда от канала отписался последний пользователь",
+    )
 
     users = models.ManyToManyField(
         User,
@@ -369,6 +411,10 @@ class ChannelSubscription(models.Model):
     is_subscribed = models.BooleanField(
         default=False, help_text="Успешно ли подписался"
     )
+    is_primary = models.BooleanField(
+        default=True,
+        help_text="Основная подписка: сообщения канала обрабатываются только через неё",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -384,7 +430,8 @@ class ChannelSubscription(models.Model):
 
     def __str__(self):
         status = "✓" if self.is_subscribed else "✗"
-        return f"{status} {self.userbot.name} → {self.channel.title}"
+        role = "" if self.is_primary else " (резерв)"
+        return f"{status} {self.userbot.name} → {self.channel.title}{role}"
 
 
 class ChannelNews(models.Model):
@@ -394,6 +441,13 @@ class ChannelNews(models.Model):
     message_id = models.BigIntegerField()
     message = models.TextField(default="")
     url = models.TextField(null=True, blank=True)
+    rendered_html = models.TextField(
+        "HTML уведомления",
+        blank=True,
+        default="",
+        help_text="Рендерится один раз при сохранении поста или при первом "
+        "показе; используется в рассылке и дайджестах",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -405,6 +459,34 @@ class ChannelNews(models.Model):
             models.Index(fields=["-created_at", "channel"]),
         ]
 
+    def render_html(self) -> str:
+        """HTML уведомления о посте; рендерится один раз на строку"""
+        if not self.rendered_html:
+            from bot.tools import render_ad_html
+
+            self.rendered_html = render_ad_html(
+                self.channel, self.message_id, self.message
+            )
+        return self.rendered_html
+
+    @classmethod
+    def ensure_rendered(cls, news: list["ChannelNews"]):
+        """Рендерит посты без HTML и сохраняет их одним bulk_update"""
+        missing = [item for item in news if not item.rendered_html]
+        for item in missing:
+            item.render_html()
+        if missing:
+            cls.objects.bulk_update(missing, ["rendered_html"])
+
+    @classmethod
+    async def areset_rendered(cls, channel_ids: list[int]) -> int:
+        """Сбрасывает HTML постов каналов после смены их названия или ссылки"""
+        return (
+            await cls.objects.filter(channel_id__in=channel_ids)
+            .exclude(rendered_html="")
+            .aupdate(rendered_html="")
+        )
+
 
 class TextTemplate(models.Model):
     text_key = models.CharField(
@@ -664,3 +746,99 @@ class Payment(models.Model):
     def is_failed(self):
         """Неудачен ли платеж"""
         return self.status == self.STATUS_FAILED
+
+
+class DeliveryDeadLetter(models.Model):
+    """Уведомление, которое не удалось доставить после всех попыток"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="dead_letters",
+        verbose_name="Пользователь",
+    )
+    chat_id = models.BigIntegerField("ID чата в Telegram")
+    channel_news = models.ForeignKey(
+        ChannelNews,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Сообщение из канала",
+    )
+    text = models.TextField("Текст уведомления", default="")
+    error = models.TextField("Последняя ошибка", default="")
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    enqueued_at = models.DateTimeField("Поставлено в очередь")
+    created_at = models.DateTimeField("Дата", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Недоставленное уведомление"
+        verbose_name_plural = "Недоставленные уведомления"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Чат {self.chat_id}: {self.error[:50]}"
+
+
+class DeliveryRecord(models.Model):
+    """Запись журнала доставки: какой пользователь получил какой пост.
+
+    Журнал только пополняется (bulk_create из DeliveryWorker): каждая
+    попытка — отдельная строка. Он служит для аналитики и защиты от
+    повторной рассылки: успешная доставка пары (пользователь, пост)
+    записывается один раз. Старые дни удаляет purge_delivery_ledger_task.
+    """
+
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_GONE = "gone"
+    STATUS_CHOICES = [
+        (STATUS_SENT, "Доставлено"),
+        (STATUS_FAILED, "Не доставлено"),
+        (STATUS_GONE, "Пользователь недоступен"),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        verbose_name="Пользователь",
+    )
+    channel_news = models.ForeignKey(
+        ChannelNews,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        verbose_name="Сообщение из канала",
+    )
+    status = models.CharField("Статус", choices=STATUS_CHOICES, max_length=10)
+    latency_ms = models.PositiveIntegerField(
+        "Задержка, мс",
+        default=0,
+        help_text="От постановки в очередь до отправки",
+    )
+    day = models.DateField("День")
+    created_at = models.DateTimeField("Дата", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Доставка уведомления"
+        verbose_name_plural = "Журнал доставки"
+        indexes = [
+            models.Index(fields=["day"]),
+            models.Index(fields=["channel_news", "status"]),
+        ]
+        constraints = [
+            # Неудачных попыток может быть сколько угодно, доставка — одна
+            models.UniqueConstraint(
+                fields=["user", "channel_news"],
+                condition=models.Q(status="sent"),
+                name="unique_sent_delivery",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ← {self.channel_news_id}: {self.status}"
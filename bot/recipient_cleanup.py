@@ -0,0 +1,76 @@
+"""Фоновая отписка пользователей, которым больше нельзя писать"""
+
+import asyncio
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bot.models import ChannelUser, User
+
+logger = structlog.getLogger(__name__)
+
+
+class RecipientCleanup:
+    """Копит пользователей, заблокировавших бота или удаленных, и пачкой
+    помечает их STATUS_BANNED и удаляет их ChannelUser.
+
+    Удаление связей через ORM обновляет индекс подписчиков сигналами,
+    поэтому следующие рассылки их уже не включают.
+    """
+
+    def __init__(self):
+        self.pending: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    def add(self, user_id: int):
+        if user_id:
+            self.pending.add(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.pending
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    async def _run(self):
+        interval = getattr(settings, "DELIVERY_CLEANUP_INTERVAL", 30)
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        user_ids, self.pending = self.pending, set()
+        try:
+            banned, removed = await sync_to_async(self._ban)(user_ids)
+            logger.info(
+                f"Отписаны недоступные пользователи: {banned}, "
+                f"удалено связей с каналами: {removed}"
+            )
+        except Exception as e:
+            # Вернем в очередь, попробуем в следующий раз
+            self.pending |= user_ids
+            logger.error(f"Ошибка отписки недоступных пользователей: {e}")
+
+    @staticmethod
+    def _ban(user_ids: set[int]) -> tuple[int, int]:
+        with transaction.atomic():
+            banned = User.objects.filter(
+                pk__in=user_ids, status=User.STATUS_ACTIVE
+            ).update(
+                status=User.STATUS_BANNED, status_changed_at=timezone.now()
+            )
+            removed, _ = ChannelUser.objects.filter(
+                user_id__in=user_ids
+            ).delete()
+        return banned, removed
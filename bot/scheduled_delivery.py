@@ -0,0 +1,242 @@
+"""Доставка рекламы по расписанию пользователя.
+
+Режимы User.delivery_mode:
+- instant — сразу, через индекс подписчиков и очередь доставки;
+- quiet — сразу, но в тихие часы (DELIVERY_QUIET_START —
+  DELIVERY_QUIET_END) уведомление откладывается до их окончания;
+- hourly — раз в час одним сообщением за прошедший час;
+- daily — раз в сутки дайджестом в DELIVERY_DIGEST_HOUR.
+
+Пачки собирает Celery задача send_delivery_batches_task: одним запросом
+на окно берутся все пары (пользователь, пост), пользователи с одинаковым
+набором постов получают один и тот же текст, и все уходит через общую
+очередь доставки с ее лимитом скорости.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from bot.delivery_queue import delivery_queue
+from bot.models import ChannelNews, ChannelUser, User
+from core.redis_manager import redis_manager
+
+logger = structlog.getLogger(__name__)
+
+BATCH_HEADERS = {
+    User.DELIVERY_HOURLY: "<b>Реклама за последний час</b>",
+    User.DELIVERY_DAILY: "<b>Дайджест рекламы за сутки</b>",
+}
+# Отметка окна, чтобы повторный запуск задачи не дублировал пачки:
+# running — отправляется, done — отправлено, failed — упало на середине.
+# Рядом, в <ключ>:users, — получатели, чьи пачки уже в очереди
+SENT_KEY_PREFIX = "delivery:batch:"
+SENT_KEY_TTL = 2 * 24 * 3600
+
+# Забирает окно, если его еще не отправляли или отправка упала
+CLAIM_WINDOW_SCRIPT = """
+local state = redis.call('GET', KEYS[1])
+if state and state ~= 'failed' then
+    return 0
+end
+redis.call('SET', KEYS[1], 'running', 'EX', ARGV[1])
+return 1
+"""
+_claim_window = None
+
+
+def local_now() -> datetime:
+    """Текущее время в часовом поясе пользователей"""
+    return timezone.now().astimezone(
+        ZoneInfo(getattr(settings, "DELIVERY_TIMEZONE", "Europe/Moscow"))
+    )
+
+
+def quiet_hours_end(now: Optional[datetime] = None) -> Optional[datetime]:
+    """Окончание текущих тихих часов; None, если сейчас они не идут"""
+    now = now or local_now()
+    start = getattr(settings, "DELIVERY_QUIET_START", 23)
+    end = getattr(settings, "DELIVERY_QUIET_END", 8)
+    if start == end:
+        return None
+    if start < end:
+        is_quiet = start <= now.hour < end
+    else:
+        # Тихие часы переходят через полночь
+        is_quiet = now.hour >= start or now.hour < end
+    if not is_quiet:
+        return None
+
+    quiet_end = now.replace(hour=end, minute=0, second=0, microsecond=0)
+    if quiet_end <= now:
+        quiet_end += timedelta(days=1)
+    return quiet_end
+
+
+async def split_quiet_recipients(
+    recipients: list[tuple[int, int]],
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]], Optional[float]]:
+    """Делит получателей на тех, кому отправить сейчас, и тех, кому —
+    после тихих часов. Вне тихих часов БД не читается."""
+    quiet_end = quiet_hours_end()
+    if quiet_end is None or not recipients:
+        return recipients, [], None
+
+    quiet_ids = set(
+        await sync_to_async(list)(
+            User.objects.filter(
+                pk__in=[user_id for user_id, _ in recipients],
+                delivery_mode=User.DELIVERY_QUIET,
+            ).values_list("id", flat=True)
+        )
+    )
+    if not quiet_ids:
+        return recipients, [], None
+
+    now, deferred = [], []
+    for recipient in recipients:
+        (deferred if recipient[0] in quiet_ids else now).append(recipient)
+    return now, deferred, quiet_end.timestamp()
+
+
+def batch_window(
+    mode: str, now: Optional[datetime] = None
+) -> tuple[datetime, datetime]:
+    """Последнее завершившееся окно пачки: прошлый час или прошлые сутки"""
+    now = now or local_now()
+    if mode == User.DELIVERY_HOURLY:
+        end = now.replace(minute=0, second=0, microsecond=0)
+        return end - timedelta(hours=1), end
+
+    end = now.replace(
+        hour=getattr(settings, "DELIVERY_DIGEST_HOUR", 9),
+        minute=0,
+        second=0,
+        microsecond=0,
+    )
+    if end > now:
+        end -= timedelta(days=1)
+    return end - timedelta(days=1), end
+
+
+def _collect_batches(
+    mode: str, start: datetime, end: datetime
+) -> tuple[
+    dict[tuple[int, ...], list[tuple[int, int]]], dict[int, ChannelNews]
+]:
+    """Посты окна по получателям: один запрос на все окно"""
+    rows = ChannelUser.objects.filter(
+        user__status=User.STATUS_ACTIVE,
+        user__delivery_mode=mode,
+        channel__news__created_at__gte=start,
+        channel__news__created_at__lt=end,
+    ).values_list("user_id", "user__tg_chat_id", "channel__news__id")
+
+    news_by_recipient = defaultdict(list)
+    for user_id, chat_id, news_id in rows:
+        news_by_recipient[(user_id, chat_id)].append(news_id)
+    if not news_by_recipient:
+        return {}, {}
+
+    news_ids = {
+        news_id for ids in news_by_recipient.values() for news_id in ids
+    }
+    news = {
+        item.pk: item
+        for item in ChannelNews.objects.filter(pk__in=news_ids)
+        .select_related("channel")
+        .only(
+            "message_id",
+            "message",
+            "rendered_html",
+            "created_at",
+            "channel__telegram_id",
+            "channel__title",
+            "channel__main_username",
+            "channel__is_private",
+        )
+    }
+    ChannelNews.ensure_rendered(list(news.values()))
+
+    # Получатели с одинаковым набором постов получают один текст
+    batches = defaultdict(list)
+    for recipient, ids in news_by_recipient.items():
+        batches[tuple(sorted(ids))].append(recipient)
+    return batches, news
+
+
+def render_batch(mode: str, news: list[ChannelNews]) -> str:
+    """Текст пачки: заголовок и посты от новых к старым"""
+    max_ads = getattr(settings, "DELIVERY_BATCH_MAX_ADS", 20)
+    news = sorted(news, key=lambda item: item.created_at, reverse=True)
+    parts = [BATCH_HEADERS[mode]]
+    parts += [item.render_html() for item in news[:max_ads]]
+    if len(news) > max_ads:
+        parts.append(
+            f"И еще {len(news) - max_ads} — в разделе «Дайджест» главного меню"
+        )
+    return "\n\n".join(parts)
+
+
+async def claim_window(sent_key: str) -> bool:
+    """Забирает отправку окна; False — окно отправляется или отправлено"""
+    global _claim_window
+    if _claim_window is None:
+        _claim_window = redis_manager.client.register_script(
+            CLAIM_WINDOW_SCRIPT
+        )
+    return bool(await _claim_window(keys=[sent_key], args=[SENT_KEY_TTL]))
+
+
+async def send_batches(mode: str, now: Optional[datetime] = None) -> int:
+    """Ставит в очередь доставки пачки режима mode за последнее окно"""
+    start, end = batch_window(mode, now)
+    sent_key = f"{SENT_KEY_PREFIX}{mode}:{int(end.timestamp())}"
+    if not await claim_window(sent_key):
+        logger.info(f"Пачки {mode} за окно до {end} уже отправлены")
+        return 0
+
+    client = redis_manager.client
+    done_key = f"{sent_key}:users"
+    # После сбоя досылаем только тем, чьи пачки не попали в очередь
+    done = {int(user_id) for user_id in await client.smembers(done_key)}
+    try:
+        batches, news = await sync_to_async(_collect_batches)(mode, start, end)
+        queued = 0
+        for news_ids, recipients in batches.items():
+            items = [news[news_id] for news_id in news_ids if news_id in news]
+            recipients = [
+                recipient
+                for recipient in recipients
+                if recipient[0] not in done
+            ]
+            if not items or not recipients:
+                continue
+            queued += await delivery_queue.enqueue(
+                render_batch(mode, items),
+                recipients,
+                coalesce=False,
+                news_ids=[item.pk for item in items],
+            )
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.sadd(done_key, *(user_id for user_id, _ in recipients))
+                pipe.expire(done_key, SENT_KEY_TTL)
+                await pipe.execute()
+    except Exception:
+        # Следующий запуск дошлет окно, пропустив уже поставленные пачки
+        await client.set(sent_key, "failed", ex=SENT_KEY_TTL)
+        raise
+
+    await client.set(sent_key, "done", ex=SENT_KEY_TTL)
+
+    logger.info(
+        f"Пачки {mode} за {start:%d.%m %H:%M} — {end:%H:%M}: "
+        f"получателей {queued}, разных текстов {len(batches)}"
+    )
+    return queued
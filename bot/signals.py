@@ -0,0 +1,130 @@
+"""Сигналы, поддерживающие индекс подписчиков каналов в Redis"""
+
+import structlog
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from bot.models import Channel, ChannelUser, User
+from bot.subscriber_index import subscriber_index
+
+logger = structlog.getLogger(__name__)
+
+
+def _on_commit(action, *args):
+    """Обновляет индекс после коммита; ошибки Redis не ломают запись в БД"""
+
+    def run():
+        try:
+            action(*args)
+        except Exception as e:
+            logger.error(f"Ошибка обновления индекса подписчиков: {e}")
+
+    transaction.on_commit(run)
+
+
+def _push_users():
+    """Пользователи, которые получают рекламу сразу (как в rebuild индекса)"""
+    return User.objects.filter(
+        status=User.STATUS_ACTIVE,
+        delivery_mode__in=User.PUSH_DELIVERY_MODES,
+    )
+
+
+@receiver(post_save, sender=ChannelUser)
+def channel_user_saved(sender, instance: ChannelUser, created, **kwargs):
+    if not created:
+        return
+    # Часовые пачки, дайджест и забанившие в индекс не попадают
+    chat_id = (
+        _push_users()
+        .filter(pk=instance.user_id)
+        .values_list("tg_chat_id", flat=True)
+        .first()
+    )
+    if chat_id is None:
+        return
+    telegram_id = (
+        Channel.objects.filter(pk=instance.channel_id)
+        .values_list("telegram_id", flat=True)
+        .first()
+    )
+    _on_commit(subscriber_index.add, telegram_id, [(instance.user_id, chat_id)])
+
+
+@receiver(post_delete, sender=ChannelUser)
+def channel_user_deleted(sender, instance: ChannelUser, **kwargs):
+    # Канал или пользователь могут удаляться каскадом вместе со связью
+    telegram_id = (
+        Channel.objects.filter(pk=instance.channel_id)
+        .values_list("telegram_id", flat=True)
+        .first()
+    )
+    chat_id = (
+        User.objects.filter(pk=instance.user_id)
+        .values_list("tg_chat_id", flat=True)
+        .first()
+    )
+    if telegram_id is None or chat_id is None:
+        _on_commit(subscriber_index.drop, telegram_id)
+        return
+    _on_commit(
+        subscriber_index.remove, telegram_id, [(instance.user_id, chat_id)]
+    )
+
+
+@receiver(m2m_changed, sender=ChannelUser)
+def channel_users_added(sender, instance, action, reverse, pk_set, **kwargs):
+    """user.channels.add() создает связи bulk_create, без post_save"""
+    if action != "post_add" or not pk_set:
+        return
+
+    if reverse:
+        # instance — пользователь, pk_set — каналы
+        if not instance.receives_pushes:
+            return
+        for telegram_id in Channel.objects.filter(pk__in=pk_set).values_list(
+            "telegram_id", flat=True
+        ):
+            _on_commit(
+                subscriber_index.add,
+                telegram_id,
+                [(instance.pk, instance.tg_chat_id)],
+            )
+    else:
+        # instance — канал, pk_set — пользователи
+        _on_commit(
+            subscriber_index.add,
+            instance.telegram_id,
+            list(
+                _push_users()
+                .filter(pk__in=pk_set)
+                .values_list("id", "tg_chat_id")
+            ),
+        )
+
+
+@receiver(post_save, sender=User)
+def user_delivery_changed(
+    sender, instance: User, created, update_fields, **kwargs
+):
+    """Заблокировавший бота или перешедший на дайджест выпадает из
+    мгновенных рассылок, вернувшийся — возвращается"""
+    if created:
+        return
+    if update_fields is not None and not {"status", "delivery_mode"} & set(
+        update_fields
+    ):
+        return
+    action = (
+        subscriber_index.add
+        if instance.receives_pushes
+        else subscriber_index.remove
+    )
+    for telegram_id in instance.channels.values_list("telegram_id", flat=True):
+        _on_commit(action, telegram_id, [(instance.pk, instance.tg_chat_id)])
+
+
+@receiver(post_delete, sender=Channel)
+def channel_deleted(sender, instance: Channel, **kwargs):
+    _on_commit(subscriber_index.drop, instance.telegram_id)
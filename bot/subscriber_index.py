@@ -0,0 +1,109 @@
+"""Индекс подписчиков каналов в Redis.
+
+Для каждого канала хранится множество channel:subscribers:<telegram_id>
+с элементами "<user_id>:<chat_id>". Служебный элемент "0" означает, что
+множество построено: пустой канал отличается от еще не построенного.
+Индекс обновляют сигналы ChannelUser и User (bot/signals.py); если ключа
+нет, он строится из БД при первом чтении. В индекс попадают только
+активные пользователи, получающие рекламу сразу: заблокировавшим бота
+ничего не отправляется, а часовые пачки и дайджесты собирает
+bot/scheduled_delivery.py.
+"""
+
+from typing import Optional
+
+import structlog
+from asgiref.sync import sync_to_async
+
+from bot.models import ChannelUser, User
+from core.redis_manager import redis_manager
+
+logger = structlog.getLogger(__name__)
+
+KEY_PREFIX = "channel:subscribers:"
+BUILT_MARK = "0"
+
+# Добавляет элементы, только если множество уже построено: иначе
+# частичное множество выглядело бы как полное
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('SADD', KEYS[1], unpack(ARGV))
+end
+return 0
+"""
+
+
+def _key(telegram_id: int) -> str:
+    return f"{KEY_PREFIX}{telegram_id}"
+
+
+def _member(user_id: int, chat_id: int) -> str:
+    return f"{user_id}:{chat_id}"
+
+
+class SubscriberIndex:
+    """Чтение индекса (async) и его обновление из сигналов ORM (sync)"""
+
+    def __init__(self):
+        self._add_script = None
+
+    async def get(self, telegram_id: int) -> list[tuple[int, int]]:
+        """Подписчики канала (user_id, chat_id); строит индекс, если его нет"""
+        members = await redis_manager.client.smembers(_key(telegram_id))
+        if not members:
+            return await sync_to_async(self.rebuild)(telegram_id)
+
+        recipients = []
+        for member in members:
+            if member == BUILT_MARK:
+                continue
+            user_id, chat_id = member.split(":")
+            recipients.append((int(user_id), int(chat_id)))
+        return recipients
+
+    def rebuild(self, telegram_id: int) -> list[tuple[int, int]]:
+        """Строит множество канала заново из ChannelUser получателей рассылки"""
+        recipients = list(
+            ChannelUser.objects.filter(
+                channel__telegram_id=telegram_id,
+                user__status=User.STATUS_ACTIVE,
+                user__delivery_mode__in=User.PUSH_DELIVERY_MODES,
+            ).values_list("user_id", "user__tg_chat_id")
+        )
+        key = _key(telegram_id)
+        with redis_manager.get_sync_client().pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.sadd(
+                key,
+                BUILT_MARK,
+                *(_member(user_id, chat_id) for user_id, chat_id in recipients),
+            )
+            pipe.execute()
+        return recipients
+
+    def add(self, telegram_id: int, recipients: list[tuple[int, int]]):
+        if not recipients:
+            return
+        if self._add_script is None:
+            self._add_script = redis_manager.get_sync_client().register_script(
+                ADD_SCRIPT
+            )
+        self._add_script(
+            keys=[_key(telegram_id)],
+            args=[_member(user_id, chat_id) for user_id, chat_id in recipients],
+        )
+
+    def remove(self, telegram_id: int, recipients: list[tuple[int, int]]):
+        if recipients:
+            redis_manager.get_sync_client().srem(
+                _key(telegram_id),
+                *(_member(user_id, chat_id) for user_id, chat_id in recipients),
+            )
+
+    def drop(self, telegram_id: Optional[int]):
+        """Удаляет множество канала; при следующем чтении оно построится"""
+        if telegram_id is not None:
+            redis_manager.get_sync_client().delete(_key(telegram_id))
+
+
+subscriber_index = SubscriberIndex()
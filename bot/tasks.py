@@ -4,10 +4,15 @@ from datetime import timedelta
 import structlog
 from asgiref.sync import sync_to_async
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 
-from bot.models import Payment, UserSubscription
+from bot.models import DeliveryRecord, Payment, User, UserSubscription
+from bot.scheduled_delivery import send_batches
 from bot.services.recurring_payment_service import create_recurring_payment
+from core.event_manager import EventType, event_manager
+from core.redis_manager import redis_manager
+from userbot.redis_messages import UserbotMaintenanceMessage
 
 logger = structlog.getLogger(__name__)
 
@@ -155,3 +160,99 @@ async def process_subscription_recurring_payment(
             exc_info=True,
         )
         return {"success": False, "reason": f"Ошибка: {str(e)}"}
+
+
+@shared_task
+def rebalance_channels_task(max_moves: int | None = None):
+    """Celery задача для перебалансировки каналов между юзерботами"""
+    if max_moves is None:
+        max_moves = getattr(settings, "USERBOT_REBALANCE_MAX_MOVES", 10)
+
+    logger.info("Запуск перебалансировки каналов", max_moves=max_moves)
+
+    asyncio.run(publish_userbot_maintenance("rebalance", max_moves))
+
+
+@shared_task
+def collect_orphan_channels_task(max_leaves: int | None = None):
+    """Celery задача для выхода юзерботов из каналов без пользователей"""
+    if max_leaves is None:
+        max_leaves = getattr(settings, "USERBOT_GC_MAX_LEAVES", 50)
+
+    logger.info("Запуск сборки неиспользуемых каналов", max_leaves=max_leaves)
+
+    asyncio.run(publish_userbot_maintenance("gc", max_leaves))
+
+
+@shared_task
+def send_delivery_batches_task():
+    """Celery задача для часовых пачек и ежедневного дайджеста рекламы.
+
+    Запускается раз в час: каждое окно отправляется один раз, поэтому
+    дайджест уходит при первом запуске после DELIVERY_DIGEST_HOUR.
+    """
+    logger.info("Запуск отправки пачек рекламы")
+
+    asyncio.run(send_delivery_batches())
+
+
+async def send_delivery_batches():
+    """Ставит в очередь доставки пачки всех режимов по расписанию"""
+    await redis_manager.connect()
+    try:
+        for mode in (User.DELIVERY_HOURLY, User.DELIVERY_DAILY):
+            try:
+                await send_batches(mode)
+            except Exception as e:
+                logger.error(
+                    "Ошибка отправки пачек рекламы",
+                    mode=mode,
+                    error=str(e),
+                    exc_info=True,
+                )
+    finally:
+        await redis_manager.disconnect()
+
+
+@shared_task
+def purge_delivery_ledger_task(retention_days: int | None = None):
+    """Celery задача для удаления старых дней журнала доставки"""
+    if retention_days is None:
+        retention_days = getattr(settings, "DELIVERY_LEDGER_RETENTION_DAYS", 90)
+
+    cutoff = timezone.now().date() - timedelta(days=retention_days)
+    chunk = getattr(settings, "DELIVERY_LEDGER_BATCH", 500) * 10
+    deleted = 0
+    # Удаляем порциями, чтобы не держать длинную транзакцию и блокировки
+    while True:
+        ids = list(
+            DeliveryRecord.objects.filter(day__lt=cutoff).values_list(
+                "pk", flat=True
+            )[:chunk]
+        )
+        if not ids:
+            break
+        deleted += DeliveryRecord.objects.filter(pk__in=ids).delete()[0]
+
+    logger.info(
+        "Журнал доставки очищен",
+        cutoff=str(cutoff),
+        deleted=deleted,
+    )
+
+
+async def publish_userbot_maintenance(task: str, max_actions: int):
+    """Отправляет команду обслуживания менеджеру юзерботов.
+
+    Telethon-клиенты живут только в процессе run_userbot, поэтому
+    сама работа выполняется там, а Celery лишь ставит ее по расписанию.
+    """
+    await redis_manager.connect()
+    try:
+        await event_manager.publish_event(
+            EventType.USERBOT_MAINTENANCE,
+            UserbotMaintenanceMessage(task=task, max_actions=max_actions),
+            "userbot:maintenance",
+        )
+    finally:
+        await redis_manager.disconnect()
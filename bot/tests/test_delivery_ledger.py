@@ -0,0 +1,98 @@
+import time
+from unittest.mock import AsyncMock, patch
+
+from django.test import TestCase, TransactionTestCase
+
+from bot.delivery_ledger import (
+    DeliveryLedger,
+    claim_fan_out,
+    exclude_delivered,
+)
+from bot.models import Channel, ChannelNews, DeliveryRecord, User
+
+
+def create_user(tg_id: int) -> User:
+    return User.objects.create(
+        tg_user_id=tg_id, tg_chat_id=tg_id, first_name="u"
+    )
+
+
+class ExcludeDeliveredTests(TestCase):
+    def setUp(self):
+        channel = Channel.objects.create(telegram_id=777, title="c")
+        self.news = ChannelNews.objects.create(channel=channel, message_id=1)
+        self.sent, self.failed, self.new = (create_user(i) for i in (1, 2, 3))
+        for user, status in (
+            (self.sent, DeliveryRecord.STATUS_SENT),
+            (self.failed, DeliveryRecord.STATUS_FAILED),
+        ):
+            DeliveryRecord.objects.create(
+                user=user,
+                channel_news=self.news,
+                status=status,
+                day="2026-01-01",
+            )
+
+    async def test_failed_delivery_not_excluded(self):
+        recipients = [
+            (user.pk, 0) for user in (self.sent, self.failed, self.new)
+        ]
+
+        result = await exclude_delivered(self.news.pk, recipients)
+
+        self.assertEqual(result, [(self.failed.pk, 0), (self.new.pk, 0)])
+
+
+class DeliveryLedgerFlushTests(TransactionTestCase):
+    def setUp(self):
+        channel = Channel.objects.create(telegram_id=778, title="c")
+        self.news = ChannelNews.objects.create(channel=channel, message_id=1)
+        self.users = [create_user(i) for i in (11, 12)]
+
+    async def test_bad_record_does_not_drop_batch(self):
+        ledger = DeliveryLedger()
+        now = time.time()
+        ledger.record(self.users[0].pk, [self.news.pk], "sent", now)
+        # Поста уже нет: нарушение внешнего ключа
+        ledger.record(self.users[0].pk, [self.news.pk + 100], "sent", now)
+        ledger.record(self.users[1].pk, [self.news.pk], "sent", now)
+
+        await ledger.flush()
+
+        self.assertEqual(
+            {
+                user_id
+                async for user_id in DeliveryRecord.objects.values_list(
+                    "user_id", flat=True
+                )
+            },
+            {user.pk for user in self.users},
+        )
+
+    async def test_attempts_appended_sent_once(self):
+        ledger = DeliveryLedger()
+        user_id = self.users[0].pk
+        for status in ("failed", "sent", "sent"):
+            ledger.record(user_id, [self.news.pk], status, time.time())
+            await ledger.flush()
+
+        statuses = [
+            status
+            async for status in DeliveryRecord.objects.filter(user_id=user_id)
+            .order_by("pk")
+            .values_list("status", flat=True)
+        ]
+        # Прошлая ошибка остается в журнале, повтор доставки не пишется
+        self.assertEqual(statuses, ["failed", "sent"])
+
+
+class FanOutClaimTests(TestCase):
+    @patch("bot.delivery_ledger.redis_manager")
+    async def test_claim_is_single_set_nx(self, redis_manager):
+        redis_manager.client.set = AsyncMock(side_effect=[True, None])
+
+        self.assertTrue(await claim_fan_out(5))
+        self.assertFalse(await claim_fan_out(5))
+
+        self.assertTrue(redis_manager.client.set.await_args.kwargs["nx"])
+        redis_manager.client.exists.assert_not_called()
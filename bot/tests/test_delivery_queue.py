@@ -0,0 +1,76 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from bot.delivery_queue import DeliveryJob, DeliveryQueue, DeliveryWorker
+
+
+@override_settings(
+    BROADCAST_LIMITER="local",
+    BROADCAST_RATE=6,
+    BROADCAST_RESERVED_RATE=5,
+    BROADCAST_CONCURRENCY=10,
+    DELIVERY_LEASE_SECONDS=6,
+)
+class DeliveryLeaseTests(SimpleTestCase):
+    """Аренда заданий, взятых DeliveryWorker"""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.zadd = AsyncMock()
+        patcher = patch("bot.delivery_queue.redis_manager")
+        self.addCleanup(patcher.stop)
+        patcher.start().client = self.client
+
+    def test_prefetch_fits_lease(self):
+        worker = DeliveryWorker(MagicMock(), DeliveryQueue())
+
+        # 1 сообщение в секунду: за половину аренды успеем отправить 3
+        self.assertEqual(worker.prefetch, 3)
+
+    def test_prefetch_follows_concurrency(self):
+        with override_settings(BROADCAST_RATE=1000):
+            worker = DeliveryWorker(
+                MagicMock(), DeliveryQueue(), concurrency=40
+            )
+
+        self.assertEqual(worker.concurrency, 40)
+        self.assertEqual(worker.prefetch, 80)
+
+    async def test_claimed_jobs_lease_renewed(self):
+        queue = DeliveryQueue()
+        queue.claim = AsyncMock(return_value=[])
+        worker = DeliveryWorker(MagicMock(), queue)
+        job = DeliveryJob(chat_id=1, text_id="t")
+        worker._claimed[job.id] = job
+
+        with override_settings(DELIVERY_LEASE_SECONDS=0.03):
+            task = asyncio.create_task(worker._renew_loop())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        self.client.zadd.assert_awaited()
+        args, kwargs = self.client.zadd.await_args
+        self.assertEqual(list(args[1]), [job.id])
+        self.assertTrue(kwargs["xx"])
+
+    async def test_claim_dropped_when_ack_fails(self):
+        queue = DeliveryQueue()
+        queue.ack = AsyncMock(side_effect=ConnectionError("redis"))
+        worker = DeliveryWorker(MagicMock(), queue)
+        worker.broadcaster.send = AsyncMock()
+        worker.ledger.record = MagicMock()
+        job = DeliveryJob(chat_id=1, text_id="t")
+        worker._claimed[job.id] = job
+        worker._jobs.put_nowait((job, "Текст"))
+
+        task = asyncio.create_task(worker._sender())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        queue.ack.assert_awaited_once()
+        # Аренду больше не продлеваем: задание вернется в очередь само
+        self.assertNotIn(job.id, worker._claimed)
@@ -0,0 +1,41 @@
+from django.test import TestCase
+
+from bot.models import Channel, ChannelNews
+
+
+class ChannelNewsRenderTests(TestCase):
+    """Готовый HTML постов и смена данных канала"""
+
+    def setUp(self):
+        self.channel = Channel.objects.create(
+            telegram_id=1001, title="Старое", main_username="old"
+        )
+        self.other = Channel.objects.create(
+            telegram_id=1002, title="Другой", main_username="other"
+        )
+        self.news = ChannelNews(
+            channel=self.channel, message_id=1, message="Текст"
+        )
+        self.news.render_html()
+        self.news.save()
+        self.other_news = ChannelNews(channel=self.other, message_id=1)
+        self.other_news.render_html()
+        self.other_news.save()
+
+    async def test_reset_after_channel_renamed(self):
+        self.channel.title = "Новое"
+        self.channel.main_username = "new"
+        await self.channel.asave()
+
+        await ChannelNews.areset_rendered([self.channel.pk])
+
+        news = await ChannelNews.objects.select_related("channel").aget(
+            pk=self.news.pk
+        )
+        self.assertEqual(news.rendered_html, "")
+        html = news.render_html()
+        self.assertIn("Новое", html)
+        self.assertIn("https://t.me/new/1", html)
+
+        other = await ChannelNews.objects.aget(pk=self.other_news.pk)
+        self.assertEqual(other.rendered_html, self.other_news.rendered_html)
@@ -0,0 +1,62 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from bot import scheduled_delivery
+from bot.models import User
+
+
+class News:
+    def __init__(self, pk: int):
+        self.pk = pk
+        self.created_at = pk
+
+    def render_html(self) -> str:
+        return f"пост {self.pk}"
+
+
+BATCHES = {(1,): [(10, 100), (11, 110)], (2,): [(12, 120)]}
+NEWS = {1: News(1), 2: News(2)}
+
+
+@patch.object(scheduled_delivery, "claim_window", AsyncMock(return_value=True))
+@patch.object(
+    scheduled_delivery, "_collect_batches", lambda *args: (BATCHES, NEWS)
+)
+class SendBatchesTests(SimpleTestCase):
+    """Повторная отправка окна пачек после сбоя"""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.set = AsyncMock()
+        self.client.delete = AsyncMock()
+        self.client.smembers = AsyncMock(return_value=set())
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.client.pipeline.return_value.__aenter__.return_value = self.pipe
+        patcher = patch("bot.scheduled_delivery.redis_manager")
+        self.addCleanup(patcher.stop)
+        patcher.start().client = self.client
+
+    @patch("bot.scheduled_delivery.delivery_queue")
+    async def test_failure_keeps_window_marker(self, queue):
+        queue.enqueue = AsyncMock(side_effect=[2, ConnectionError("redis")])
+
+        with self.assertRaises(ConnectionError):
+            await scheduled_delivery.send_batches(User.DELIVERY_HOURLY)
+
+        self.client.delete.assert_not_awaited()
+        self.assertEqual(self.client.set.await_args.args[1], "failed")
+        self.pipe.sadd.assert_called_once()
+        self.assertEqual(self.pipe.sadd.call_args.args[1:], (10, 11))
+
+    @patch("bot.scheduled_delivery.delivery_queue")
+    async def test_retry_skips_enqueued_users(self, queue):
+        queue.enqueue = AsyncMock(return_value=1)
+        self.client.smembers.return_value = {"10", "11"}
+
+        await scheduled_delivery.send_batches(User.DELIVERY_HOURLY)
+
+        queue.enqueue.assert_awaited_once()
+        self.assertEqual(queue.enqueue.await_args.args[1], [(12, 120)])
+        self.assertEqual(self.client.set.await_args.args[1], "done")
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from bot.models import Channel, ChannelUser, User
+
+
+@patch("bot.signals.subscriber_index")
+class SubscriberIndexSignalsTests(TestCase):
+    """Сигналы добавляют в индекс только получающих рекламу сразу"""
+
+    def setUp(self):
+        self.channel = Channel.objects.create(telegram_id=555, title="c")
+
+    def _create_user(self, tg_id: int, **fields) -> User:
+        return User.objects.create(
+            tg_user_id=tg_id, tg_chat_id=tg_id, first_name="u", **fields
+        )
+
+    def _indexed(self, index) -> set[tuple[int, int]]:
+        return {
+            recipient
+            for call in index.add.call_args_list
+            for recipient in call.args[1]
+        }
+
+    def test_digest_user_adding_channel_not_indexed(self, index):
+        user = self._create_user(1, delivery_mode=User.DELIVERY_DAILY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.channels.add(self.channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.channel.users.add(user)
+
+        self.assertNotIn((user.pk, 1), self._indexed(index))
+
+    def test_banned_user_channel_user_created_not_indexed(self, index):
+        user = self._create_user(2, status=User.STATUS_BANNED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ChannelUser.objects.create(user=user, channel=self.channel)
+
+        self.assertNotIn((user.pk, 2), self._indexed(index))
+
+    def test_instant_user_indexed(self, index):
+        user = self._create_user(3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.channels.add(self.channel)
+
+        self.assertIn((user.pk, 3), self._indexed(index))
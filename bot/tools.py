@@ -11,6 +11,7 @@ from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
 from aiohttp import ClientOSError
 
 from bot.redis_client import delete_file_id, get_file_id, save_file_id
+from core.tracing import stamp
 
 logger = logging.getLogger(__name__)
 
@@ -140,6 +141,8 @@ async def send_long(
         disable_web_page_preview=True,
         reply_markup=reply_markup,
     )
+    # Отправка рекламы закрывает трассу поста (без трассы — ничего)
+    stamp("sent")
     # for chunk in txt.split("\n"):
     #     if chunk.strip():
     #         max_retries = 3
@@ -182,3 +185,26 @@ def clean_markdown(text: str) -> str:
     text = text.replace("\r\n", "\n").replace("\r", "\n")
     text = re.sub(r"\n{2,}", "\n", text)
     return text.strip()
+
+
+def render_ad_html(
+    channel,
+    message_id: int,
+    text: str,
+    channel_title: str | None = None,
+) -> str:
+    """HTML уведомления о рекламном посте: канал, текст и ссылка на пост"""
+    # Безопасно экранируем текст сообщения
+    safe_message_text = truncate_text(clean_markdown(text))
+    safe_channel_title = channel_title or channel.title
+
+    if channel.is_private:
+        channel_link = f"https://t.me/c/{channel.telegram_id}"
+    else:
+        channel_link = f"https://t.me/{channel.main_username}"
+    action_link = f"{channel_link}/{message_id}"
+
+    message_text = f"Реклама в канале: <a href='{channel_link}'><b>{safe_channel_title}</b></a>\n\n"
+    message_text += f"{safe_message_text}\n\n"
+    message_text += f"<a href='{action_link}'><b>Перейти к посту →</b></a>"
+    return message_text
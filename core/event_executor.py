@@ -0,0 +1,161 @@
+"""Выполнение обработчиков событий вне цикла чтения Redis"""
+
+import asyncio
+import heapq
+import itertools
+from typing import TYPE_CHECKING, Any, Coroutine, Optional
+
+import structlog
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from core.event_manager import EventType
+
+logger = structlog.getLogger(__name__)
+
+# Меньше — важнее. Платежи и ответы пользователю идут раньше рассылки рекламы
+DEFAULT_PRIORITIES = {
+    "payment_notification": 0,
+    "subscribe_response": 0,
+    "subscribe_channels": 1,
+    "userbot_maintenance": 1,
+    "new_ad_message": 2,
+}
+
+# Рассылка рекламы долгая: ограничиваем ее, чтобы не заняла все слоты
+DEFAULT_CONCURRENCY = {
+    "new_ad_message": 2,
+}
+
+
+class PrioritySemaphore:
+    """Семафор, который отдает освободившийся слот самому приоритетному ожидающему"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже передан нам — возвращаем его следующему
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+class EventExecutor:
+    """Запускает обработчики событий отдельными задачами.
+
+    Цикл чтения канала только ставит задачу и сразу читает дальше.
+    Для каждого типа события есть свой лимит одновременных задач, а общие
+    слоты EVENT_MAX_CONCURRENCY раздаются по приоритету типа. Если
+    в очереди больше EVENT_MAX_PENDING задач, submit ждет — так чтение
+    притормаживает, а не копит задачи в памяти без ограничений.
+    """
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+        self._type_limits: dict[str, asyncio.Semaphore] = {}
+        self._slots = PrioritySemaphore(
+            getattr(settings, "EVENT_MAX_CONCURRENCY", 10)
+        )
+        self._pending = asyncio.Semaphore(
+            getattr(settings, "EVENT_MAX_PENDING", 1000)
+        )
+        # События, обработчики которых отменены до старта, — для передачи
+        # следующему процессу
+        self.unstarted: list[Any] = []
+
+    def _get_type_limit(self, event_type: "EventType") -> asyncio.Semaphore:
+        semaphore = self._type_limits.get(event_type.value)
+        if semaphore is None:
+            limits = {
+                **DEFAULT_CONCURRENCY,
+                **getattr(settings, "EVENT_CONCURRENCY", {}),
+            }
+            limit = limits.get(
+                event_type.value, getattr(settings, "EVENT_MAX_CONCURRENCY", 10)
+            )
+            semaphore = asyncio.Semaphore(int(limit))
+            self._type_limits[event_type.value] = semaphore
+        return semaphore
+
+    async def submit(
+        self,
+        event_type: "EventType",
+        coroutine: Coroutine,
+        payload: Optional[Any] = None,
+    ) -> asyncio.Task:
+        """Ставит обработчик в очередь, возвращает его задачу.
+
+        Задача возвращает False, если обработчик упал с ошибкой.
+        payload попадает в unstarted, если обработчик отменят до старта.
+        """
+        await self._pending.acquire()
+        task = asyncio.create_task(self._run(event_type, coroutine, payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(
+        self,
+        event_type: "EventType",
+        coroutine: Coroutine,
+        payload: Optional[Any],
+    ) -> bool:
+        """Выполняет обработчик; False — обработчик завершился ошибкой"""
+        priority = DEFAULT_PRIORITIES.get(event_type.value, 1)
+        started = False
+        try:
+            async with self._get_type_limit(event_type):
+                await self._slots.acquire(priority)
+                try:
+                    started = True
+                    await coroutine
+                finally:
+                    self._slots.release()
+        except asyncio.CancelledError:
+            if not started:
+                # Отмена до старта: закрываем корутину без предупреждений
+                coroutine.close()
+                if payload is not None:
+                    self.unstarted.append(payload)
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике {event_type.value}: {e}")
+            return False
+        finally:
+            self._pending.release()
+        return True
+
+    async def drain(self, timeout: float):
+        """Ждет завершения начатых обработчиков, остальные отменяет"""
+        if not self._tasks:
+            return
+
+        logger.info(f"Ожидаем завершения обработчиков: {len(self._tasks)}")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                f"Отменено незавершенных обработчиков: {len(pending)}"
+            )
@@ -4,25 +4,37 @@ from enum import Enum
 from typing import Any, Callable, Optional
 
 import structlog
+from django.conf import settings
 
+from core.event_executor import EventExecutor
+from core.event_transport import (
+    MemoryTransport,
+    PubSubTransport,
+    create_transport,
+)
+from core.message_codecs import check_codecs, get_channel_codec
 from core.redis_manager import redis_manager
+from core.tracing import TraceContext, current_trace
 from userbot.redis_messages import (
-    NewAdMessage,
-    PaymentNotificationMessage,
-    SubscribeChannelsMessage,
     SubscribeResponseMessage,
+    decode_event,
     deserialize_message,
     serialize_message,
 )
 
 logger = structlog.getLogger(__name__)
 
+# Ответы на запросы ждет конкретный процесс, поэтому они идут через Pub/Sub
+# (или через очереди в памяти, если весь обмен внутри одного процесса)
+RESPONSE_CHANNEL_PREFIX = "bot:response:"
+
 
 class EventType(Enum):
     SUBSCRIBE_CHANNELS = "subscribe_channels"
     SUBSCRIBE_RESPONSE = "subscribe_response"
     NEW_AD_MESSAGE = "new_ad_message"
     PAYMENT_NOTIFICATION = "payment_notification"
+    USERBOT_MAINTENANCE = "userbot_maintenance"
 
 
 @dataclass
@@ -39,13 +51,48 @@ class EventManager:
 
     _instance: Optional["EventManager"] = None
     _handlers: dict[str, list[EventHandler]] = {}
+    # Таблица диспетчеризации: (канал, тип события) -> обработчики
+    _dispatch: dict[tuple[str, EventType], list[Callable]] = {}
     _running_tasks: list[asyncio.Task] = []
+    _transport = None
+    _executor: Optional[EventExecutor] = None
+    # Ожидающие ответа запросы: request_id -> Future
+    _response_waiters: dict[str, asyncio.Future] = {}
+    _response_listener: Optional[asyncio.Task] = None
+    _response_listener_lock = asyncio.Lock()
+    _response_transport = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    def _get_transport(self, channel: str):
+        """Транспорт для канала: EVENT_TRANSPORT, кроме каналов ответов"""
+        if self._transport is None:
+            transport = create_transport(
+                getattr(settings, "EVENT_TRANSPORT", "pubsub")
+            )
+            EventManager._transport = transport
+            # В памяти ответы идут тем же транспортом, иначе — через Pub/Sub
+            EventManager._response_transport = (
+                transport
+                if isinstance(transport, MemoryTransport)
+                else PubSubTransport()
+            )
+
+        if channel.startswith(RESPONSE_CHANNEL_PREFIX):
+            return self._response_transport
+        return self._transport
+
+    def _uses_redis(self) -> bool:
+        return not isinstance(self._get_transport(""), MemoryTransport)
+
+    def _get_executor(self) -> EventExecutor:
+        if self._executor is None:
+            EventManager._executor = EventExecutor()
+        return self._executor
+
     def register_handler(
         self, event_type: EventType, callback: Callable, channel: str
     ):
@@ -56,20 +103,25 @@ class EventManager:
             self._handlers[channel] = []
 
         self._handlers[channel].append(handler)
+        self._dispatch.setdefault((channel, event_type), []).append(callback)
         logger.info(
             f"Зарегистрирован обработчик для {event_type.value} на канале {channel}"
         )
 
     async def start_listening(self):
         """Запускает прослушивание всех зарегистрированных каналов"""
-        await redis_manager.connect()
+        check_codecs()
+        if self._uses_redis():
+            await redis_manager.connect()
 
-        for channel, handlers in self._handlers.items():
-            task = asyncio.create_task(self._listen_channel(channel, handlers))
+        for channel in self._handlers:
+            task = asyncio.create_task(self._listen_channel(channel))
             self._running_tasks.append(task)
 
         logger.info(f"Запущено прослушивание {len(self._handlers)} каналов")
 
+        await self._resume_unfinished()
+
     async def stop_listening(self):
         """Останавливает прослушивание"""
         for task in self._running_tasks:
@@ -77,97 +129,220 @@ class EventManager:
 
         await asyncio.gather(*self._running_tasks, return_exceptions=True)
         self._running_tasks.clear()
+        EventManager._response_listener = None
+
+        # Прием новых сообщений остановлен, дорабатываем начатые
+        executor = self._get_executor()
+        await executor.drain(getattr(settings, "EVENT_DRAIN_TIMEOUT", 30))
+        if self._transport is not None:
+            await self._transport.flush()
+            await self._save_unfinished(executor)
 
-        await redis_manager.disconnect()
+        for future in self._response_waiters.values():
+            future.cancel()
+        self._response_waiters.clear()
+
+        if self._uses_redis():
+            await redis_manager.disconnect()
         logger.info("Остановлено прослушивание всех каналов")
 
-    async def _listen_channel(self, channel: str, handlers: list[EventHandler]):
+    async def _save_unfinished(self, executor: EventExecutor):
+        """Передает события, не успевшие начаться, следующему процессу"""
+        unstarted, executor.unstarted = executor.unstarted, []
+        by_channel: dict[str, list[bytes]] = {}
+        # У события может быть несколько обработчиков — сохраняем его один раз
+        for channel, data in dict.fromkeys(unstarted):
+            by_channel.setdefault(channel, []).append(data)
+
+        for channel, payloads in by_channel.items():
+            try:
+                await self._transport.save_unfinished(channel, payloads)
+                logger.warning(
+                    f"Передано необработанных событий канала {channel}: "
+                    f"{len(payloads)}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Не удалось сохранить события канала {channel}: {e}"
+                )
+
+    async def _resume_unfinished(self):
+        """Обрабатывает события, переданные предыдущим процессом"""
+        for channel in self._handlers:
+            try:
+                payloads = await self._get_transport(channel).load_unfinished(
+                    channel
+                )
+            except Exception as e:
+                logger.error(
+                    f"Не удалось загрузить события канала {channel}: {e}"
+                )
+                continue
+
+            if payloads:
+                logger.info(
+                    f"Продолжаем обработку событий канала {channel}: "
+                    f"{len(payloads)}"
+                )
+            for data in payloads:
+                await self._handle_message(channel, data)
+
+    async def _listen_channel(self, channel: str):
         """Прослушивает конкретный канал"""
+
+        async def callback(data: bytes):
+            return await self._handle_message(channel, data)
+
         try:
-            await redis_manager.subscribe_to_channel(
-                channel, self._handle_message
-            )
+            await self._get_transport(channel).listen(channel, callback)
         except Exception as e:
             logger.error(f"Ошибка прослушивания канала {channel}: {e}")
 
-    async def _handle_message(self, data: str):
-        """Обрабатывает входящее сообщение"""
+    async def _handle_message(
+        self, channel: str, data: bytes
+    ) -> Optional[asyncio.Future]:
+        """Передает сообщение обработчикам его типа на этом канале.
+
+        Возвращает Future завершения всех обработчиков: False, если
+        хотя бы один из них упал, — такое событие не подтверждается.
+        """
+        message, trace_data = decode_event(data)
+        if message is None:
+            return
+
         try:
-            # Определяем тип сообщения по содержимому
-            if '"subscribe_channels"' in data:
-                message = deserialize_message(data, SubscribeChannelsMessage)
-                if message:
-                    await self._call_handlers(
-                        EventType.SUBSCRIBE_CHANNELS, message
-                    )
-            elif '"subscribe_response"' in data:
-                message = deserialize_message(data, SubscribeResponseMessage)
-                if message:
-                    await self._call_handlers(
-                        EventType.SUBSCRIBE_RESPONSE, message
-                    )
-            elif '"new_ad_message"' in data:
-                message = deserialize_message(data, NewAdMessage)
-                if message:
-                    await self._call_handlers(EventType.NEW_AD_MESSAGE, message)
-            elif '"payment_notification"' in data:
-                message = deserialize_message(data, PaymentNotificationMessage)
-                if message:
-                    await self._call_handlers(
-                        EventType.PAYMENT_NOTIFICATION, message
-                    )
-        except Exception as e:
-            logger.error(f"Ошибка обработки сообщения: {e}")
-
-    async def _call_handlers(self, event_type: EventType, message: Any):
-        """Вызывает все обработчики для типа события"""
-        for channel, handlers in self._handlers.items():
-            for handler in handlers:
-                if handler.event_type == event_type:
-                    try:
-                        await handler.callback(message)
-                    except Exception as e:
-                        logger.error(
-                            f"Ошибка в обработчике {event_type.value}: {e}"
-                        )
+            event_type = EventType(message.message_type)
+        except ValueError:
+            logger.warning(f"Нет типа события для {message.message_type}")
+            return
+
+        callbacks = self._dispatch.get((channel, event_type))
+        if not callbacks:
+            logger.warning(
+                f"Нет обработчиков {event_type.value} на канале {channel}"
+            )
+            return
+
+        # Задачи обработчиков копируют контекст, вместе с ним и трассу
+        token = None
+        if trace_data:
+            trace = TraceContext.from_dict(trace_data)
+            trace.stamp("consumed")
+            token = current_trace.set(trace)
+
+        # Обработчики выполняются отдельными задачами, чтение канала не ждет их
+        executor = self._get_executor()
+        try:
+            tasks = [
+                await executor.submit(
+                    event_type, callback(message), (channel, data)
+                )
+                for callback in callbacks
+            ]
+        finally:
+            if token is not None:
+                current_trace.reset(token)
+        return asyncio.ensure_future(self._all_handled(tasks))
+
+    @staticmethod
+    async def _all_handled(tasks: list[asyncio.Task]) -> bool:
+        """Все ли обработчики события завершились успешно"""
+        return all(await asyncio.gather(*tasks))
 
     async def publish_event(
         self, event_type: EventType, message: Any, channel: str
     ):
         """Публикует событие в Redis"""
-        data = serialize_message(message)
-        await redis_manager.publish(channel, data)
+        # Отметка ставится до сериализации, чтобы попасть в конверт
+        trace = current_trace.get()
+        if trace is not None:
+            trace.stamp("published")
+        data = serialize_message(
+            message,
+            get_channel_codec(channel).name,
+            trace.to_dict() if trace else None,
+        )
+        transport = self._get_transport(channel)
+        if channel.startswith(RESPONSE_CHANNEL_PREFIX):
+            # Ответ хранится недолго, чтобы его забрал и опоздавший ожидающий
+            await transport.store(
+                channel, data, getattr(settings, "EVENT_RESPONSE_TTL", 60)
+            )
+        await transport.publish(channel, data)
         logger.info(
             f"Опубликовано событие {event_type.value} в канал {channel}"
         )
 
+    async def _ensure_response_listener(self):
+        """Запускает общий слушатель ответов, если он еще не запущен.
+
+        Возвращается только после подтверждения PSUBSCRIBE, чтобы ответ,
+        опубликованный после проверки сохраненных, не потерялся.
+        """
+        async with self._response_listener_lock:
+            if self._response_listener and not self._response_listener.done():
+                return
+
+            subscription = await self._get_transport(
+                RESPONSE_CHANNEL_PREFIX
+            ).open_pattern(RESPONSE_CHANNEL_PREFIX)
+
+            task = asyncio.create_task(self._listen_responses(subscription))
+            EventManager._response_listener = task
+            self._running_tasks.append(task)
+
+    async def _listen_responses(self, subscription):
+        """Читает все ответы процесса через одну подписку"""
+        try:
+            async for channel, data in subscription:
+                await self._handle_response(channel, data)
+        except Exception as e:
+            logger.error(f"Ошибка прослушивания ответов: {e}")
+        finally:
+            await subscription.close()
+
+    async def _handle_response(self, channel: str, data: bytes):
+        """Передает ответ ожидающему запросу этого процесса"""
+        request_id = channel[len(RESPONSE_CHANNEL_PREFIX) :]
+        future = self._response_waiters.get(request_id)
+        if future is None or future.done():
+            return
+
+        response = deserialize_message(data, SubscribeResponseMessage)
+        if response:
+            future.set_result(response)
+
     async def wait_for_response(
         self, request_id: str, timeout: int = 30
     ) -> Optional[Any]:
-        """Ждет ответ на запрос подписки"""
-        response_channel = f"bot:response:{request_id}"
+        """Ждет ответ на запрос подписки.
+
+        Ответы приходят в один общий слушатель по шаблону bot:response:*,
+        а ожидание — это Future по request_id. Ответ, опубликованный до
+        начала ожидания, берется из списка, который хранится EVENT_RESPONSE_TTL.
+        """
+        response_channel = f"{RESPONSE_CHANNEL_PREFIX}{request_id}"
+        future = asyncio.get_running_loop().create_future()
+        self._response_waiters[request_id] = future
 
         try:
-            # Создаем временный pubsub для ожидания ответа
-            pubsub = redis_manager.client.pubsub()
-            await pubsub.subscribe(response_channel)
+            await self._ensure_response_listener()
+
+            stored = await self._get_transport(response_channel).get_stored(
+                response_channel
+            )
+            if stored is not None:
+                await self._handle_response(response_channel, stored)
 
             async with asyncio.timeout(timeout):
-                async for message in pubsub.listen():
-                    if message["type"] == "message":
-                        response = deserialize_message(
-                            message["data"], SubscribeResponseMessage
-                        )
-                        if response and response.request_id == request_id:
-                            return response
+                return await future
 
         except asyncio.TimeoutError:
             logger.warning(f"Таймаут ожидания ответа для запроса {request_id}")
         except Exception as e:
             logger.error(f"Ошибка ожидания ответа: {e}")
         finally:
-            await pubsub.unsubscribe(response_channel)
-            await pubsub.close()
+            self._response_waiters.pop(request_id, None)
 
         return None
 
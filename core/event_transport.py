@@ -0,0 +1,345 @@
+"""Транспорты доставки событий EventManager"""
+
+import asyncio
+import os
+import socket
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import structlog
+from django.conf import settings
+from redis.exceptions import ResponseError
+
+from core.redis_manager import redis_manager
+
+logger = structlog.getLogger(__name__)
+
+# Callback может вернуть Future завершения обработки — тогда подтверждение
+# доставки откладывается до его завершения. Future с результатом False
+# означает ошибку обработки: запись не подтверждается
+MessageCallback = Callable[[bytes], Awaitable[Optional[asyncio.Future]]]
+
+
+class PatternSubscription:
+    """Подписка Redis на каналы по префиксу, уже подтвержденная сервером"""
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def __aiter__(self) -> AsyncIterator[tuple[str, bytes]]:
+        async for message in self.pubsub.listen():
+            if message["type"] == "pmessage":
+                yield message["channel"].decode(), message["data"]
+
+    async def close(self):
+        await self.pubsub.close()
+
+
+class PubSubTransport:
+    """Redis Pub/Sub: без хранения, сообщения без подписчиков теряются"""
+
+    # Сколько ждать подтверждения подписки, секунды
+    SUBSCRIBE_TIMEOUT = 10
+
+    async def publish(self, channel: str, data: bytes):
+        await redis_manager.publish(channel, data)
+
+    async def listen(self, channel: str, callback: MessageCallback):
+        await redis_manager.subscribe_to_channel(channel, callback)
+
+    async def flush(self):
+        """Подтверждать нечего: Pub/Sub не хранит сообщения"""
+
+    async def open_pattern(self, prefix: str) -> PatternSubscription:
+        """Подписывается на все каналы с префиксом и ждет подтверждения.
+
+        psubscribe только отправляет команду: подписка действует с ответа
+        сервера, который читается из того же соединения.
+        """
+        pubsub = redis_manager.raw_client.pubsub()
+        try:
+            await pubsub.psubscribe(f"{prefix}*")
+            async with asyncio.timeout(self.SUBSCRIBE_TIMEOUT):
+                while True:
+                    message = await pubsub.get_message(timeout=None)
+                    if message and message["type"] == "psubscribe":
+                        break
+        except BaseException:
+            await pubsub.close()
+            raise
+        return PatternSubscription(pubsub)
+
+    async def store(self, channel: str, data: bytes, ttl: int):
+        """Сохраняет сообщение канала на ttl секунд"""
+        async with redis_manager.raw_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(channel, data)
+            pipe.expire(channel, ttl)
+            await pipe.execute()
+
+    async def get_stored(self, channel: str) -> Optional[bytes]:
+        return await redis_manager.raw_client.lindex(channel, 0)
+
+    @staticmethod
+    def _unfinished_key(channel: str) -> str:
+        return f"unfinished:{channel}"
+
+    async def save_unfinished(self, channel: str, payloads: list[bytes]):
+        """Сохраняет необработанные события для следующего процесса"""
+        key = self._unfinished_key(channel)
+        async with redis_manager.raw_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *payloads)
+            pipe.expire(key, getattr(settings, "EVENT_UNFINISHED_TTL", 3600))
+            await pipe.execute()
+
+    async def load_unfinished(self, channel: str) -> list[bytes]:
+        """Забирает события, сохраненные предыдущим процессом"""
+        key = self._unfinished_key(channel)
+        async with redis_manager.raw_client.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            payloads, _ = await pipe.execute()
+        return payloads
+
+
+class StreamsTransport:
+    """Redis Streams с группами потребителей.
+
+    Каждый канал событий — отдельный стрим stream:<канал>. Все процессы
+    одной роли читают его в общей группе, поэтому каждое сообщение
+    получает один потребитель. Сообщение подтверждается (XACK) после
+    обработки; записи упавшего потребителя забираются через XAUTOCLAIM,
+    когда пролежат неподтвержденными дольше EVENT_STREAM_CLAIM_IDLE_MS.
+    Записи, которые этот процесс еще обрабатывает, повторно не запускаются,
+    даже если обработка идет дольше этого срока.
+    """
+
+    def __init__(self):
+        self.group = getattr(settings, "EVENT_STREAM_GROUP", "workers")
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self.maxlen = getattr(settings, "EVENT_STREAM_MAXLEN", 10000)
+        self.batch_size = getattr(settings, "EVENT_STREAM_BATCH_SIZE", 10)
+        self.block_ms = getattr(settings, "EVENT_STREAM_BLOCK_MS", 5000)
+        self.claim_idle_ms = getattr(
+            settings, "EVENT_STREAM_CLAIM_IDLE_MS", 60000
+        )
+        self._ack_tasks: set[asyncio.Task] = set()
+        # Записи, чья обработка в этом процессе еще не завершилась
+        self._inflight: set[tuple[str, bytes]] = set()
+        # Курсор XAUTOCLAIM по стримам, чтобы обойти весь pending
+        self._claim_cursors: dict[str, bytes | str] = {}
+
+    @staticmethod
+    def _stream_key(channel: str) -> str:
+        return f"stream:{channel}"
+
+    async def publish(self, channel: str, data: bytes):
+        await redis_manager.raw_client.xadd(
+            self._stream_key(channel),
+            {b"data": data},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    async def listen(self, channel: str, callback: MessageCallback):
+        stream = self._stream_key(channel)
+        await self._ensure_group(stream)
+        logger.info(
+            f"Чтение стрима {stream} в группе {self.group} как {self.consumer}"
+        )
+
+        while True:
+            try:
+                await self._reclaim_pending(stream, callback)
+
+                response = await redis_manager.raw_client.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {stream: ">"},
+                    count=self.batch_size,
+                    block=self.block_ms,
+                )
+                for _, entries in response or []:
+                    await self._process_entries(stream, entries, callback)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка чтения стрима {stream}: {e}")
+                await asyncio.sleep(1)
+
+    async def _ensure_group(self, stream: str):
+        """Создает группу потребителей, если ее еще нет"""
+        try:
+            await redis_manager.raw_client.xgroup_create(
+                stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _reclaim_pending(self, stream: str, callback: MessageCallback):
+        """Забирает и обрабатывает записи, зависшие у упавших потребителей"""
+        cursor, entries, *_ = await redis_manager.raw_client.xautoclaim(
+            stream,
+            self.group,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            start_id=self._claim_cursors.get(stream, "0-0"),
+            count=self.batch_size,
+        )
+        self._claim_cursors[stream] = cursor
+        # Долгая обработка в этом же процессе — не зависшая запись
+        entries = [
+            (entry_id, fields)
+            for entry_id, fields in entries
+            if (stream, entry_id) not in self._inflight
+        ]
+        if entries:
+            logger.warning(
+                f"Забрано {len(entries)} неподтвержденных сообщений из {stream}"
+            )
+            await self._process_entries(stream, entries, callback)
+
+    async def _process_entries(
+        self, stream: str, entries: list, callback: MessageCallback
+    ):
+        for entry_id, fields in entries:
+            done = None
+            # Запись могла быть вытеснена по MAXLEN, пока висела в pending
+            if fields and b"data" in fields:
+                done = await callback(fields[b"data"])
+
+            if done is None:
+                await redis_manager.raw_client.xack(
+                    stream, self.group, entry_id
+                )
+                continue
+
+            self._inflight.add((stream, entry_id))
+            task = asyncio.create_task(
+                self._ack_when_done(stream, entry_id, done)
+            )
+            self._ack_tasks.add(task)
+            task.add_done_callback(self._ack_tasks.discard)
+
+    async def _ack_when_done(
+        self, stream: str, entry_id: bytes, done: asyncio.Future
+    ):
+        """Подтверждает запись после обработки.
+
+        Отмененная или упавшая обработка оставляет запись в pending, ее
+        заберет XAUTOCLAIM.
+        """
+        try:
+            try:
+                handled = await done
+            except asyncio.CancelledError:
+                return
+            if handled is False:
+                logger.warning(
+                    f"Запись {entry_id!r} из {stream} не обработана, "
+                    f"оставляем в pending"
+                )
+                return
+            await redis_manager.raw_client.xack(stream, self.group, entry_id)
+        finally:
+            # Снимаем отметку только после XACK, иначе XAUTOCLAIM успеет
+            # забрать запись между ними
+            self._inflight.discard((stream, entry_id))
+
+    async def flush(self):
+        """Дожидается подтверждения уже обработанных записей"""
+        if self._ack_tasks:
+            await asyncio.gather(*self._ack_tasks, return_exceptions=True)
+
+    async def save_unfinished(self, channel: str, payloads: list[bytes]):
+        """Неподтвержденные записи и так заберет следующий процесс"""
+
+    async def load_unfinished(self, channel: str) -> list[bytes]:
+        return []
+
+
+class MemoryPatternSubscription:
+    """Подписка MemoryTransport на каналы по префиксу"""
+
+    def __init__(self, queue: asyncio.Queue, close: Callable[[], None]):
+        self.queue = queue
+        self._close = close
+
+    async def __aiter__(self) -> AsyncIterator[tuple[str, bytes]]:
+        while True:
+            yield await self.queue.get()
+
+    async def close(self):
+        self._close()
+
+
+class MemoryTransport:
+    """Очереди asyncio внутри одного процесса, без Redis.
+
+    Семантика как у Pub/Sub: сообщение получают все слушатели канала,
+    без слушателей оно теряется. Подходит для разработки, тестов и
+    замеров конвейера без сетевых задержек.
+    """
+
+    def __init__(self):
+        self._listeners: dict[str, list[asyncio.Queue]] = {}
+        self._patterns: list[tuple[str, asyncio.Queue]] = []
+        self._stored: dict[str, tuple[float, bytes]] = {}
+
+    async def publish(self, channel: str, data: bytes):
+        for queue in self._listeners.get(channel, []):
+            queue.put_nowait(data)
+        for prefix, queue in self._patterns:
+            if channel.startswith(prefix):
+                queue.put_nowait((channel, data))
+
+    async def listen(self, channel: str, callback: MessageCallback):
+        queue = asyncio.Queue()
+        self._listeners.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                await callback(await queue.get())
+        finally:
+            self._listeners[channel].remove(queue)
+
+    async def flush(self):
+        """Подтверждать нечего: очереди не хранят сообщения"""
+
+    async def open_pattern(self, prefix: str) -> MemoryPatternSubscription:
+        queue = asyncio.Queue()
+        entry = (prefix, queue)
+        self._patterns.append(entry)
+        return MemoryPatternSubscription(
+            queue, lambda: self._patterns.remove(entry)
+        )
+
+    async def store(self, channel: str, data: bytes, ttl: int):
+        now = time.monotonic()
+        self._stored = {
+            key: value for key, value in self._stored.items() if value[0] > now
+        }
+        self._stored.setdefault(channel, (now + ttl, data))
+
+    async def get_stored(self, channel: str) -> Optional[bytes]:
+        expires_at, data = self._stored.get(channel, (0, None))
+        return data if expires_at > time.monotonic() else None
+
+    async def save_unfinished(self, channel: str, payloads: list[bytes]):
+        """Очереди живут только в этом процессе, передавать события некому"""
+
+    async def load_unfinished(self, channel: str) -> list[bytes]:
+        return []
+
+
+def create_transport(name: str):
+    """Создает транспорт по имени из настройки EVENT_TRANSPORT"""
+    if name == "streams":
+        return StreamsTransport()
+    if name == "memory":
+        return MemoryTransport()
+    if name != "pubsub":
+        logger.warning(
+            f"Неизвестный транспорт событий {name}, используем pubsub"
+        )
+    return PubSubTransport()
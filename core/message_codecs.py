@@ -0,0 +1,71 @@
+"""Кодеки сообщений между процессами: json, orjson и msgpack"""
+
+import json
+
+import msgpack
+import orjson
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Первый байт кадра msgpack. JSON всегда начинается с "{", поэтому
+# читатель определяет формат сам и понимает оба во время перехода
+MSGPACK_MARKER = b"\x01"
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, payload: dict) -> bytes:
+        return json.dumps(payload, ensure_ascii=False).encode()
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def encode(self, payload: dict) -> bytes:
+        return orjson.dumps(payload)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def encode(self, payload: dict) -> bytes:
+        return MSGPACK_MARKER + msgpack.packb(payload, use_bin_type=True)
+
+
+_CODECS = {
+    codec.name: codec for codec in (JsonCodec(), OrjsonCodec(), MsgpackCodec())
+}
+
+
+def get_codec(name: str):
+    """Кодек по имени; неизвестное имя — ошибка настройки"""
+    codec = _CODECS.get(name)
+    if codec is None:
+        raise ImproperlyConfigured(
+            f"Неизвестный кодек событий {name!r}, доступны: "
+            f"{', '.join(_CODECS)}"
+        )
+    return codec
+
+
+def get_channel_codec(channel: str):
+    """Кодек для записи в канал: EVENT_CHANNEL_CODECS или EVENT_CODEC"""
+    channel_codecs = getattr(settings, "EVENT_CHANNEL_CODECS", {})
+    return get_codec(
+        channel_codecs.get(channel, getattr(settings, "EVENT_CODEC", "json"))
+    )
+
+
+def check_codecs():
+    """Проверяет EVENT_CODEC и EVENT_CHANNEL_CODECS при запуске процесса"""
+    get_codec(getattr(settings, "EVENT_CODEC", "json"))
+    for name in getattr(settings, "EVENT_CHANNEL_CODECS", {}).values():
+        get_codec(name)
+
+
+def decode_payload(data: bytes | str) -> dict:
+    """Разбирает кадр любого из поддерживаемых форматов"""
+    if isinstance(data, bytes) and data[:1] == MSGPACK_MARKER:
+        return msgpack.unpackb(data[1:], raw=False)
+    return orjson.loads(data)
@@ -1,64 +1,225 @@
+import asyncio
+import time
 from typing import Optional
 
-import redis.asyncio as redis
+import redis
+import redis.asyncio as aioredis
 import structlog
 from django.conf import settings
 
 logger = structlog.getLogger(__name__)
 
+# Именованные пулы: у каждого свой лимит соединений и свои метрики.
+# Значение — decode_responses клиента
+POOLS = {
+    # Кеш file_id, разрешений каналов и т.п.
+    "cache": True,
+    # События: кадры msgpack бинарные, поэтому без декодирования
+    "events": False,
+    # Состояния FSM aiogram
+    "fsm": False,
+}
+
+# Команды, которые ждут данных на сервере: их время не задержка Redis
+BLOCKING_COMMANDS = {"XREADGROUP", "XREAD", "BLPOP", "BRPOP", "BLMOVE"}
+
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500)
+
+
+class RedisPoolMetrics:
+    """Задержка команд и загрузка пула соединений"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.peak_in_use = 0
+
+    def observe(self, elapsed_ms: float, failed: bool):
+        self.commands += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def observe_pool(self, in_use: int):
+        self.peak_in_use = max(self.peak_in_use, in_use)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    """Клиент, который замеряет время каждой команды"""
+
+    def __init__(self, *args, metrics: RedisPoolMetrics, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    async def execute_command(self, *args, **options):
+        if args and str(args[0]).upper() in BLOCKING_COMMANDS:
+            return await super().execute_command(*args, **options)
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.metrics.observe((time.perf_counter() - start) * 1000, failed)
+            self.metrics.observe_pool(
+                len(getattr(self.connection_pool, "_in_use_connections", ()))
+            )
+
 
 class SharedRedisManager:
-    """Единый менеджер Redis для всего приложения"""
+    """Единый менеджер Redis для всего приложения.
+
+    Клиенты создаются лениво из именованных пулов POOLS. Пулы блокирующие:
+    при исчерпании REDIS_MAX_CONNECTIONS команда ждет свободное
+    соединение, а не падает с ошибкой.
+    """
 
     _instance: Optional["SharedRedisManager"] = None
-    _redis_client: Optional[redis.Redis] = None
+    _clients: dict[str, InstrumentedRedis] = {}
+    _metrics: dict[str, RedisPoolMetrics] = {}
+    _sync_pool: Optional[redis.ConnectionPool] = None
+    _reporter: Optional[asyncio.Task] = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    @staticmethod
+    def _connection_kwargs() -> dict:
+        return {
+            "host": getattr(settings, "BOT_REDIS_HOST", "localhost"),
+            "port": getattr(settings, "BOT_REDIS_PORT", 6379),
+            "db": getattr(settings, "BOT_REDIS_DB", 0),
+            "health_check_interval": getattr(
+                settings, "REDIS_HEALTH_CHECK_INTERVAL", 30
+            ),
+        }
+
+    def get_client(self, name: str) -> aioredis.Redis:
+        """Возвращает клиент именованного пула"""
+        client = self._clients.get(name)
+        if client is None:
+            max_connections = getattr(
+                settings, "REDIS_POOL_MAX_CONNECTIONS", {}
+            ).get(name, getattr(settings, "REDIS_MAX_CONNECTIONS", 50))
+            pool = aioredis.BlockingConnectionPool(
+                max_connections=max_connections,
+                timeout=getattr(settings, "REDIS_POOL_TIMEOUT", 20),
+                decode_responses=POOLS[name],
+                **self._connection_kwargs(),
+            )
+            metrics = self._metrics.setdefault(name, RedisPoolMetrics())
+            client = InstrumentedRedis(connection_pool=pool, metrics=metrics)
+            self._clients[name] = client
+        return client
+
+    def get_sync_client(self) -> redis.Redis:
+        """Синхронный клиент для Django views на общем пуле процесса"""
+        if self._sync_pool is None:
+            SharedRedisManager._sync_pool = redis.ConnectionPool(
+                max_connections=getattr(settings, "REDIS_MAX_CONNECTIONS", 50),
+                socket_connect_timeout=5,
+                **self._connection_kwargs(),
+            )
+        return redis.Redis(connection_pool=self._sync_pool)
+
     async def connect(self):
-        """Подключается к Redis (только один раз)"""
-        if self._redis_client is None:
-            try:
-                self._redis_client = redis.Redis(
-                    host=getattr(settings, "BOT_REDIS_HOST", "localhost"),
-                    port=getattr(settings, "BOT_REDIS_PORT", 6379),
-                    db=getattr(settings, "BOT_REDIS_DB", 0),
-                    decode_responses=True,
-                )
-                await self._redis_client.ping()
-                logger.info("SharedRedisManager подключен к Redis")
-            except Exception as e:
-                logger.error(
-                    f"Ошибка подключения SharedRedisManager к Redis: {e}"
-                )
-                raise
+        """Проверяет подключение к Redis"""
+        try:
+            await self.client.ping()
+            logger.info("SharedRedisManager подключен к Redis")
+        except Exception as e:
+            logger.error(f"Ошибка подключения SharedRedisManager к Redis: {e}")
+            raise
 
     async def disconnect(self):
-        """Отключается от Redis"""
-        if self._redis_client:
-            await self._redis_client.close()
-            self._redis_client = None
-            logger.info("SharedRedisManager отключен от Redis")
+        """Закрывает все пулы соединений"""
+        if self._reporter:
+            self._reporter.cancel()
+            SharedRedisManager._reporter = None
+
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        logger.info("SharedRedisManager отключен от Redis")
+
+    @property
+    def client(self) -> aioredis.Redis:
+        """Возвращает Redis клиент кеша (строки)"""
+        return self.get_client("cache")
 
     @property
-    def client(self) -> redis.Redis:
-        """Возвращает Redis клиент"""
-        if self._redis_client is None:
-            raise RuntimeError(
-                "Redis не подключен. Вызовите connect() сначала."
+    def raw_client(self) -> aioredis.Redis:
+        """Возвращает Redis клиент событий (bytes)"""
+        return self.get_client("events")
+
+    def metrics_snapshot(self, reset: bool = False) -> dict:
+        """Метрики пулов: задержки команд и пиковая загрузка"""
+        snapshot = {}
+        for name, metrics in self._metrics.items():
+            client = self._clients.get(name)
+            max_connections = (
+                client.connection_pool.max_connections if client else 0
             )
-        return self._redis_client
+            snapshot[name] = {
+                "commands": metrics.commands,
+                "errors": metrics.errors,
+                "avg_ms": round(metrics.total_ms / metrics.commands, 2)
+                if metrics.commands
+                else 0,
+                "max_ms": round(metrics.max_ms, 2),
+                "latency_buckets_ms": dict(
+                    zip(
+                        [*map(str, LATENCY_BUCKETS_MS), "inf"],
+                        metrics.buckets,
+                    )
+                ),
+                "peak_in_use": metrics.peak_in_use,
+                "saturation": round(metrics.peak_in_use / max_connections, 2)
+                if max_connections
+                else 0,
+            }
+            if reset:
+                metrics.reset()
+        return snapshot
+
+    def start_metrics_reporter(self):
+        """Периодически пишет метрики пулов в лог"""
+        interval = getattr(settings, "REDIS_METRICS_INTERVAL", 60)
+        if not interval or (self._reporter and not self._reporter.done()):
+            return
+
+        async def report():
+            while True:
+                await asyncio.sleep(interval)
+                for name, values in self.metrics_snapshot(reset=True).items():
+                    logger.info("Метрики Redis", pool=name, **values)
+
+        SharedRedisManager._reporter = asyncio.create_task(report())
 
-    async def publish(self, channel: str, data: str):
+    async def publish(self, channel: str, data: bytes | str):
         """Публикует сообщение в канал"""
-        await self.client.publish(channel, data)
+        await self.raw_client.publish(channel, data)
 
     async def subscribe_to_channel(self, channel: str, callback):
         """Подписывается на канал с callback"""
-        pubsub = self.client.pubsub()
+        pubsub = self.raw_client.pubsub()
         await pubsub.subscribe(channel)
 
         try:
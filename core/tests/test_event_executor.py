@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from core.event_executor import EventExecutor
+from core.event_manager import EventType
+
+
+class EventExecutorTests(SimpleTestCase):
+    """Результат задач обработчиков EventExecutor"""
+
+    async def test_failed_handler_reported(self):
+        async def handler():
+            raise RuntimeError("boom")
+
+        task = await EventExecutor().submit(EventType.NEW_AD_MESSAGE, handler())
+
+        self.assertIs(await task, False)
+
+    async def test_successful_handler_reported(self):
+        async def handler():
+            return None
+
+        task = await EventExecutor().submit(EventType.NEW_AD_MESSAGE, handler())
+
+        self.assertIs(await task, True)
@@ -0,0 +1,107 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.event_transport import PubSubTransport, StreamsTransport
+
+STREAM = "stream:bot:new_ad"
+ENTRY_ID = b"1-0"
+FIELDS = {b"data": b"payload"}
+
+
+@override_settings(EVENT_STREAM_CLAIM_IDLE_MS=10)
+class StreamsReclaimTests(SimpleTestCase):
+    """Повторная выдача зависших записей в StreamsTransport"""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.xack = AsyncMock()
+        # Redis отдает запись в XAUTOCLAIM, когда она пролежала в pending
+        # дольше claim_idle_ms — в том числе у этого же потребителя
+        self.client.xautoclaim = AsyncMock(
+            return_value=[b"0-0", [(ENTRY_ID, FIELDS)], []]
+        )
+        patcher = patch("core.event_transport.redis_manager")
+        self.addCleanup(patcher.stop)
+        patcher.start().raw_client = self.client
+        self.transport = StreamsTransport()
+
+    async def test_slow_handler_not_dispatched_twice(self):
+        handler_done = asyncio.get_running_loop().create_future()
+        callback = AsyncMock(return_value=handler_done)
+
+        await self.transport._process_entries(
+            STREAM, [(ENTRY_ID, FIELDS)], callback
+        )
+        # Обработчик идет дольше claim_idle_ms
+        await asyncio.sleep(0.05)
+        await self.transport._reclaim_pending(STREAM, callback)
+
+        self.assertEqual(callback.await_count, 1)
+        self.client.xack.assert_not_awaited()
+
+        handler_done.set_result(None)
+        await self.transport.flush()
+        self.client.xack.assert_awaited_once_with(
+            STREAM, self.transport.group, ENTRY_ID
+        )
+
+    async def test_failed_handler_not_acked(self):
+        handler_done = asyncio.get_running_loop().create_future()
+        callback = AsyncMock(return_value=handler_done)
+
+        await self.transport._process_entries(
+            STREAM, [(ENTRY_ID, FIELDS)], callback
+        )
+        handler_done.set_result(False)
+        await self.transport.flush()
+
+        self.client.xack.assert_not_awaited()
+        # Запись снова доступна для XAUTOCLAIM
+        self.assertFalse(self.transport._inflight)
+
+    async def test_entry_of_dead_consumer_reclaimed(self):
+        callback = AsyncMock(return_value=None)
+
+        await self.transport._reclaim_pending(STREAM, callback)
+
+        callback.assert_awaited_once_with(b"payload")
+        self.client.xack.assert_awaited_once_with(
+            STREAM, self.transport.group, ENTRY_ID
+        )
+
+
+class PubSubPatternTests(SimpleTestCase):
+    """Подписка на ответы по префиксу в PubSubTransport"""
+
+    def setUp(self):
+        self.pubsub = MagicMock()
+        self.pubsub.psubscribe = AsyncMock()
+        self.pubsub.close = AsyncMock()
+        patcher = patch("core.event_transport.redis_manager")
+        self.addCleanup(patcher.stop)
+        patcher.start().raw_client.pubsub.return_value = self.pubsub
+
+    async def test_waits_for_psubscribe_reply(self):
+        replies = [None, {"type": "psubscribe", "data": 1}]
+        self.pubsub.get_message = AsyncMock(side_effect=replies)
+
+        subscription = await PubSubTransport().open_pattern("bot:response:")
+
+        self.pubsub.psubscribe.assert_awaited_once_with("bot:response:*")
+        self.assertEqual(self.pubsub.get_message.await_count, len(replies))
+        self.assertIs(subscription.pubsub, self.pubsub)
+        self.pubsub.close.assert_not_awaited()
+
+    async def test_closes_pubsub_without_reply(self):
+        async def no_reply(timeout=None):
+            await asyncio.sleep(1)
+
+        self.pubsub.get_message = no_reply
+        transport = PubSubTransport()
+        transport.SUBSCRIBE_TIMEOUT = 0.01
+
+        with self.assertRaises(TimeoutError):
+            await transport.open_pattern("bot:response:")
+        self.pubsub.close.assert_awaited_once()
@@ -0,0 +1,40 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from core.message_codecs import check_codecs, decode_payload, get_codec
+from userbot.redis_messages import NewAdMessage, decode_event, serialize_message
+
+CODECS = ("json", "orjson", "msgpack")
+
+
+class MessageCodecsTests(SimpleTestCase):
+    """Кодирование и разбор кадров событий"""
+
+    def test_payload_round_trip(self):
+        payload = {"text": "Реклама 🔥", "ids": [1, 2], "nested": {"a": None}}
+        for name in CODECS:
+            with self.subTest(codec=name):
+                data = get_codec(name).encode(payload)
+                self.assertEqual(decode_payload(data), payload)
+
+    def test_event_decoded_from_any_codec(self):
+        message = NewAdMessage(
+            channel_id=-100123, channel_title="Канал", message_id=7, news_id=3
+        )
+        trace = {"trace_id": "abc"}
+        for name in CODECS:
+            with self.subTest(codec=name):
+                decoded, decoded_trace = decode_event(
+                    serialize_message(message, name, trace)
+                )
+                self.assertEqual(decoded, message)
+                self.assertEqual(decoded_trace, trace)
+
+    def test_unknown_codec_fails(self):
+        with self.assertRaises(ImproperlyConfigured):
+            serialize_message(NewAdMessage(), "protobuf")
+
+    @override_settings(EVENT_CHANNEL_CODECS={"bot:new_ad": "msgpak"})
+    def test_check_codecs_rejects_misconfigured_channel(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_codecs()
@@ -0,0 +1,176 @@
+"""Трассировка задержки рекламы: от поста в канале до отправки пользователю.
+
+Трасса создается в MessageHandler от message.date и передается в конверте
+события. На каждом этапе ставится отметка времени, а время с предыдущего
+этапа попадает в гистограмму этапа вместе с примером (exemplar) — id
+трассы, по которому медленный пост находится в логах. Гистограмма
+end_to_end — основной сигнал свежести уведомлений.
+
+Отметки — время стены разных процессов, а message.date округлен Telegram
+до секунды, поэтому точность end_to_end — около секунды.
+"""
+
+import asyncio
+import contextvars
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import structlog
+from django.conf import settings
+
+logger = structlog.getLogger(__name__)
+
+# Этапы в порядке прохождения поста
+STAGES = ("detected", "saved", "published", "consumed", "sent")
+FINAL_STAGE = "sent"
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+current_trace: contextvars.ContextVar[Optional["TraceContext"]] = (
+    contextvars.ContextVar("current_trace", default=None)
+)
+
+
+@dataclass(slots=True)
+class TraceContext:
+    """Трасса одного поста: время публикации в канале и отметки этапов"""
+
+    trace_id: str
+    origin: float
+    stamps: dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.trace_id,
+            "origin": self.origin,
+            "stamps": self.stamps,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TraceContext":
+        return cls(
+            trace_id=data["id"],
+            origin=data["origin"],
+            stamps=dict(data.get("stamps") or {}),
+        )
+
+    def _previous(self, stage: str) -> float:
+        """Время последнего пройденного этапа перед stage"""
+        for previous in reversed(STAGES[: STAGES.index(stage)]):
+            if previous in self.stamps:
+                return self.stamps[previous]
+        return self.origin
+
+    def stamp(self, stage: str):
+        """Отмечает этап и записывает его длительность в гистограмму"""
+        now = time.time()
+        trace_metrics.observe(
+            stage, (now - self._previous(stage)) * 1000, self.trace_id
+        )
+        if stage == FINAL_STAGE:
+            trace_metrics.observe(
+                "end_to_end", (now - self.origin) * 1000, self.trace_id
+            )
+        self.stamps[stage] = now
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с последним примером трассы в каждом бакете"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.exemplars: list[Optional[tuple[str, float]]] = [None] * len(
+            self.buckets
+        )
+
+    def observe(self, elapsed_ms: float, trace_id: str):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                break
+        else:
+            index = len(LATENCY_BUCKETS_MS)
+        self.buckets[index] += 1
+        self.exemplars[index] = (trace_id, round(elapsed_ms, 1))
+
+    def snapshot(self) -> dict:
+        bounds = [*map(str, LATENCY_BUCKETS_MS), "inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0,
+            "max_ms": round(self.max_ms, 1),
+            "buckets_ms": dict(zip(bounds, self.buckets)),
+            "exemplars": {
+                bound: exemplar
+                for bound, exemplar in zip(bounds, self.exemplars)
+                if exemplar
+            },
+        }
+
+
+class TraceMetrics:
+    """Гистограммы задержек по этапам в пределах процесса"""
+
+    def __init__(self):
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._reporter: Optional[asyncio.Task] = None
+
+    def observe(self, stage: str, elapsed_ms: float, trace_id: str):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = LatencyHistogram()
+        histogram.observe(max(elapsed_ms, 0.0), trace_id)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        snapshot = {}
+        for stage, histogram in self._histograms.items():
+            if histogram.count:
+                snapshot[stage] = histogram.snapshot()
+            if reset:
+                histogram.reset()
+        return snapshot
+
+    def start_reporter(self):
+        """Периодически пишет гистограммы этапов в лог"""
+        interval = getattr(settings, "TRACE_METRICS_INTERVAL", 60)
+        if not interval or (self._reporter and not self._reporter.done()):
+            return
+
+        async def report():
+            while True:
+                await asyncio.sleep(interval)
+                for stage, values in self.snapshot(reset=True).items():
+                    logger.info(
+                        "Задержка доставки рекламы", stage=stage, **values
+                    )
+
+        self._reporter = asyncio.create_task(report())
+
+
+trace_metrics = TraceMetrics()
+
+
+def start_trace(
+    channel_id: int, message_id: int, posted_at: datetime
+) -> TraceContext:
+    """Создает трассу поста; id трассы — канал и номер поста"""
+    return TraceContext(
+        trace_id=f"{channel_id}:{message_id}", origin=posted_at.timestamp()
+    )
+
+
+def stamp(stage: str):
+    """Отмечает этап текущей трассы; без трассы ничего не делает"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.stamp(stage)
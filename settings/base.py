@@ -130,3 +130,214 @@ CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 50
 CELERY_TASK_IGNORE_RESULT = True
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+
+# Юзерботы
+USERBOT_JOIN_DELAY = int(
+    os.getenv("USERBOT_JOIN_DELAY", "15")
+)  # Пауза между вступлениями в каналы, секунды
+USERBOT_STANDBY_ENABLED = (
+    os.getenv("USERBOT_STANDBY_ENABLED", "False").lower() == "true"
+)  # Держать резервные подписки на каналы
+USERBOT_STANDBY_SYNC_INTERVAL = int(
+    os.getenv("USERBOT_STANDBY_SYNC_INTERVAL", "3600")
+)  # Как часто досоздавать реплики, секунды
+USERBOT_STANDBY_TOP_CHANNELS = int(
+    os.getenv("USERBOT_STANDBY_TOP_CHANNELS", "0")
+)  # Сколько самых популярных каналов резервировать автоматически
+USERBOT_STANDBY_DEFAULT_REPLICAS = int(
+    os.getenv("USERBOT_STANDBY_DEFAULT_REPLICAS", "2")
+)  # Фактор репликации для автоматически резервируемых каналов
+USERBOT_STANDBY_MAX_JOINS = int(
+    os.getenv("USERBOT_STANDBY_MAX_JOINS", "20")
+)  # Максимум вступлений за один проход
+USERBOT_REPLICA_CACHE_TTL = int(
+    os.getenv("USERBOT_REPLICA_CACHE_TTL", "60")
+)  # Сколько кэшировать резервные подписки канала, секунды
+USERBOT_REBALANCE_MAX_MOVES = int(
+    os.getenv("USERBOT_REBALANCE_MAX_MOVES", "10")
+)  # Максимум переносов каналов за один проход балансировки
+USERBOT_REBALANCE_TOLERANCE = float(
+    os.getenv("USERBOT_REBALANCE_TOLERANCE", "0.1")
+)  # Допустимое превышение целевой нагрузки аккаунта (доля)
+USERBOT_GC_GRACE_HOURS = int(
+    os.getenv("USERBOT_GC_GRACE_HOURS", "72")
+)  # Сколько канал без пользователей ждет перед выходом юзерботов, часы
+USERBOT_GC_MAX_LEAVES = int(
+    os.getenv("USERBOT_GC_MAX_LEAVES", "50")
+)  # Максимум выходов из каналов за один проход
+USERBOT_LEAVE_DELAY = int(
+    os.getenv("USERBOT_LEAVE_DELAY", "5")
+)  # Пауза между выходами из каналов, секунды
+USERBOT_METADATA_FLUSH_INTERVAL = int(
+    os.getenv("USERBOT_METADATA_FLUSH_INTERVAL", "60")
+)  # Как часто обновлять каналы из событий UpdateChannel, секунды
+USERBOT_METADATA_REFRESH_INTERVAL = int(
+    os.getenv("USERBOT_METADATA_REFRESH_INTERVAL", "86400")
+)  # Как часто обновлять названия и username всех каналов, секунды
+USERBOT_RESOLVE_CACHE_TTL = int(
+    os.getenv("USERBOT_RESOLVE_CACHE_TTL", "86400")
+)  # Сколько хранить разрешенные username и invite-ссылки, секунды
+USERBOT_RESOLVE_NEGATIVE_TTL = int(
+    os.getenv("USERBOT_RESOLVE_NEGATIVE_TTL", "600")
+)  # Сколько помнить несуществующие username, секунды
+USERBOT_RESOLVE_ACCESS_HASH_TTL = int(
+    os.getenv("USERBOT_RESOLVE_ACCESS_HASH_TTL", "2592000")
+)  # Сколько хранить access_hash каналов для каждого аккаунта, секунды
+
+# События между процессами
+EVENT_TRANSPORT = os.getenv(
+    "EVENT_TRANSPORT", "pubsub"
+)  # pubsub, streams (Redis Streams с подтверждением) или memory (один процесс)
+EVENT_STREAM_GROUP = os.getenv(
+    "EVENT_STREAM_GROUP", "workers"
+)  # Группа потребителей стримов
+EVENT_STREAM_MAXLEN = int(
+    os.getenv("EVENT_STREAM_MAXLEN", "10000")
+)  # Приблизительная максимальная длина стрима
+EVENT_STREAM_BATCH_SIZE = int(
+    os.getenv("EVENT_STREAM_BATCH_SIZE", "10")
+)  # Сколько сообщений читать за раз
+EVENT_STREAM_BLOCK_MS = int(
+    os.getenv("EVENT_STREAM_BLOCK_MS", "5000")
+)  # Сколько ждать новых сообщений в XREADGROUP, мс
+EVENT_STREAM_CLAIM_IDLE_MS = int(
+    os.getenv("EVENT_STREAM_CLAIM_IDLE_MS", "60000")
+)  # Через сколько забирать неподтвержденные сообщения упавшего потребителя, мс
+EVENT_RESPONSE_TTL = int(
+    os.getenv("EVENT_RESPONSE_TTL", "60")
+)  # Сколько хранить ответы на запросы для опоздавших ожидающих, секунды
+EVENT_CODEC = os.getenv(
+    "EVENT_CODEC", "json"
+)  # Кодек событий по умолчанию: json, orjson или msgpack
+EVENT_CHANNEL_CODECS = dict(
+    item.split("=", 1)
+    for item in os.getenv("EVENT_CHANNEL_CODECS", "").split(",")
+    if "=" in item
+)  # Кодеки для отдельных каналов, например "bot:new_ad=msgpack"
+AD_TEXT_CACHE_SIZE = int(
+    os.getenv("AD_TEXT_CACHE_SIZE", "256")
+)  # Сколько HTML уведомлений о постах держать в памяти бота
+EVENT_MAX_CONCURRENCY = int(
+    os.getenv("EVENT_MAX_CONCURRENCY", "10")
+)  # Сколько обработчиков событий выполняется одновременно
+EVENT_MAX_PENDING = int(
+    os.getenv("EVENT_MAX_PENDING", "1000")
+)  # Сколько обработчиков может ждать в очереди до паузы чтения
+EVENT_CONCURRENCY = {
+    event_type: int(limit)
+    for event_type, limit in (
+        item.split("=", 1)
+        for item in os.getenv("EVENT_CONCURRENCY", "").split(",")
+        if "=" in item
+    )
+}  # Лимиты по типам событий, например "new_ad_message=2"
+EVENT_DRAIN_TIMEOUT = int(
+    os.getenv("EVENT_DRAIN_TIMEOUT", "30")
+)  # Сколько ждать начатые обработчики при остановке, секунды
+EVENT_UNFINISHED_TTL = int(
+    os.getenv("EVENT_UNFINISHED_TTL", "3600")
+)  # Сколько хранить события, переданные следующему процессу, секунды
+
+# Рассылка уведомлений
+BROADCAST_RATE = int(
+    os.getenv("BROADCAST_RATE", "30")
+)  # Сообщений в секунду на всего бота (лимит Telegram ~30)
+BROADCAST_RESERVED_RATE = int(
+    os.getenv("BROADCAST_RESERVED_RATE", "5")
+)  # Сколько из BROADCAST_RATE не отдавать рассылке: запас платежам и меню
+BROADCAST_CONCURRENCY = int(
+    os.getenv("BROADCAST_CONCURRENCY", "10")
+)  # Параллельных отправителей
+BROADCAST_CHAT_INTERVAL = float(
+    os.getenv("BROADCAST_CHAT_INTERVAL", "1.0")
+)  # Минимальный интервал между сообщениями в один чат, секунды
+BROADCAST_LIMITER = os.getenv(
+    "BROADCAST_LIMITER", "redis"
+)  # redis — лимит общий для всех отправителей, local — в пределах процесса
+BOT_TRANSACTIONAL_CONNECTIONS = int(
+    os.getenv("BOT_TRANSACTIONAL_CONNECTIONS", "4")
+)  # Соединений с Bot API у уведомлений о платежах
+BOT_INTERACTIVE_CONNECTIONS = int(
+    os.getenv("BOT_INTERACTIVE_CONNECTIONS", "50")
+)  # Соединений с Bot API у ответов пользователям
+BOT_BULK_CONNECTIONS = int(
+    os.getenv("BOT_BULK_CONNECTIONS", "10")
+)  # Соединений с Bot API у рассылки (не меньше BROADCAST_CONCURRENCY)
+
+# Очередь доставки уведомлений
+DELIVERY_MAX_ATTEMPTS = int(
+    os.getenv("DELIVERY_MAX_ATTEMPTS", "6")
+)  # Попыток до переноса в недоставленные
+DELIVERY_RETRY_BASE = float(
+    os.getenv("DELIVERY_RETRY_BASE", "5")
+)  # Первая пауза перед повтором, секунды (дальше удваивается)
+DELIVERY_RETRY_MAX = float(
+    os.getenv("DELIVERY_RETRY_MAX", "900")
+)  # Максимальная пауза перед повтором, секунды
+DELIVERY_LEASE_SECONDS = int(
+    os.getenv("DELIVERY_LEASE_SECONDS", "120")
+)  # Через сколько взятое, но не подтвержденное задание вернется в очередь
+DELIVERY_TEXT_TTL = int(
+    os.getenv("DELIVERY_TEXT_TTL", "86400")
+)  # Сколько хранить тексты рассылок, секунды
+DELIVERY_POLL_INTERVAL = float(
+    os.getenv("DELIVERY_POLL_INTERVAL", "1.0")
+)  # Пауза между проверками пустой очереди, секунды
+DELIVERY_CLEANUP_INTERVAL = int(
+    os.getenv("DELIVERY_CLEANUP_INTERVAL", "30")
+)  # Как часто отписывать заблокировавших бота пользователей, секунды
+DELIVERY_COALESCE_WINDOW = float(
+    os.getenv("DELIVERY_COALESCE_WINDOW", "0")
+)  # Окно объединения уведомлений одному пользователю, секунды; 0 — выключено
+DELIVERY_TIMEZONE = os.getenv(
+    "DELIVERY_TIMEZONE", "Europe/Moscow"
+)  # Часовой пояс тихих часов и дайджеста
+DELIVERY_QUIET_START = int(
+    os.getenv("DELIVERY_QUIET_START", "23")
+)  # Начало тихих часов (час)
+DELIVERY_QUIET_END = int(
+    os.getenv("DELIVERY_QUIET_END", "8")
+)  # Окончание тихих часов (час)
+DELIVERY_DIGEST_HOUR = int(
+    os.getenv("DELIVERY_DIGEST_HOUR", "9")
+)  # Час отправки ежедневного дайджеста
+DELIVERY_BATCH_MAX_ADS = int(
+    os.getenv("DELIVERY_BATCH_MAX_ADS", "20")
+)  # Сколько постов показывать в часовой пачке и дайджесте
+DELIVERY_LEDGER_BATCH = int(
+    os.getenv("DELIVERY_LEDGER_BATCH", "500")
+)  # Записей журнала доставки в одном bulk_create
+DELIVERY_LEDGER_FLUSH_INTERVAL = float(
+    os.getenv("DELIVERY_LEDGER_FLUSH_INTERVAL", "5")
+)  # Как часто сбрасывать буфер журнала доставки, секунды
+DELIVERY_LEDGER_RETENTION_DAYS = int(
+    os.getenv("DELIVERY_LEDGER_RETENTION_DAYS", "90")
+)  # Сколько дней хранить журнал доставки
+DELIVERY_WORKER_IN_BOT = (
+    os.getenv("DELIVERY_WORKER_IN_BOT", "True").lower() == "true"
+)  # Доставлять из процесса бота; False — только отдельные run_sender
+
+# Пулы соединений Redis
+REDIS_MAX_CONNECTIONS = int(
+    os.getenv("REDIS_MAX_CONNECTIONS", "50")
+)  # Максимум соединений в пуле по умолчанию
+REDIS_POOL_MAX_CONNECTIONS = {
+    pool: int(limit)
+    for pool, limit in (
+        item.split("=", 1)
+        for item in os.getenv("REDIS_POOL_MAX_CONNECTIONS", "").split(",")
+        if "=" in item
+    )
+}  # Лимиты отдельных пулов, например "events=20,fsm=10"
+REDIS_POOL_TIMEOUT = int(
+    os.getenv("REDIS_POOL_TIMEOUT", "20")
+)  # Сколько ждать свободное соединение, секунды
+REDIS_HEALTH_CHECK_INTERVAL = int(
+    os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30")
+)  # Проверка простаивающих соединений, секунды
+REDIS_METRICS_INTERVAL = int(
+    os.getenv("REDIS_METRICS_INTERVAL", "60")
+)  # Как часто писать метрики пулов в лог, секунды (0 — выключено)
+TRACE_METRICS_INTERVAL = int(
+    os.getenv("TRACE_METRICS_INTERVAL", "60")
+)  # Как часто писать гистограммы задержки рекламы в лог, секунды (0 — выключено)
@@ -4,10 +4,11 @@ from typing import Optional
 
 import structlog
 from asgiref.sync import sync_to_async
+from django.db.models import Count, Q
 from telethon import TelegramClient
 from telethon.errors import AuthKeyUnregisteredError, SessionRevokedError
 
-from bot.models import ChannelSubscription, UserBot
+from bot.models import UserBot
 
 logger = structlog.getLogger(__name__)
 
@@ -290,39 +291,34 @@ class UserbotCore:
         await asyncio.sleep(delay)
         await self._restart_userbot(userbot_id)
 
-    async def _select_best_userbot(self) -> Optional[UserBot]:
-        """Выбирает лучший юзербот для подписки на канал"""
+    async def _select_best_userbot(
+        self, exclude_ids: set[int] | None = None
+    ) -> Optional[UserBot]:
+        """Выбирает лучший юзербот для подписки на канал.
 
-        # Получаем всех активных юзерботов
-        def get_active_userbots():
-            return list(
-                UserBot.objects.filter(
-                    status=UserBot.STATUS_ACTIVE, is_active=True
+        Резервные аккаунты (is_standby) не получают новых подписок,
+        они только держат реплики каналов.
+        """
+
+        def get_least_loaded_userbot():
+            queryset = UserBot.objects.filter(
+                status=UserBot.STATUS_ACTIVE, is_active=True, is_standby=False
+            )
+            if exclude_ids:
+                queryset = queryset.exclude(id__in=exclude_ids)
+
+            return (
+                queryset.annotate(
+                    subscriptions_count=Count(
+                        "channel_subscriptions",
+                        filter=Q(channel_subscriptions__is_subscribed=True),
+                    )
                 )
+                .order_by("subscriptions_count", "id")
+                .first()
             )
 
-        active_userbots = await sync_to_async(get_active_userbots)()
-
-        if not active_userbots:
-            return None
-
-        best_userbot = None
-        min_subscriptions = float("inf")
-
-        for userbot in active_userbots:
-
-            def count_subscriptions():
-                return ChannelSubscription.objects.filter(
-                    userbot=userbot, is_subscribed=True
-                ).count()
-
-            subscription_count = await sync_to_async(count_subscriptions)()
-
-            if subscription_count < min_subscriptions:
-                min_subscriptions = subscription_count
-                best_userbot = userbot
-
-        return best_userbot
+        return await sync_to_async(get_least_loaded_userbot)()
 
     def get_client(self, userbot_id: int) -> Optional[TelegramClient]:
         """Получает клиент юзербота по ID"""
@@ -0,0 +1,130 @@
+"""Сборка мусора: выход из каналов, на которые никто не подписан"""
+
+import asyncio
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from bot.models import Channel, ChannelSubscription, ChannelUser, UserBot
+
+if TYPE_CHECKING:
+    from userbot.core import UserbotCore
+    from userbot.subscription_handler import SubscriptionHandler
+
+logger = structlog.getLogger(__name__)
+
+
+class ChannelGCHandler:
+    """Выводит юзерботов из каналов, от которых отписались все пользователи.
+
+    Канал сначала помечается orphaned_since и выдерживается льготный
+    период: если пользователь вернется, метка снимается и аккаунтам не
+    придется вступать заново. После периода все аккаунты выходят из
+    канала, а подписки помечаются неактивными. Сам канал и его новости
+    остаются в базе.
+    """
+
+    def __init__(
+        self,
+        userbot_core: "UserbotCore",
+        subscription_handler: "SubscriptionHandler",
+    ):
+        self.userbot_core = userbot_core
+        self.subscription_handler = subscription_handler
+
+    async def collect(self, max_leaves: int) -> int:
+        """Выполняет до max_leaves выходов из каналов, возвращает их число"""
+        marked, restored = await sync_to_async(self._mark_orphans)()
+        if marked or restored:
+            logger.info(
+                f"Каналов без пользователей: +{marked}, вернулись пользователи: {restored}"
+            )
+
+        channels = await sync_to_async(self._get_expired_channels)()
+        if not channels:
+            logger.info("Нет каналов для выхода")
+            return 0
+
+        leave_delay = getattr(settings, "USERBOT_LEAVE_DELAY", 5)
+        leaves = 0
+
+        for channel in channels:
+            for subscription in channel.active_subscriptions:
+                if leaves >= max_leaves:
+                    logger.info(f"Достигнут лимит выходов за проход: {leaves}")
+                    return leaves
+
+                client = self.userbot_core.get_client(subscription.userbot_id)
+                if client:
+                    # Пока шли паузы между выходами, на канал мог
+                    # подписаться пользователь
+                    if await self._regained_users(channel):
+                        break
+                    leaves += 1
+                    left = await self.subscription_handler.leave_channel(
+                        client, channel
+                    )
+                    await asyncio.sleep(leave_delay)
+                    if not left:
+                        continue
+                elif subscription.userbot.status == UserBot.STATUS_ACTIVE:
+                    # Аккаунт жив, но не подключен — выйдем в следующий раз
+                    continue
+
+                subscription.is_subscribed = False
+                subscription.is_primary = False
+                await subscription.asave(
+                    update_fields=["is_subscribed", "is_primary", "updated_at"]
+                )
+            else:
+                logger.info(f"Юзерботы вышли из канала {channel.title}")
+
+        return leaves
+
+    async def _regained_users(self, channel: Channel) -> bool:
+        """Есть ли у канала пользователи; если да — снимает метку orphaned_since"""
+        if not await ChannelUser.objects.filter(channel=channel).aexists():
+            return False
+        await Channel.objects.filter(pk=channel.pk).aupdate(orphaned_since=None)
+        logger.info(
+            f"На канал {channel.title} подписались, выход из него отменен"
+        )
+        return True
+
+    def _mark_orphans(self) -> tuple[int, int]:
+        """Ставит и снимает метку orphaned_since, возвращает (помечено, снято)"""
+        marked = Channel.objects.filter(
+            users__isnull=True, orphaned_since__isnull=True
+        ).update(orphaned_since=timezone.now())
+        restored = Channel.objects.filter(
+            users__isnull=False, orphaned_since__isnull=False
+        ).update(orphaned_since=None)
+        return marked, restored
+
+    def _get_expired_channels(self) -> list[Channel]:
+        """Каналы без пользователей дольше льготного периода, где еще есть подписки"""
+        grace_hours = getattr(settings, "USERBOT_GC_GRACE_HOURS", 72)
+        deadline = timezone.now() - timedelta(hours=grace_hours)
+
+        return list(
+            Channel.objects.filter(
+                orphaned_since__lte=deadline,
+                subscriptions__is_subscribed=True,
+            )
+            .distinct()
+            .order_by("orphaned_since")
+            .prefetch_related(
+                Prefetch(
+                    "subscriptions",
+                    queryset=ChannelSubscription.objects.filter(
+                        is_subscribed=True
+                    ).select_related("userbot"),
+                    to_attr="active_subscriptions",
+                )
+            )
+        )
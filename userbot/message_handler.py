@@ -1,10 +1,14 @@
+import asyncio
 import time
+from collections import Counter
 from typing import TYPE_CHECKING
 
 import structlog
+from django.conf import settings
 
-from bot.models import Channel, ChannelNews
+from bot.models import Channel, ChannelNews, ChannelSubscription
 from core.event_manager import EventType, event_manager
+from core.tracing import current_trace, start_trace
 from userbot.redis_messages import NewAdMessage
 from utils.advertisement_detector import is_advertisement
 
@@ -19,12 +23,26 @@ class MessageHandler:
 
     def __init__(self, userbot_core: "UserbotCore"):
         self.userbot_core = userbot_core
+        # Сколько сообщений пришло из каждого канала с запуска процесса,
+        # используется для балансировки нагрузки между юзерботами
+        self.message_counts: Counter[int] = Counter()
+        # Последнее посчитанное сообщение канала: реплики получают те же
+        # посты, а id сообщений в канале только растут
+        self._last_counted: dict[int, int] = {}
+        # Обрабатываемые сейчас сообщения, их дожидаются при остановке
+        self._inflight: set[asyncio.Task] = set()
+        # Резервные подписки по каналам: channel_id -> (когда прочитаны,
+        # юзерботы-реплики). Сбрасывается при переключении подписок
+        self._replicas: dict[int, tuple[float, frozenset[int]]] = {}
 
     def create_message_handler(self, userbot):
         """Создает обработчик сообщений для конкретного юзербота"""
 
         async def message_handler(event):
             """Обработчик входящих сообщений"""
+            task = asyncio.current_task()
+            self._inflight.add(task)
+            token = None
             try:
                 # Обновляем время последней активности юзербота
                 if userbot.id in self.userbot_core.last_activity:
@@ -41,21 +59,55 @@ class MessageHandler:
                 if not hasattr(chat, "id") or chat.id is None:
                     return
 
+                self._count_message(abs(chat.id), message.id)
+
                 if not self._is_ad_message(message):
                     return
 
+                # Трасса идет дальше в событии и заканчивается отправкой в боте
+                trace = start_trace(abs(chat.id), message.id, message.date)
+                token = current_trace.set(trace)
+                trace.stamp("detected")
+
                 channel = await self._get_channel_by_telegram_id(abs(chat.id))
                 if not channel:
                     return
 
-                await self._save_channel_news(channel, message)
-                await self._send_ad_notification(channel, message)
+                # Реплики получают те же посты, обрабатывает их только основной аккаунт
+                if await self._is_replica(channel, userbot.id):
+                    return
+
+                news = await self._save_channel_news(channel, message)
+                if news:
+                    trace.stamp("saved")
+                await self._send_ad_notification(channel, message, news)
 
             except Exception as e:
                 logger.error(f"Ошибка обработки сообщения: {e}")
+            finally:
+                self._inflight.discard(task)
+                if token is not None:
+                    current_trace.reset(token)
 
         return message_handler
 
+    def _count_message(self, channel_id: int, message_id: int):
+        """Считает сообщение канала один раз, сколько бы клиентов его ни получили"""
+        if message_id <= self._last_counted.get(channel_id, 0):
+            return
+        self._last_counted[channel_id] = message_id
+        self.message_counts[channel_id] += 1
+
+    async def drain(self, timeout: float):
+        """Ждет, пока начатые сообщения сохранятся и уйдут в бота"""
+        if not self._inflight:
+            return
+
+        logger.info(f"Ожидаем обработки сообщений: {len(self._inflight)}")
+        _, pending = await asyncio.wait(set(self._inflight), timeout=timeout)
+        if pending:
+            logger.warning(f"Не дождались обработки сообщений: {len(pending)}")
+
     async def _get_channel_by_telegram_id(self, telegram_id: int):
         """Получает канал по telegram_id"""
         try:
@@ -63,32 +115,71 @@ class MessageHandler:
         except Channel.DoesNotExist:
             return None
 
+    async def _is_replica(self, channel: Channel, userbot_id: int) -> bool:
+        """Является ли подписка юзербота на канал резервной"""
+        cached = self._replicas.get(channel.id)
+        ttl = getattr(settings, "USERBOT_REPLICA_CACHE_TTL", 60)
+        if cached is None or time.monotonic() - cached[0] > ttl:
+            # Подписки могут поменять и другие процессы, поэтому кэш
+            # еще и устаревает сам
+            replicas = frozenset(
+                [
+                    replica_id
+                    async for replica_id in ChannelSubscription.objects.filter(
+                        channel=channel, is_primary=False
+                    ).values_list("userbot_id", flat=True)
+                ]
+            )
+            cached = self._replicas[channel.id] = (time.monotonic(), replicas)
+        return userbot_id in cached[1]
+
+    def invalidate_replicas(self, channel_id: int | None = None):
+        """Сбрасывает кэш резервных подписок канала или всех каналов"""
+        if channel_id is None:
+            self._replicas.clear()
+        else:
+            self._replicas.pop(channel_id, None)
+
     def _is_ad_message(self, message) -> bool:
         """Проверяет, является ли сообщение рекламой"""
         return is_advertisement(message.text)
 
-    async def _save_channel_news(self, channel: Channel, message):
+    async def _save_channel_news(
+        self, channel: Channel, message
+    ) -> ChannelNews | None:
         """Сохраняет новость в БД"""
         try:
-            await ChannelNews.objects.acreate(
+            news = ChannelNews(
                 channel=channel,
                 message_id=message.id,
                 message=message.text or "",
                 created_at=message.date,
             )
+            # Рендерим один раз здесь, а не на каждую рассылку и показ
+            news.render_html()
+            await news.asave()
             logger.info(f"Сохранена новость из канала {channel.title}")
+            return news
         except Exception as e:
             logger.error(f"Ошибка сохранения новости: {e}")
+            return None
+
+    async def _send_ad_notification(
+        self, channel: Channel, message, news: ChannelNews | None = None
+    ):
+        """Отправляет уведомление о рекламе.
 
-    async def _send_ad_notification(self, channel: Channel, message):
-        """Отправляет уведомление о рекламе"""
+        Если новость сохранена, в событии передается только ее id, а текст
+        бот читает из ChannelNews — размер события не зависит от поста.
+        """
         try:
             ad_message = NewAdMessage(
                 channel_id=channel.telegram_id,
                 channel_title=channel.title,
                 channel_link=self._get_channel_link(channel),
                 message_id=message.id,
-                message_text=message.text or "",
+                message_text="" if news else message.text or "",
+                news_id=news.id if news else 0,
             )
 
             await event_manager.publish_event(
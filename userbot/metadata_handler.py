@@ -0,0 +1,199 @@
+"""Обновление названий и username каналов"""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from telethon.tl import types
+from telethon.tl.functions.channels import GetChannelsRequest
+from telethon.tl.types import PeerChannel
+
+from bot.models import Channel, ChannelNews, ChannelSubscription
+
+if TYPE_CHECKING:
+    from userbot.core import UserbotCore
+
+logger = structlog.getLogger(__name__)
+
+# Ограничение Telegram на число каналов в одном channels.getChannels
+GET_CHANNELS_BATCH_SIZE = 100
+
+
+class ChannelMetadataHandler:
+    """Поддерживает title, main_username и is_private каналов актуальными.
+
+    Каналы запрашиваются пачками через channels.getChannels от имени
+    аккаунта, который на них подписан (access_hash у каждого аккаунта
+    свой). Изменения записываются одним bulk_update. Кроме полного
+    обновления по расписанию, каналы из событий UpdateChannel
+    накапливаются и обновляются при ближайшем сбросе.
+    """
+
+    def __init__(self, userbot_core: "UserbotCore"):
+        self.userbot_core = userbot_core
+        self.dirty_ids: set[int] = set()
+
+    def create_update_handler(self):
+        """Создает обработчик UpdateChannel для клиента юзербота"""
+
+        async def update_handler(update: types.UpdateChannel):
+            self.dirty_ids.add(update.channel_id)
+
+        return update_handler
+
+    async def run(self):
+        """Периодически обновляет измененные каналы и все каналы целиком"""
+        flush_interval = getattr(
+            settings, "USERBOT_METADATA_FLUSH_INTERVAL", 60
+        )
+        refresh_interval = getattr(
+            settings, "USERBOT_METADATA_REFRESH_INTERVAL", 86400
+        )
+        last_full_refresh = 0.0
+
+        while self.userbot_core.running:
+            await asyncio.sleep(flush_interval)
+            try:
+                if time.time() - last_full_refresh >= refresh_interval:
+                    self.dirty_ids.clear()
+                    await self.refresh()
+                    last_full_refresh = time.time()
+                elif self.dirty_ids:
+                    dirty_ids, self.dirty_ids = self.dirty_ids, set()
+                    await self.refresh(dirty_ids)
+            except Exception as e:
+                logger.error(
+                    f"Ошибка обновления данных каналов: {e}", exc_info=True
+                )
+
+    async def flush(self):
+        """Сохраняет накопленные изменения каналов, например перед остановкой"""
+        if not self.dirty_ids:
+            return
+        dirty_ids, self.dirty_ids = self.dirty_ids, set()
+        try:
+            await self.refresh(dirty_ids)
+        except Exception as e:
+            logger.error(f"Ошибка обновления данных каналов: {e}")
+
+    async def refresh(self, telegram_ids: Optional[set[int]] = None) -> int:
+        """Обновляет данные каналов, возвращает число измененных"""
+        channels_by_userbot = await sync_to_async(
+            self._get_channels_by_userbot
+        )(telegram_ids)
+
+        changed: list[Channel] = []
+        for userbot_id, channels in channels_by_userbot.items():
+            client = self.userbot_core.get_client(userbot_id)
+            if not client:
+                continue
+
+            for start in range(0, len(channels), GET_CHANNELS_BATCH_SIZE):
+                batch = channels[start : start + GET_CHANNELS_BATCH_SIZE]
+                changed.extend(await self._refresh_batch(client, batch))
+
+        if changed:
+            await Channel.objects.abulk_update(
+                changed, ["title", "main_username", "is_private", "updated_at"]
+            )
+            # В готовом HTML постов остались старые название и ссылка
+            await ChannelNews.areset_rendered(
+                [channel.pk for channel in changed]
+            )
+            logger.info(f"Обновлены данные каналов: {len(changed)}")
+
+        return len(changed)
+
+    def _get_channels_by_userbot(
+        self, telegram_ids: Optional[set[int]]
+    ) -> dict[int, list[Channel]]:
+        """Распределяет каналы по подписанным аккаунтам, основной в приоритете"""
+        subscriptions = ChannelSubscription.objects.filter(
+            is_subscribed=True
+        ).select_related("channel")
+        if telegram_ids is not None:
+            subscriptions = subscriptions.filter(
+                channel__telegram_id__in=telegram_ids
+            )
+
+        channels_by_userbot: dict[int, list[Channel]] = {}
+        seen: set[int] = set()
+        for subscription in subscriptions.order_by("-is_primary"):
+            if subscription.channel_id in seen:
+                continue
+            seen.add(subscription.channel_id)
+            channels_by_userbot.setdefault(subscription.userbot_id, []).append(
+                subscription.channel
+            )
+
+        return channels_by_userbot
+
+    async def _refresh_batch(
+        self, client, channels: list[Channel]
+    ) -> list[Channel]:
+        """Запрашивает пачку каналов одним вызовом, возвращает измененные"""
+        input_channels = []
+        for channel in channels:
+            try:
+                # access_hash берется из кеша сессии, без запросов к API
+                input_channels.append(
+                    await client.get_input_entity(
+                        PeerChannel(channel.telegram_id)
+                    )
+                )
+            except ValueError:
+                logger.debug(f"Канала {channel.title} нет в кеше сессии")
+
+        if not input_channels:
+            return []
+
+        try:
+            result = await client(GetChannelsRequest(input_channels))
+        except Exception as e:
+            logger.error(f"Ошибка запроса данных каналов: {e}")
+            return []
+
+        chats = {
+            chat.id: chat
+            for chat in result.chats
+            if isinstance(chat, types.Channel)
+        }
+
+        now = timezone.now()
+        changed = []
+        for channel in channels:
+            chat = chats.get(channel.telegram_id)
+            if not chat:
+                continue
+
+            username = self._get_username(chat)
+            is_private = not username
+            if (
+                channel.title == chat.title
+                and channel.main_username == username
+                and channel.is_private == is_private
+            ):
+                continue
+
+            channel.title = chat.title
+            channel.main_username = username
+            channel.is_private = is_private
+            # bulk_update не проставляет auto_now поля сам
+            channel.updated_at = now
+            changed.append(channel)
+
+        return changed
+
+    @staticmethod
+    def _get_username(chat: types.Channel) -> Optional[str]:
+        """Основной username канала, в том числе из списка коллекционных"""
+        if chat.username:
+            return chat.username
+        for username in chat.usernames or []:
+            if username.active:
+                return username.username
+        return None
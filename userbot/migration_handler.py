@@ -8,6 +8,7 @@ from bot.models import ChannelSubscription, UserBot
 
 if TYPE_CHECKING:
     from userbot.core import UserbotCore
+    from userbot.standby_handler import StandbyHandler
     from userbot.subscription_handler import SubscriptionHandler
 
 logger = structlog.getLogger(__name__)
@@ -20,9 +21,11 @@ class MigrationHandler:
         self,
         userbot_core: "UserbotCore",
         subscription_handler: "SubscriptionHandler",
+        standby_handler: "StandbyHandler | None" = None,
     ):
         self.userbot_core = userbot_core
         self.subscription_handler = subscription_handler
+        self.standby_handler = standby_handler
 
     async def handle_userbot_ban(self, banned_userbot: UserBot):
         """Обрабатывает бан юзербота - переподписывает его каналы на других юзерботов"""
@@ -42,23 +45,52 @@ class MigrationHandler:
             )
             return
 
-        target_userbot = await self.userbot_core._select_best_userbot()
+        # Реплики на забаненном аккаунте просто снимаем, а для основных
+        # подписок сначала пробуем переключиться на готовую реплику
+        to_migrate = []
+        promoted_count = 0
+        for subscription in subscriptions:
+            if not subscription.is_primary:
+                subscription.is_subscribed = False
+                await subscription.asave()
+                continue
+
+            if self.standby_handler and await self.standby_handler.promote(
+                subscription
+            ):
+                promoted_count += 1
+                continue
+
+            to_migrate.append(subscription)
+
+        if promoted_count:
+            logger.info(
+                f"Переключено на резервные аккаунты {promoted_count} каналов"
+            )
+
+        if not to_migrate:
+            await self._mark_banned(banned_userbot)
+            return
+
+        target_userbot = await self.userbot_core._select_best_userbot(
+            exclude_ids={banned_userbot.id}
+        )
         if not target_userbot:
             logger.error("Нет доступных юзерботов для миграции каналов")
             return
 
         logger.info(
-            f"Мигрируем {len(subscriptions)} каналов с {banned_userbot.name} на {target_userbot.name}"
+            f"Мигрируем {len(to_migrate)} каналов с {banned_userbot.name} на {target_userbot.name}"
         )
 
         # Мигрируем каналы
         migrated_count = 0
-        for subscription in subscriptions:
+        for subscription in to_migrate:
             try:
                 subscription.userbot = target_userbot
                 await subscription.asave()
 
-                success = await self._resubscribe_channel_in_telegram(
+                success = await self.subscription_handler.subscribe_userbot_to_channel(
                     target_userbot, subscription.channel
                 )
 
@@ -81,50 +113,14 @@ class MigrationHandler:
                 )
 
         logger.info(
-            f"Мигрировано {migrated_count} из {len(subscriptions)} каналов"
+            f"Мигрировано {migrated_count} из {len(to_migrate)} каналов"
         )
 
-        # Помечаем забаненный юзербот как неактивный
+        await self._mark_banned(banned_userbot)
+
+    async def _mark_banned(self, banned_userbot: UserBot):
+        """Помечает забаненный юзербот как неактивный"""
         banned_userbot.status = UserBot.STATUS_ERROR
         banned_userbot.is_active = False
         banned_userbot.last_error = "Забанен в Telegram"
         await banned_userbot.asave()
-
-    async def _resubscribe_channel_in_telegram(
-        self, userbot: UserBot, channel
-    ) -> bool:
-        """Переподписывается на канал в Telegram через указанного юзербота"""
-        try:
-            # Формируем ссылку на канал
-            if channel.main_username:
-                channel_link = f"https://t.me/{channel.main_username}"
-            elif channel.link_subscription:
-                channel_link = channel.link_subscription
-            else:
-                logger.error(f"Нет ссылки для канала {channel.title}")
-                return False
-
-            # Получаем клиент юзербота
-            client = self.userbot_core.get_client(userbot.id)
-            if not client:
-                logger.error(f"Клиент юзербота {userbot.name} не найден")
-                return False
-
-            result = await self.subscription_handler._perform_subscription(
-                client, channel_link
-            )
-
-            if result["success"]:
-                logger.info(
-                    f"Успешно переподписались на {channel.title} через {userbot.name}"
-                )
-                return True
-            else:
-                logger.error(
-                    f"Ошибка переподписки на {channel.title}: {result['error_message']}"
-                )
-                return False
-
-        except Exception as e:
-            logger.error(f"Ошибка переподписки на канал {channel.title}: {e}")
-            return False
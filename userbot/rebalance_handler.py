@@ -0,0 +1,242 @@
+"""Перебалансировка каналов между юзерботами"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bot.models import Channel, ChannelSubscription, UserBot
+
+if TYPE_CHECKING:
+    from userbot.core import UserbotCore
+    from userbot.message_handler import MessageHandler
+    from userbot.subscription_handler import SubscriptionHandler
+
+logger = structlog.getLogger(__name__)
+
+
+@dataclass
+class ChannelMove:
+    """Запланированный перенос канала с одного юзербота на другой"""
+
+    subscription_id: int
+    channel: Channel
+    source: UserBot
+    target: UserBot
+    weight: int
+
+
+class RebalanceHandler:
+    """Переносит каналы с перегруженных юзерботов на свободные.
+
+    Нагрузка канала — число сообщений из него с запуска процесса (плюс
+    единица за саму подписку). Целевая нагрузка аккаунта пропорциональна
+    его max_channels. За один проход выполняется ограниченное число
+    переносов: вступление на новом аккаунте, переключение основной
+    подписки и выход на старом.
+    """
+
+    def __init__(
+        self,
+        userbot_core: "UserbotCore",
+        subscription_handler: "SubscriptionHandler",
+        message_handler: "MessageHandler",
+    ):
+        self.userbot_core = userbot_core
+        self.subscription_handler = subscription_handler
+        self.message_handler = message_handler
+
+    async def rebalance(self, max_moves: int) -> int:
+        """Выполняет до max_moves переносов, возвращает число успешных"""
+        moves = await sync_to_async(self._plan_moves)(max_moves)
+        if not moves:
+            logger.info("Перебалансировка не требуется")
+            return 0
+
+        join_delay = getattr(settings, "USERBOT_JOIN_DELAY", 15)
+        done = 0
+
+        for move in moves:
+            if await self._execute_move(move):
+                done += 1
+            await asyncio.sleep(join_delay)
+
+        logger.info(f"Перенесено каналов: {done} из {len(moves)}")
+        return done
+
+    def _channel_weight(self, channel: Channel) -> int:
+        return 1 + self.message_handler.message_counts.get(
+            channel.telegram_id, 0
+        )
+
+    def _plan_moves(self, max_moves: int) -> list[ChannelMove]:
+        """Жадно планирует переносы от самого перегруженного к самому свободному"""
+        tolerance = getattr(settings, "USERBOT_REBALANCE_TOLERANCE", 0.1)
+
+        userbots = {
+            userbot.id: userbot
+            for userbot in UserBot.objects.filter(
+                status=UserBot.STATUS_ACTIVE,
+                is_active=True,
+                is_standby=False,
+                id__in=list(self.userbot_core.active_userbots.keys()),
+            )
+        }
+        if len(userbots) < 2:
+            return []
+
+        load = dict.fromkeys(userbots, 0)
+        count = dict.fromkeys(userbots, 0)
+        primaries: dict[int, list[tuple[int, Channel]]] = {
+            userbot_id: [] for userbot_id in userbots
+        }
+        subscribed: dict[int, set[int]] = {}
+
+        for subscription in ChannelSubscription.objects.filter(
+            is_subscribed=True
+        ).select_related("channel"):
+            channel = subscription.channel
+            subscribed.setdefault(channel.id, set()).add(
+                subscription.userbot_id
+            )
+
+            if subscription.userbot_id not in userbots:
+                continue
+
+            load[subscription.userbot_id] += self._channel_weight(channel)
+            count[subscription.userbot_id] += 1
+            if subscription.is_primary:
+                primaries[subscription.userbot_id].append(
+                    (subscription.id, channel)
+                )
+
+        total_load = sum(load.values())
+        total_capacity = sum(
+            userbot.max_channels for userbot in userbots.values()
+        )
+        if not total_load or not total_capacity:
+            return []
+
+        target = {
+            userbot_id: total_load * userbot.max_channels / total_capacity
+            for userbot_id, userbot in userbots.items()
+        }
+
+        def overload(userbot_id: int) -> float:
+            return load[userbot_id] - target[userbot_id]
+
+        def over_capacity(userbot_id: int) -> bool:
+            return count[userbot_id] > userbots[userbot_id].max_channels
+
+        def needs_relief(userbot_id: int) -> bool:
+            return over_capacity(userbot_id) or load[userbot_id] > target[
+                userbot_id
+            ] * (1 + tolerance)
+
+        def pick_move(source_id: int) -> tuple[int, int, Channel] | None:
+            free = [
+                u
+                for u in userbots
+                if u != source_id and count[u] < userbots[u].max_channels
+            ]
+            if not free:
+                return None
+            target_id = min(free, key=overload)
+
+            gap = overload(source_id) - overload(target_id)
+            candidates = [
+                (subscription_id, channel)
+                for subscription_id, channel in primaries[source_id]
+                if target_id not in subscribed.get(channel.id, set())
+                and self._channel_weight(channel) < gap
+            ]
+            if not candidates:
+                return None
+
+            # Канал с весом около половины разрыва выравнивает пару лучше всего
+            subscription_id, channel = min(
+                candidates,
+                key=lambda c: abs(self._channel_weight(c[1]) - gap / 2),
+            )
+            return target_id, subscription_id, channel
+
+        moves = []
+        while len(moves) < max_moves:
+            sources = sorted(
+                filter(needs_relief, userbots),
+                key=lambda u: (over_capacity(u), overload(u)),
+                reverse=True,
+            )
+            picked = None
+            for source_id in sources:
+                picked = pick_move(source_id)
+                if picked:
+                    break
+            if not picked:
+                break
+
+            target_id, subscription_id, channel = picked
+            weight = self._channel_weight(channel)
+
+            moves.append(
+                ChannelMove(
+                    subscription_id=subscription_id,
+                    channel=channel,
+                    source=userbots[source_id],
+                    target=userbots[target_id],
+                    weight=weight,
+                )
+            )
+
+            primaries[source_id].remove((subscription_id, channel))
+            subscribed[channel.id].discard(source_id)
+            subscribed[channel.id].add(target_id)
+            load[source_id] -= weight
+            load[target_id] += weight
+            count[source_id] -= 1
+            count[target_id] += 1
+
+        return moves
+
+    async def _execute_move(self, move: ChannelMove) -> bool:
+        """Переносит канал: вступление, переключение основной подписки, выход"""
+        joined = await self.subscription_handler.subscribe_userbot_to_channel(
+            move.target, move.channel
+        )
+        if not joined:
+            return False
+
+        def switch_primary():
+            with transaction.atomic():
+                ChannelSubscription.objects.update_or_create(
+                    channel=move.channel,
+                    userbot=move.target,
+                    defaults={"is_subscribed": True, "is_primary": True},
+                )
+                ChannelSubscription.objects.filter(
+                    pk=move.subscription_id
+                ).update(
+                    is_subscribed=False,
+                    is_primary=False,
+                    updated_at=timezone.now(),
+                )
+
+        await sync_to_async(switch_primary)()
+        self.message_handler.invalidate_replicas(move.channel.id)
+
+        source_client = self.userbot_core.get_client(move.source.id)
+        if source_client:
+            await self.subscription_handler.leave_channel(
+                source_client, move.channel
+            )
+
+        logger.info(
+            f"Канал {move.channel.title} (вес {move.weight}) перенесен "
+            f"с {move.source.name} на {move.target.name}"
+        )
+        return True
@@ -1,10 +1,11 @@
-import json
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, fields
 from enum import Enum
 from typing import Optional
 
 import structlog
 
+from core.message_codecs import decode_payload, get_codec
+
 logger = structlog.getLogger(__name__)
 
 
@@ -13,9 +14,10 @@ class MessageType(Enum):
     SUBSCRIBE_RESPONSE = "subscribe_response"
     NEW_AD_MESSAGE = "new_ad_message"
     PAYMENT_NOTIFICATION = "payment_notification"
+    USERBOT_MAINTENANCE = "userbot_maintenance"
 
 
-@dataclass
+@dataclass(slots=True)
 class NewAdMessage:
     """Сообщение о новом рекламном посте для рассылки"""
 
@@ -23,11 +25,13 @@ class NewAdMessage:
     channel_id: int = 0
     channel_title: str = ""
     message_id: int = 0
+    # Пустой, если передан news_id: текст берется из ChannelNews
     message_text: str = ""
     channel_link: str = ""
+    news_id: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class SubscribeChannelsMessage:
     """Сообщение для подписки на каналы"""
 
@@ -41,7 +45,7 @@ class SubscribeChannelsMessage:
             self.channel_links = []
 
 
-@dataclass
+@dataclass(slots=True)
 class ChannelResult:
     """Результат обработки одного канала"""
 
@@ -54,7 +58,7 @@ class ChannelResult:
     userbot_id: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class SubscribeResponseMessage:
     """Ответ на запрос подписки"""
 
@@ -71,16 +75,7 @@ class SubscribeResponseMessage:
             self.results = []
 
 
-def serialize_message(message) -> str:
-    """Сериализует сообщение в JSON"""
-    try:
-        return json.dumps(asdict(message), ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Ошибка сериализации сообщения: {e}")
-        return ""
-
-
-@dataclass
+@dataclass(slots=True)
 class PaymentNotificationMessage:
     """Уведомление о результате платежа для отправки пользователю"""
 
@@ -98,11 +93,108 @@ class PaymentNotificationMessage:
     error_message: str | None = None
 
 
-def deserialize_message(data: str, message_class):
-    """Десериализует сообщение из JSON"""
+@dataclass(slots=True)
+class UserbotMaintenanceMessage:
+    """Команда менеджеру юзерботов на запуск фоновой задачи обслуживания"""
+
+    message_type: str = MessageType.USERBOT_MAINTENANCE.value
+    task: str = ""
+    max_actions: int = 0
+
+
+# Версия конверта {"v": ..., "type": ..., "data": ..., "trace": ...}.
+# Поле trace необязательное, старые читатели его не замечают
+ENVELOPE_VERSION = 1
+
+MESSAGE_CLASSES: dict[str, type] = {
+    MessageType.SUBSCRIBE_CHANNELS.value: SubscribeChannelsMessage,
+    MessageType.SUBSCRIBE_RESPONSE.value: SubscribeResponseMessage,
+    MessageType.NEW_AD_MESSAGE.value: NewAdMessage,
+    MessageType.PAYMENT_NOTIFICATION.value: PaymentNotificationMessage,
+    MessageType.USERBOT_MAINTENANCE.value: UserbotMaintenanceMessage,
+}
+
+# Поля классов считаются один раз, а не при каждой (де)сериализации
+_MESSAGE_FIELD_NAMES: dict[type, tuple[str, ...]] = {
+    message_class: tuple(field.name for field in fields(message_class))
+    for message_class in MESSAGE_CLASSES.values()
+}
+_MESSAGE_FIELDS: dict[type, frozenset[str]] = {
+    message_class: frozenset(names)
+    for message_class, names in _MESSAGE_FIELD_NAMES.items()
+}
+
+
+def _to_dict(message) -> dict:
+    # Вложенных dataclass в сообщениях нет, глубокое копирование asdict не нужно
+    names = _MESSAGE_FIELD_NAMES.get(type(message))
+    if names is None:
+        return asdict(message)
+    return {name: getattr(message, name) for name in names}
+
+
+def serialize_message(
+    message, codec: str = "json", trace: Optional[dict] = None
+) -> bytes:
+    """Сериализует сообщение в конверт с версией, типом и трассой"""
+    # Неизвестный кодек — ошибка настройки, ее не глушим
+    encoder = get_codec(codec)
+    try:
+        envelope = {
+            "v": ENVELOPE_VERSION,
+            "type": message.message_type,
+            "data": _to_dict(message),
+        }
+        if trace:
+            envelope["trace"] = trace
+        return encoder.encode(envelope)
+    except Exception as e:
+        logger.error(f"Ошибка сериализации сообщения: {e}")
+        return b""
+
+
+def _unwrap(data: bytes | str) -> tuple[Optional[str], dict, Optional[dict]]:
+    """Достает тип, поля и трассу из конверта или старого плоского формата"""
+    payload = decode_payload(data)
+    if "v" in payload and "data" in payload:
+        return payload.get("type"), payload["data"], payload.get("trace")
+    return payload.get("message_type"), payload, None
+
+
+def _build_message(message_class, payload: dict):
+    # Неизвестные поля от более новых отправителей пропускаем
+    known_fields = _MESSAGE_FIELDS.get(message_class)
+    if known_fields is None:
+        return message_class(**payload)
+    return message_class(
+        **{key: value for key, value in payload.items() if key in known_fields}
+    )
+
+
+def decode_event(data: bytes | str) -> tuple[Optional[object], Optional[dict]]:
+    """Десериализует сообщение по типу из конверта и возвращает его трассу"""
+    try:
+        message_type, payload, trace = _unwrap(data)
+        message_class = MESSAGE_CLASSES.get(message_type)
+        if message_class is None:
+            logger.warning(f"Неизвестный тип сообщения: {message_type}")
+            return None, None
+        return _build_message(message_class, payload), trace
+    except Exception as e:
+        logger.error(f"Ошибка десериализации сообщения: {e}")
+        return None, None
+
+
+def decode_message(data: bytes | str):
+    """Десериализует сообщение, определяя класс по типу из конверта"""
+    return decode_event(data)[0]
+
+
+def deserialize_message(data: bytes | str, message_class):
+    """Десериализует сообщение в заданный класс"""
     try:
-        data_dict = json.loads(data)
-        return message_class(**data_dict)
+        _, payload, _ = _unwrap(data)
+        return _build_message(message_class, payload)
     except Exception as e:
         logger.error(f"Ошибка десериализации сообщения: {e}")
         return None
@@ -0,0 +1,107 @@
+"""Общий кеш разрешения username и invite-ссылок в Redis"""
+
+import json
+from typing import Optional
+
+import structlog
+from django.conf import settings
+
+from core.redis_manager import redis_manager
+
+logger = structlog.getLogger(__name__)
+
+NEGATIVE_MARK = "-"
+
+
+class ResolveCache:
+    """Кеш результатов ResolveUsername и CheckChatInvite для всех аккаунтов.
+
+    Данные канала (telegram_id, title, username) общие для всех аккаунтов
+    и переживают перезапуски. access_hash в Telegram выдается каждому
+    аккаунту свой, поэтому хранится отдельно по паре (юзербот, канал).
+    Ошибки Redis не мешают подписке — кеш просто считается пустым.
+    """
+
+    @staticmethod
+    def _username_key(username: str) -> str:
+        return f"userbot:resolve:username:{username.lower()}"
+
+    @staticmethod
+    def _invite_key(invite_hash: str) -> str:
+        return f"userbot:resolve:invite:{invite_hash}"
+
+    @staticmethod
+    def _access_hash_key(userbot_id: int, telegram_id: int) -> str:
+        return f"userbot:resolve:access_hash:{userbot_id}:{telegram_id}"
+
+    async def get_username(self, username: str) -> Optional[dict]:
+        """Данные канала по username; {} — username точно не существует"""
+        return await self._get_info(self._username_key(username))
+
+    async def get_invite(self, invite_hash: str) -> Optional[dict]:
+        """Данные канала по хешу invite-ссылки"""
+        return await self._get_info(self._invite_key(invite_hash))
+
+    async def set_username(self, username: str, info: dict):
+        await self._set_info(self._username_key(username), info)
+
+    async def set_invite(self, invite_hash: str, info: dict):
+        await self._set_info(self._invite_key(invite_hash), info)
+
+    async def set_username_missing(self, username: str):
+        """Запоминает несуществующий username, чтобы не резолвить его снова"""
+        ttl = getattr(settings, "USERBOT_RESOLVE_NEGATIVE_TTL", 600)
+        try:
+            await redis_manager.client.set(
+                self._username_key(username), NEGATIVE_MARK, ex=ttl
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кеш разрешения: {e}")
+
+    async def get_access_hash(
+        self, userbot_id: int, telegram_id: int
+    ) -> Optional[int]:
+        try:
+            value = await redis_manager.client.get(
+                self._access_hash_key(userbot_id, telegram_id)
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кеша разрешения: {e}")
+            return None
+        return int(value) if value else None
+
+    async def set_access_hash(
+        self, userbot_id: int, telegram_id: int, access_hash: int
+    ):
+        ttl = getattr(settings, "USERBOT_RESOLVE_ACCESS_HASH_TTL", 2592000)
+        try:
+            await redis_manager.client.set(
+                self._access_hash_key(userbot_id, telegram_id),
+                access_hash,
+                ex=ttl,
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кеш разрешения: {e}")
+
+    async def _get_info(self, key: str) -> Optional[dict]:
+        try:
+            value = await redis_manager.client.get(key)
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кеша разрешения: {e}")
+            return None
+
+        if value is None:
+            return None
+        if value == NEGATIVE_MARK:
+            return {}
+        return json.loads(value)
+
+    async def _set_info(self, key: str, info: dict):
+        ttl = getattr(settings, "USERBOT_RESOLVE_CACHE_TTL", 86400)
+        try:
+            await redis_manager.client.set(key, json.dumps(info), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кеш разрешения: {e}")
+
+
+resolve_cache = ResolveCache()
@@ -0,0 +1,219 @@
+"""Резервные подписки на каналы для мгновенного переключения при бане"""
+
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from bot.models import Channel, ChannelSubscription, UserBot
+
+if TYPE_CHECKING:
+    from userbot.core import UserbotCore
+    from userbot.message_handler import MessageHandler
+    from userbot.subscription_handler import SubscriptionHandler
+
+logger = structlog.getLogger(__name__)
+
+
+class StandbyHandler:
+    """Держит реплики каналов на резервных аккаунтах.
+
+    Реплика — подписка с is_primary=False: аккаунт уже состоит в канале,
+    но его сообщения не обрабатываются. При бане основного аккаунта
+    достаточно переключить флаг is_primary, без вступления в канал заново.
+    """
+
+    def __init__(
+        self,
+        userbot_core: "UserbotCore",
+        subscription_handler: "SubscriptionHandler",
+        message_handler: "MessageHandler | None" = None,
+    ):
+        self.userbot_core = userbot_core
+        self.subscription_handler = subscription_handler
+        self.message_handler = message_handler
+
+    def _invalidate_replicas(self, channel_id: int):
+        """Сбрасывает кэш реплик канала в обработчике сообщений"""
+        if self.message_handler:
+            self.message_handler.invalidate_replicas(channel_id)
+
+    async def run(self):
+        """Периодически досоздает недостающие реплики"""
+        interval = getattr(settings, "USERBOT_STANDBY_SYNC_INTERVAL", 3600)
+        logger.info(f"Резервирование каналов включено, интервал {interval} с")
+
+        while self.userbot_core.running:
+            try:
+                joins = await self.sync_replicas()
+                if joins:
+                    logger.info(f"Создано реплик каналов: {joins}")
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации реплик: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    async def promote(self, subscription: ChannelSubscription) -> bool:
+        """Переключает основную подписку канала на живую реплику"""
+        replicas = (
+            ChannelSubscription.objects.filter(
+                channel_id=subscription.channel_id,
+                is_subscribed=True,
+                is_primary=False,
+                userbot__status=UserBot.STATUS_ACTIVE,
+                userbot__is_active=True,
+            )
+            .exclude(userbot_id=subscription.userbot_id)
+            .select_related("userbot")
+        )
+
+        async for replica in replicas:
+            if not self.userbot_core.get_client(replica.userbot_id):
+                continue
+
+            def switch_primary():
+                now = timezone.now()
+                with transaction.atomic():
+                    ChannelSubscription.objects.filter(
+                        pk=subscription.pk
+                    ).update(
+                        is_primary=False, is_subscribed=False, updated_at=now
+                    )
+                    ChannelSubscription.objects.filter(pk=replica.pk).update(
+                        is_primary=True, updated_at=now
+                    )
+
+            await sync_to_async(switch_primary)()
+            self._invalidate_replicas(subscription.channel_id)
+            logger.info(
+                f"Канал {subscription.channel_id} переключен на резервный аккаунт {replica.userbot.name}"
+            )
+            return True
+
+        return False
+
+    async def sync_replicas(self) -> int:
+        """Вступает резервными аккаунтами в каналы, где не хватает реплик.
+
+        Возвращает количество попыток вступления за проход.
+        """
+        max_joins = getattr(settings, "USERBOT_STANDBY_MAX_JOINS", 20)
+        join_delay = getattr(settings, "USERBOT_JOIN_DELAY", 15)
+
+        plan = await sync_to_async(self._get_replica_plan)()
+        joins = 0
+
+        for channel, missing, taken_ids in plan:
+            while missing > 0:
+                if joins >= max_joins:
+                    return joins
+
+                userbot = await self._select_standby_userbot(taken_ids)
+                if not userbot:
+                    break
+
+                taken_ids.add(userbot.id)
+                joins += 1
+
+                success = await self.subscription_handler.subscribe_userbot_to_channel(
+                    userbot, channel
+                )
+                if success:
+                    await ChannelSubscription.objects.aupdate_or_create(
+                        channel=channel,
+                        userbot=userbot,
+                        defaults={"is_subscribed": True, "is_primary": False},
+                    )
+                    self._invalidate_replicas(channel.id)
+                    missing -= 1
+                    logger.info(
+                        f"Создана реплика канала {channel.title} на {userbot.name}"
+                    )
+
+                # Вступления в каналы быстро упираются в FloodWait
+                await asyncio.sleep(join_delay)
+
+        return joins
+
+    def _get_replica_plan(self) -> list[tuple[Channel, int, set[int]]]:
+        """Каналы, которым не хватает реплик: (канал, сколько не хватает, занятые аккаунты)"""
+        top_channels = getattr(settings, "USERBOT_STANDBY_TOP_CHANNELS", 0)
+        default_replicas = getattr(
+            settings, "USERBOT_STANDBY_DEFAULT_REPLICAS", 2
+        )
+
+        channels = Channel.objects.annotate(
+            users_count=Count("users", distinct=True),
+            replicas_count=Count(
+                "subscriptions",
+                filter=Q(
+                    subscriptions__is_subscribed=True,
+                    subscriptions__userbot__is_active=True,
+                ),
+                distinct=True,
+            ),
+        ).filter(users_count__gt=0)
+
+        top_ids = set()
+        if top_channels:
+            top_ids = set(
+                channels.order_by("-users_count").values_list("id", flat=True)[
+                    :top_channels
+                ]
+            )
+
+        candidates = list(
+            channels.filter(
+                Q(replication_factor__gt=1) | Q(id__in=top_ids)
+            ).order_by("-users_count")
+        )
+
+        plan = []
+        for channel in candidates:
+            target = channel.replication_factor
+            if channel.id in top_ids:
+                target = max(target, default_replicas)
+            missing = target - channel.replicas_count
+            if missing > 0:
+                plan.append((channel, missing))
+
+        taken = {channel.id: set() for channel, _ in plan}
+        for channel_id, userbot_id in ChannelSubscription.objects.filter(
+            channel_id__in=taken.keys(), is_subscribed=True
+        ).values_list("channel_id", "userbot_id"):
+            taken[channel_id].add(userbot_id)
+
+        return [
+            (channel, missing, taken[channel.id]) for channel, missing in plan
+        ]
+
+    async def _select_standby_userbot(
+        self, exclude_ids: set[int]
+    ) -> Optional[UserBot]:
+        """Выбирает аккаунт для реплики: сначала резервные, потом наименее загруженные"""
+
+        def get_candidates():
+            return list(
+                UserBot.objects.filter(
+                    status=UserBot.STATUS_ACTIVE, is_active=True
+                )
+                .exclude(id__in=exclude_ids)
+                .annotate(
+                    subscriptions_count=Count(
+                        "channel_subscriptions",
+                        filter=Q(channel_subscriptions__is_subscribed=True),
+                    )
+                )
+                .filter(subscriptions_count__lt=F("max_channels"))
+                .order_by("-is_standby", "subscriptions_count", "id")
+            )
+
+        for userbot in await sync_to_async(get_candidates)():
+            if self.userbot_core.get_client(userbot.id):
+                return userbot
+
+        return None
@@ -3,19 +3,29 @@
 from typing import TYPE_CHECKING
 
 import structlog
-from telethon.errors import UserAlreadyParticipantError
-from telethon.tl.functions.channels import JoinChannelRequest
+from telethon import utils
+from telethon.errors import (
+    UserAlreadyParticipantError,
+    UsernameInvalidError,
+    UsernameNotOccupiedError,
+)
+from telethon.tl.functions.channels import (
+    JoinChannelRequest,
+    LeaveChannelRequest,
+)
 from telethon.tl.functions.messages import (
     CheckChatInviteRequest,
     ImportChatInviteRequest,
 )
+from telethon.tl.types import InputChannel, PeerChannel
 
-from bot.models import Channel, ChannelSubscription
+from bot.models import Channel, ChannelNews, ChannelSubscription, UserBot
 from core.event_manager import EventType, event_manager
 from userbot.redis_messages import (
     SubscribeChannelsMessage,
     SubscribeResponseMessage,
 )
+from userbot.resolve_cache import resolve_cache
 
 if TYPE_CHECKING:
     from userbot.core import UserbotCore
@@ -52,6 +62,11 @@ class SubscriptionHandler:
     async def _subscribe_to_channel(self, channel_link: str) -> dict:
         """Подписывается на канал"""
         try:
+            # Канал уже отслеживается живым аккаунтом — вступать заново не нужно
+            known = await self._get_followed_channel(channel_link)
+            if known:
+                return known
+
             userbot = await self.userbot_core._select_best_userbot()
             if not userbot:
                 return {
@@ -76,7 +91,9 @@ class SubscriptionHandler:
                     "userbot_id": 0,
                 }
 
-            result = await self._perform_subscription(client, channel_link)
+            result = await self._perform_subscription(
+                client, channel_link, userbot.id
+            )
 
             if result["success"]:
                 await self._create_or_update_channel(result, userbot)
@@ -102,29 +119,102 @@ class SubscriptionHandler:
                 "userbot_id": 0,
             }
 
-    async def _perform_subscription(self, client, channel_link: str) -> dict:
-        """Выполняет подписку на канал через Telegram API"""
-        invite_hash = None
+    @staticmethod
+    def _get_invite_hash(channel_link: str) -> str | None:
+        """Хеш invite-ссылки или None для публичного канала"""
         if "t.me/+" in channel_link:
-            invite_hash = channel_link.split("t.me/+", 1)[1]
-        elif "t.me/joinchat/" in channel_link:
-            invite_hash = channel_link.split("t.me/joinchat/", 1)[1]
+            return channel_link.split("t.me/+", 1)[1]
+        if "t.me/joinchat/" in channel_link:
+            return channel_link.split("t.me/joinchat/", 1)[1]
+        return None
+
+    async def _get_followed_channel(self, channel_link: str) -> dict | None:
+        """Результат подписки без обращения к Telegram, если канал уже отслеживается"""
+        invite_hash = self._get_invite_hash(channel_link)
+        if invite_hash:
+            info = await resolve_cache.get_invite(invite_hash)
+        else:
+            username, _ = utils.parse_username(channel_link)
+            info = (
+                await resolve_cache.get_username(username) if username else None
+            )
+
+        if not info:
+            return None
+
+        async for subscription in ChannelSubscription.objects.filter(
+            channel__telegram_id=info["telegram_id"],
+            is_subscribed=True,
+            is_primary=True,
+            userbot__status=UserBot.STATUS_ACTIVE,
+            userbot__is_active=True,
+        ):
+            if self.userbot_core.get_client(subscription.userbot_id):
+                logger.info(
+                    f"Канал {info['title']} уже отслеживается, подписка не нужна"
+                )
+                return {
+                    "link": channel_link,
+                    "success": True,
+                    **info,
+                    "error_message": None,
+                    "userbot_id": subscription.userbot_id,
+                }
+
+        return None
+
+    @staticmethod
+    def _get_channel_info(entity) -> dict:
+        return {
+            "telegram_id": abs(entity.id),
+            "title": entity.title,
+            "username": getattr(entity, "username", None),
+        }
+
+    async def _remember_channel(
+        self,
+        userbot_id: int,
+        entity,
+        username: str | None = None,
+        invite_hash: str | None = None,
+    ):
+        """Сохраняет разрешенный канал в общий кеш"""
+        info = self._get_channel_info(entity)
+        if username:
+            await resolve_cache.set_username(username, info)
+        if invite_hash:
+            await resolve_cache.set_invite(invite_hash, info)
+        if getattr(entity, "access_hash", None) is not None:
+            await resolve_cache.set_access_hash(
+                userbot_id, info["telegram_id"], entity.access_hash
+            )
+
+    async def _perform_subscription(
+        self, client, channel_link: str, userbot_id: int
+    ) -> dict:
+        """Выполняет подписку на канал через Telegram API"""
+        invite_hash = self._get_invite_hash(channel_link)
 
         if invite_hash:
             return await self._handle_invite_link(
-                client, channel_link, invite_hash
+                client, channel_link, invite_hash, userbot_id
             )
         else:
-            return await self._handle_public_channel(client, channel_link)
+            return await self._handle_public_channel(
+                client, channel_link, userbot_id
+            )
 
     async def _handle_invite_link(
-        self, client, channel_link: str, invite_hash: str
+        self, client, channel_link: str, invite_hash: str, userbot_id: int
     ) -> dict:
         """Обрабатывает подписку по invite-ссылке"""
         try:
             updates = await client(ImportChatInviteRequest(invite_hash))
             if hasattr(updates, "chats") and updates.chats:
                 entity = updates.chats[0]
+                await self._remember_channel(
+                    userbot_id, entity, invite_hash=invite_hash
+                )
             else:
                 return {
                     "link": channel_link,
@@ -146,8 +236,16 @@ class SubscriptionHandler:
 
         except UserAlreadyParticipantError:
             # Пользователь уже подписан, получаем информацию о канале
+            info = await resolve_cache.get_invite(invite_hash)
+            if info:
+                return {
+                    "link": channel_link,
+                    "success": True,
+                    **info,
+                    "error_message": None,
+                }
             return await self._get_channel_info_already_subscribed(
-                client, channel_link, invite_hash
+                client, channel_link, invite_hash, userbot_id
             )
 
         except Exception as e:
@@ -156,49 +254,30 @@ class SubscriptionHandler:
             )
             # Возможно пользователь уже подписан, пробуем получить инфу
             return await self._get_channel_info_already_subscribed(
-                client, channel_link, invite_hash
+                client, channel_link, invite_hash, userbot_id
             )
 
-    async def _handle_public_channel(self, client, channel_link: str) -> dict:
+    async def _handle_public_channel(
+        self, client, channel_link: str, userbot_id: int
+    ) -> dict:
         """Обрабатывает подписку на публичный канал"""
         try:
-            entity = await client.get_entity(channel_link)
-            await client(JoinChannelRequest(entity))
+            entity, info = await self._resolve_public_channel(
+                client, channel_link, userbot_id
+            )
+            try:
+                await client(JoinChannelRequest(entity))
+            except UserAlreadyParticipantError:
+                # Пользователь уже подписан, данные канала уже известны
+                pass
 
             return {
                 "link": channel_link,
                 "success": True,
-                "telegram_id": abs(entity.id),
-                "title": entity.title,
-                "username": getattr(entity, "username", None),
+                **info,
                 "error_message": None,
             }
 
-        except UserAlreadyParticipantError:
-            # Пользователь уже подписан, получаем информацию о канале
-            try:
-                entity = await client.get_entity(channel_link)
-                return {
-                    "link": channel_link,
-                    "success": True,
-                    "telegram_id": abs(entity.id),
-                    "title": entity.title,
-                    "username": getattr(entity, "username", None),
-                    "error_message": None,
-                }
-            except Exception as e:
-                logger.error(
-                    f"Ошибка получения информации о канале {channel_link}: {e}"
-                )
-                return {
-                    "link": channel_link,
-                    "success": False,
-                    "telegram_id": None,
-                    "title": None,
-                    "username": None,
-                    "error_message": f"Ошибка получения информации о канале: {str(e)}",
-                }
-
         except Exception as e:
             logger.error(f"Ошибка подписки на канал {channel_link}: {e}")
             return {
@@ -210,8 +289,35 @@ class SubscriptionHandler:
                 "error_message": str(e),
             }
 
+    async def _resolve_public_channel(
+        self, client, channel_link: str, userbot_id: int
+    ) -> tuple:
+        """Разрешает публичную ссылку, по возможности без ResolveUsername"""
+        username, _ = utils.parse_username(channel_link)
+
+        if username:
+            info = await resolve_cache.get_username(username)
+            if info == {}:
+                raise ValueError(f'Username "{username}" не существует')
+            if info:
+                access_hash = await resolve_cache.get_access_hash(
+                    userbot_id, info["telegram_id"]
+                )
+                if access_hash is not None:
+                    return InputChannel(info["telegram_id"], access_hash), info
+
+        try:
+            entity = await client.get_entity(channel_link)
+        except (UsernameNotOccupiedError, UsernameInvalidError):
+            if username:
+                await resolve_cache.set_username_missing(username)
+            raise
+
+        await self._remember_channel(userbot_id, entity, username=username)
+        return entity, self._get_channel_info(entity)
+
     async def _get_channel_info_already_subscribed(
-        self, client, channel_link: str, invite_hash: str
+        self, client, channel_link: str, invite_hash: str, userbot_id: int
     ) -> dict:
         """Получает информацию о канале, на который пользователь уже подписан"""
         try:
@@ -222,6 +328,9 @@ class SubscriptionHandler:
             # Проверяем, есть ли поле chat (это ChatInviteAlready)
             if hasattr(invite_info, "chat"):
                 entity = invite_info.chat
+                await self._remember_channel(
+                    userbot_id, entity, invite_hash=invite_hash
+                )
                 logger.info(
                     f"Пользователь уже подписан на канал {entity.title} по ссылке {channel_link}"
                 )
@@ -278,11 +387,29 @@ class SubscriptionHandler:
             )
 
             if not created:
+                header_changed = (
+                    channel.title,
+                    channel.main_username,
+                    channel.is_private,
+                ) != (result["title"], result["username"], is_private)
                 channel.title = result["title"]
                 channel.main_username = result["username"]
                 channel.link_subscription = result["link"]
                 channel.is_private = is_private
                 await channel.asave()
+                if header_changed:
+                    # В готовом HTML постов остались старые название и ссылка
+                    await ChannelNews.areset_rendered([channel.pk])
+
+            # Основной считается только одна подписка на канал, остальные —
+            # реплики, чтобы сообщения не обрабатывались дважды
+            has_primary = (
+                await ChannelSubscription.objects.filter(
+                    channel=channel, is_subscribed=True, is_primary=True
+                )
+                .exclude(userbot=userbot)
+                .aexists()
+            )
 
             # Создаем подписку
             (
@@ -291,14 +418,76 @@ class SubscriptionHandler:
             ) = await ChannelSubscription.objects.aget_or_create(
                 channel=channel,
                 userbot=userbot,
-                defaults={"is_subscribed": True},
+                defaults={"is_subscribed": True, "is_primary": not has_primary},
             )
 
             if not created:
                 subscription.is_subscribed = True
+                if not has_primary:
+                    subscription.is_primary = True
                 await subscription.asave()
 
             logger.info(f"Канал {channel.title} добавлен/обновлен")
 
         except Exception as e:
             logger.error(f"Ошибка создания записи канала: {e}")
+
+    async def subscribe_userbot_to_channel(
+        self, userbot: UserBot, channel: Channel
+    ) -> bool:
+        """Подписывает указанного юзербота на уже известный канал"""
+        try:
+            # Формируем ссылку на канал
+            if channel.main_username:
+                channel_link = f"https://t.me/{channel.main_username}"
+            elif channel.link_subscription:
+                channel_link = channel.link_subscription
+            else:
+                logger.error(f"Нет ссылки для канала {channel.title}")
+                return False
+
+            # Получаем клиент юзербота
+            client = self.userbot_core.get_client(userbot.id)
+            if not client:
+                logger.error(f"Клиент юзербота {userbot.name} не найден")
+                return False
+
+            result = await self._perform_subscription(
+                client, channel_link, userbot.id
+            )
+
+            if result["success"]:
+                logger.info(
+                    f"Успешно подписались на {channel.title} через {userbot.name}"
+                )
+                return True
+            else:
+                logger.error(
+                    f"Ошибка подписки на {channel.title}: {result['error_message']}"
+                )
+                return False
+
+        except Exception as e:
+            logger.error(f"Ошибка подписки на канал {channel.title}: {e}")
+            return False
+
+    async def leave_channel(self, client, channel: Channel) -> bool:
+        """Выходит из канала через клиент юзербота"""
+        try:
+            try:
+                entity = await client.get_input_entity(
+                    PeerChannel(channel.telegram_id)
+                )
+            except ValueError:
+                # Канала нет в кеше сессии, пробуем по username
+                if not channel.main_username:
+                    raise
+                entity = await client.get_input_entity(channel.main_username)
+
+            await client(LeaveChannelRequest(entity))
+            logger.info(f"Вышли из канала {channel.title}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка выхода из канала {channel.title}: {e}")
+            return False
@@ -0,0 +1,63 @@
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from bot.models import Channel, ChannelSubscription, ChannelUser, User, UserBot
+from userbot.gc_handler import ChannelGCHandler
+
+
+@override_settings(USERBOT_LEAVE_DELAY=0, USERBOT_GC_GRACE_HOURS=1)
+class ChannelGCTests(TestCase):
+    """Выход юзерботов из каналов без пользователей"""
+
+    def setUp(self):
+        self.channel = Channel.objects.create(
+            telegram_id=901,
+            title="c",
+            orphaned_since=timezone.now() - timedelta(hours=2),
+        )
+        for index in (1, 2):
+            # UserBot.save дописывает путь к сессии вторым save
+            userbot = UserBot(
+                name=f"u{index}",
+                phone=f"+7901{index}",
+                api_id=index,
+                api_hash="h",
+            )
+            userbot.save()
+            ChannelSubscription.objects.create(
+                channel=self.channel, userbot=userbot, is_subscribed=True
+            )
+        self.user = User.objects.create(
+            tg_user_id=1, tg_chat_id=1, first_name="u"
+        )
+
+    async def test_user_subscribed_during_leaves(self):
+        subscription_handler = MagicMock()
+
+        async def leave_channel(client, channel):
+            # Пользователь подписался, пока шел первый выход
+            await ChannelUser.objects.acreate(channel=channel, user=self.user)
+            return True
+
+        subscription_handler.leave_channel = AsyncMock(
+            side_effect=leave_channel
+        )
+        core = MagicMock()
+        core.get_client.return_value = MagicMock()
+        handler = ChannelGCHandler(core, subscription_handler)
+        handler._mark_orphans = lambda: (0, 0)
+
+        await handler.collect(max_leaves=10)
+
+        subscription_handler.leave_channel.assert_awaited_once()
+        await self.channel.arefresh_from_db()
+        self.assertIsNone(self.channel.orphaned_since)
+        self.assertEqual(
+            await ChannelSubscription.objects.filter(
+                is_subscribed=True
+            ).acount(),
+            1,
+        )
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import SimpleTestCase, TestCase
+
+from bot.models import Channel, ChannelSubscription, UserBot
+from userbot.message_handler import MessageHandler
+
+
+class ReplicaCacheTests(TestCase):
+    """Кэш резервных подписок в MessageHandler"""
+
+    def setUp(self):
+        self.channel = Channel.objects.create(telegram_id=900, title="c")
+        self.primary, self.replica = (
+            UserBot(
+                name=name, phone=f"+7900{index}", api_id=index, api_hash="h"
+            )
+            for index, name in enumerate(("primary", "replica"), 1)
+        )
+        # UserBot.save дописывает путь к сессии вторым save, create не подходит
+        self.primary.save()
+        self.replica.save()
+        ChannelSubscription.objects.create(
+            channel=self.channel, userbot=self.primary, is_primary=True
+        )
+        self.replica_subscription = ChannelSubscription.objects.create(
+            channel=self.channel, userbot=self.replica, is_primary=False
+        )
+        self.handler = MessageHandler(MagicMock())
+
+    async def test_one_query_per_channel(self):
+        with patch.object(
+            ChannelSubscription.objects,
+            "filter",
+            wraps=ChannelSubscription.objects.filter,
+        ) as query:
+            for _ in range(3):
+                self.assertFalse(await self._is_replica(self.primary))
+                self.assertTrue(await self._is_replica(self.replica))
+
+        self.assertEqual(query.call_count, 1)
+
+    async def test_invalidated_on_switch(self):
+        self.assertTrue(await self._is_replica(self.replica))
+
+        await ChannelSubscription.objects.filter(
+            pk=self.replica_subscription.pk
+        ).aupdate(is_primary=True)
+        self.handler.invalidate_replicas(self.channel.id)
+
+        self.assertFalse(await self._is_replica(self.replica))
+
+    async def _is_replica(self, userbot: UserBot) -> bool:
+        return await self.handler._is_replica(self.channel, userbot.id)
+
+
+class MessageCountTests(SimpleTestCase):
+    """Счетчик сообщений каналов для балансировки"""
+
+    def _event(self, chat_id: int, message_id: int):
+        return SimpleNamespace(
+            message=SimpleNamespace(id=message_id, text="Привет"),
+            get_chat=AsyncMock(return_value=SimpleNamespace(id=chat_id)),
+        )
+
+    async def test_post_counted_once_across_replicas(self):
+        handler = MessageHandler(MagicMock(last_activity={}))
+        primary = handler.create_message_handler(SimpleNamespace(id=1))
+        replica = handler.create_message_handler(SimpleNamespace(id=2))
+
+        for message_id in (1, 2):
+            await primary(self._event(-100500, message_id))
+            await replica(self._event(-100500, message_id))
+
+        self.assertEqual(handler.message_counts[100500], 2)
@@ -1,12 +1,23 @@
+import asyncio
+
 import structlog
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from telethon import events
+from telethon.tl import types
 
 from bot.models import UserBot
 from core.event_manager import EventType, event_manager
+from core.redis_manager import redis_manager
+from core.tracing import trace_metrics
 from userbot.core import UserbotCore
+from userbot.gc_handler import ChannelGCHandler
 from userbot.message_handler import MessageHandler
+from userbot.metadata_handler import ChannelMetadataHandler
 from userbot.migration_handler import MigrationHandler
+from userbot.rebalance_handler import RebalanceHandler
+from userbot.redis_messages import UserbotMaintenanceMessage
+from userbot.standby_handler import StandbyHandler
 from userbot.subscription_handler import SubscriptionHandler
 
 logger = structlog.getLogger(__name__)
@@ -19,10 +30,19 @@ class UserbotManager:
         # Основные компоненты
         self.core = UserbotCore()
         self.subscription_handler = SubscriptionHandler(self.core)
+        self.message_handler = MessageHandler(self.core)
+        self.standby_handler = StandbyHandler(
+            self.core, self.subscription_handler, self.message_handler
+        )
         self.migration_handler = MigrationHandler(
-            self.core, self.subscription_handler
+            self.core, self.subscription_handler, self.standby_handler
         )
-        self.message_handler = MessageHandler(self.core)
+        self.metadata_handler = ChannelMetadataHandler(self.core)
+        self.rebalance_handler = RebalanceHandler(
+            self.core, self.subscription_handler, self.message_handler
+        )
+        self.gc_handler = ChannelGCHandler(self.core, self.subscription_handler)
+        self._maintenance_lock = asyncio.Lock()
 
     async def start(self):
         """Запускает все компоненты менеджера юзерботов"""
@@ -35,16 +55,37 @@ class UserbotManager:
             self.subscription_handler.handle_subscribe_request,
             "userbot:subscribe",
         )
+        event_manager.register_handler(
+            EventType.USERBOT_MAINTENANCE,
+            self.handle_maintenance_request,
+            "userbot:maintenance",
+        )
 
         # Запускаем прослушивание событий
         await event_manager.start_listening()
+        redis_manager.start_metrics_reporter()
+        trace_metrics.start_reporter()
 
         # Регистрируем обработчики сообщений для всех активных юзерботов
         await self._register_message_handlers()
 
+        asyncio.create_task(self.metadata_handler.run())
+
+        if getattr(settings, "USERBOT_STANDBY_ENABLED", False):
+            asyncio.create_task(self.standby_handler.run())
+
     async def stop(self):
-        """Останавливает все компоненты"""
+        """Останавливает все компоненты.
+
+        Пока клиенты подключены, дорабатываются начатые посты, накопленные
+        изменения каналов и запросы подписки; затем клиенты отключаются.
+        """
         logger.info("Остановка UserbotManager")
+        await self.message_handler.drain(
+            getattr(settings, "EVENT_DRAIN_TIMEOUT", 30)
+        )
+        await self.metadata_handler.flush()
+        await event_manager.stop_listening()
         await self.core.stop()
 
     async def _register_message_handlers(self):
@@ -62,6 +103,11 @@ class UserbotManager:
                 client.add_event_handler(
                     handler, events.NewMessage(incoming=True)
                 )
+                # Переименования и смена username каналов
+                client.add_event_handler(
+                    self.metadata_handler.create_update_handler(),
+                    events.Raw(types.UpdateChannel),
+                )
 
                 logger.info(
                     f"Зарегистрирован обработчик сообщений для {userbot.name}"
@@ -76,6 +122,40 @@ class UserbotManager:
         """Делегирует обработку подписок в subscription_handler"""
         await self.subscription_handler.handle_subscribe_request(request)
 
+    async def handle_maintenance_request(
+        self, request: UserbotMaintenanceMessage
+    ):
+        """Запускает задачу обслуживания в фоне, не блокируя прослушивание событий"""
+        if self._maintenance_lock.locked():
+            logger.warning(
+                f"Задача обслуживания {request.task} пропущена: выполняется предыдущая"
+            )
+            return
+
+        asyncio.create_task(self._run_maintenance(request))
+
+    async def _run_maintenance(self, request: UserbotMaintenanceMessage):
+        """Выполняет задачу обслуживания по имени"""
+        async with self._maintenance_lock:
+            logger.info(
+                f"Запуск задачи обслуживания {request.task}",
+                max_actions=request.max_actions,
+            )
+            try:
+                if request.task == "rebalance":
+                    await self.rebalance_handler.rebalance(request.max_actions)
+                elif request.task == "gc":
+                    await self.gc_handler.collect(request.max_actions)
+                else:
+                    logger.warning(
+                        f"Неизвестная задача обслуживания: {request.task}"
+                    )
+            except Exception as e:
+                logger.error(
+                    f"Ошибка задачи обслуживания {request.task}: {e}",
+                    exc_info=True,
+                )
+
     async def handle_userbot_ban(self, banned_userbot):
         """Делегирует обработку бана в migration_handler"""
         await self.migration_handler.handle_userbot_ban(banned_userbot)